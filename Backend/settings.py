@@ -12,6 +12,7 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 from datetime import timedelta
 from pathlib import Path
 import os
+import sys
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -39,6 +40,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     "corsheaders",
     'rest_framework',
     'core',
@@ -47,10 +49,24 @@ INSTALLED_APPS = [
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": (
         "rest_framework_simplejwt.authentication.JWTAuthentication",
-    )
+    ),
 }
 
+# Token-bucket throttling of the expensive actions (see core.throttling):
+# every client refills THROTTLE_REFILL_PER_SECOND tokens up to
+# THROTTLE_BUCKET_CAPACITY; each action spends its cost below.
+THROTTLE_BUCKET_CAPACITY = int(os.environ.get("THROTTLE_BUCKET_CAPACITY", 60))
+THROTTLE_REFILL_PER_SECOND = float(os.environ.get("THROTTLE_REFILL_PER_SECOND", 1.0))
+THROTTLE_COSTS = {
+    "default": 1,
+    "fetch_from_gmail": 30,
+    "export_excel": 10,
+}
+SINGLE_FLIGHT_TIMEOUT = 300
+
 MIDDLEWARE = [
+    "core.middleware.MetricsMiddleware",
+    "core.middleware.ProfilingMiddleware",
     "corsheaders.middleware.CorsMiddleware",
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -88,17 +104,100 @@ WSGI_APPLICATION = 'Backend.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# DB_POOL_MODE selects how connections are reused:
+#   "none"       - open a new connection for every request
+#   "persistent" - keep one connection per worker thread (CONN_MAX_AGE) and
+#                  health-check it before reuse. WSGI only: under ASGI each
+#                  request may run in a new thread and leave its
+#                  connection open until CONN_MAX_AGE.
+#   "pool"       - psycopg 3 connection pool shared by the worker's threads
+#                  (needs psycopg[pool]); safe under both WSGI and ASGI
+
+DB_POOL_MODE = os.environ.get("DB_POOL_MODE", "pool")
+
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.postgresql',
-        'NAME': 'Finance',   
-        'USER': 'postgres',  
-        'PASSWORD': 'Umer123$',
-        'HOST': 'localhost',   
-        'PORT': '5432',        
+        # Thin wrapper around django.db.backends.postgresql that counts
+        # connection checkouts/returns for /metrics.
+        'ENGINE': 'core.backends.postgresql',
+        'NAME': os.environ.get('DB_NAME', 'Finance'),
+        'USER': os.environ.get('DB_USER', 'postgres'),
+        'PASSWORD': os.environ.get('DB_PASSWORD', 'Umer123$'),
+        'HOST': os.environ.get('DB_HOST', 'localhost'),
+        'PORT': os.environ.get('DB_PORT', '5432'),
     }
 }
 
+if DB_POOL_MODE == "persistent":
+    DATABASES['default']['CONN_MAX_AGE'] = int(os.environ.get('DB_CONN_MAX_AGE', 600))
+    DATABASES['default']['CONN_HEALTH_CHECKS'] = True
+elif DB_POOL_MODE == "pool":
+    DATABASES['default']['OPTIONS'] = {
+        "pool": {
+            "min_size": int(os.environ.get('DB_POOL_MIN_SIZE', 2)),
+            "max_size": int(os.environ.get('DB_POOL_MAX_SIZE', 10)),
+            "timeout": float(os.environ.get('DB_POOL_TIMEOUT', 10)),
+            "max_idle": float(os.environ.get('DB_POOL_MAX_IDLE', 300)),
+        }
+    }
+
+# Read replicas: DB_REPLICA_HOSTS="replica-a,replica-b" adds aliases
+# replica1..N with the primary's credentials. Reports and list/retrieve reads
+# go there (core.db_routers); tests mirror them onto the primary, adding one
+# such mirror when none is configured. Pointing a replica at the primary's
+# own host works for local testing.
+DATABASE_REPLICAS = []
+for i, host in enumerate(filter(None, os.environ.get('DB_REPLICA_HOSTS', '').split(',')), 1):
+    DATABASES[f'replica{i}'] = dict(DATABASES['default'], HOST=host.strip(), TEST={'MIRROR': 'default'})
+    DATABASE_REPLICAS.append(f'replica{i}')
+if not DATABASE_REPLICAS and sys.argv[1:2] == ['test']:
+    DATABASES['replica1'] = dict(DATABASES['default'], TEST={'MIRROR': 'default'})
+    DATABASE_REPLICAS.append('replica1')
+DATABASE_ROUTERS = ['core.db_routers.ReplicaRouter']
+READ_AFTER_WRITE_PIN_SECONDS = int(os.environ.get('READ_AFTER_WRITE_PIN_SECONDS', 10))
+REPLICA_MAX_LAG_SECONDS = float(os.environ.get('REPLICA_MAX_LAG_SECONDS', 5))
+
+# Range-partition core_expense by month (PostgreSQL only). Applied by
+# migration 0016 or later with `manage.py expense_partitions enable`.
+EXPENSE_PARTITIONING = os.environ.get("EXPENSE_PARTITIONING", "") == "1"
+EXPENSE_ARCHIVE_DIR = os.environ.get("EXPENSE_ARCHIVE_DIR", os.path.join(BASE_DIR, "archive"))
+
+
+# Cache
+# Throttle buckets, single-flight locks and metrics snapshots must be shared
+# by every worker, so production should point REDIS_URL at a Redis server.
+
+if os.environ.get("REDIS_URL"):
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": os.environ["REDIS_URL"],
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        }
+    }
+
+# Gmail ingestion
+# GMAIL_IMAP_CLASS may point at a stand-in (e.g. benchmarks.fake_imap.SlowIMAP).
+GMAIL_IMAP_HOST = "imap.gmail.com"
+GMAIL_IMAP_CLASS = os.environ.get("GMAIL_IMAP_CLASS")
+GMAIL_IMAP_MAX_WORKERS = int(os.environ.get("GMAIL_IMAP_MAX_WORKERS", 64))
+
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN")
+METRICS_FLUSH_INTERVAL = 5
+
+# Request profiling (core.middleware.ProfilingMiddleware). Off unless
+# PROFILING=1; then admin-token requests and 1 in PROFILING_SAMPLE_RATE
+# requests (0 = no sampling) are profiled into PROFILING_DIR.
+PROFILING_ENABLED = os.environ.get("PROFILING", "") == "1"
+PROFILING_SAMPLE_RATE = int(os.environ.get("PROFILING_SAMPLE_RATE", 0))
+PROFILING_DIR = os.environ.get("PROFILING_DIR", os.path.join(BASE_DIR, "profiles"))
+PROFILING_MAX_FILES = 200
+PROFILING_MAX_BYTES = 200 * 1024 * 1024
 
 
 # Password validation
@@ -141,6 +240,16 @@ STATIC_URL = 'static/'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Receipts are stored content-addressed under MEDIA_ROOT/receipts/sha256;
+# rendered thumbnails are an LRU cache capped at THUMBNAIL_CACHE_MAX_BYTES.
+RECEIPT_MAX_UPLOAD_BYTES = 10 * 1024 * 1024
+RECEIPT_THUMBNAIL_SIZES = (128, 256, 512)
+THUMBNAIL_CACHE_MAX_BYTES = int(os.environ.get("THUMBNAIL_CACHE_MAX_BYTES", 256 * 1024 * 1024))
+
+# Deletion tombstones older than this are compacted by `compact_sync_changes`;
+# clients whose cursor is older must sync again from scratch.
+SYNC_RETENTION_DAYS = int(os.environ.get("SYNC_RETENTION_DAYS", 90))
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -0,0 +1,126 @@
+"""
+Concurrent-request throughput of the Gmail import under WSGI and ASGI.
+
+Runs against a throwaway test database and a latency-injecting IMAP
+stand-in (``benchmarks.fake_imap``). The WSGI side models a sync deployment
+with a fixed number of worker threads calling the DRF action; the ASGI side
+drives the native async view from a single event loop. Both phases also fire
+``profit_loss`` requests alongside the imports to show what happens to
+normal traffic while slow imports are in flight.
+
+    python -m benchmarks.asgi_vs_wsgi --requests 100 --wsgi-workers 8 --latency 0.2
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+def _percentile(values, pct):
+    values = sorted(values)
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))]
+
+
+def _summary(label, wall, import_latencies, report_latencies):
+    print(
+        f"{label:5} imports={len(import_latencies):4d} wall={wall:7.2f}s "
+        f"throughput={len(import_latencies) / wall:7.1f} req/s "
+        f"import_p50={statistics.median(import_latencies) * 1000:7.0f}ms "
+        f"report_p50={statistics.median(report_latencies) * 1000:7.0f}ms "
+        f"report_p95={_percentile(report_latencies, 95) * 1000:7.0f}ms"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=50)
+    parser.add_argument("--wsgi-workers", type=int, default=8)
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--messages", type=int, default=3)
+    args = parser.parse_args()
+
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "Backend.settings")
+    import django
+    django.setup()
+
+    from django.db import connections
+    from django.test import AsyncClient, Client, override_settings
+    from django.test.utils import setup_databases, setup_test_environment, teardown_databases
+    from rest_framework_simplejwt.tokens import AccessToken
+
+    from benchmarks import fake_imap
+    from core.models import User
+
+    fake_imap.LATENCY = args.latency
+    fake_imap.MESSAGES = args.messages
+    setup_test_environment()
+    old_config = setup_databases(verbosity=0, interactive=False)
+    try:
+        with override_settings(GMAIL_IMAP_CLASS="benchmarks.fake_imap.SlowIMAP"):
+            # One user per request so single-flight and the per-user token
+            # bucket don't collapse the concurrent imports into one.
+            users = [
+                User.objects.create_user(
+                    f"bench{i}", f"bench{i}@example.com", "pw",
+                    gmail=f"bench{i}@gmail.com", gmail_app_password="x",
+                )
+                for i in range(args.requests * 2)
+            ]
+            headers = [{"Authorization": f"Bearer {AccessToken.for_user(u)}"} for u in users]
+            wsgi_headers, asgi_headers = headers[:args.requests], headers[args.requests:]
+
+            # WSGI: a fixed pool of sync workers serves imports and reports.
+            # Latency is measured from submission, so time spent queued for a
+            # free worker counts, just as it would behind a real WSGI server.
+            def timed(path, method, h, start):
+                client = Client()
+                response = getattr(client, method)(path, headers=h)
+                assert response.status_code < 400, response.content
+                connections.close_all()
+                return time.perf_counter() - start
+
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=args.wsgi_workers) as pool:
+                imports = [
+                    pool.submit(timed, "/api/expenses/fetch_from_gmail/", "post", h, time.perf_counter())
+                    for h in wsgi_headers
+                ]
+                reports = [
+                    pool.submit(timed, "/api/reports/profit_loss/", "get", h, time.perf_counter())
+                    for h in wsgi_headers
+                ]
+                import_latencies = [f.result() for f in imports]
+                report_latencies = [f.result() for f in reports]
+            _summary("WSGI", time.perf_counter() - start, import_latencies, report_latencies)
+
+            # ASGI: one event loop serves everything.
+            async def atimed(client, path, method, h):
+                start = time.perf_counter()
+                response = await getattr(client, method)(path, headers=h)
+                assert response.status_code < 400, response.content
+                return time.perf_counter() - start
+
+            async def run_asgi():
+                client = AsyncClient()
+                imports = [
+                    atimed(client, "/api/async/expenses/fetch_from_gmail/", "post", h) for h in asgi_headers
+                ]
+                reports = [
+                    atimed(client, "/api/async/reports/profit_loss/", "get", h) for h in asgi_headers
+                ]
+                results = await asyncio.gather(*imports, *reports)
+                return results[:len(imports)], results[len(imports):]
+
+            start = time.perf_counter()
+            import_latencies, report_latencies = asyncio.run(run_asgi())
+            _summary("ASGI", time.perf_counter() - start, import_latencies, report_latencies)
+    finally:
+        teardown_databases(old_config, verbosity=0)
+
+
+if __name__ == "__main__":
+    main()
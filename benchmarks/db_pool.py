@@ -0,0 +1,100 @@
+"""
+Per-request latency of the CRUD endpoints under each DB_POOL_MODE.
+
+Each mode runs in its own interpreter (the mode is read when settings load)
+against the configured PostgreSQL server, reusing one test database. After
+every request ``close_old_connections()`` is called, as the request_finished
+signal does in a real deployment, so "none" pays for a fresh connection each
+time while "persistent" and "pool" reuse one.
+
+    python -m benchmarks.db_pool --requests 300 --threads 4
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+MODES = ("none", "persistent", "pool")
+
+
+def _percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))]
+
+
+def run_mode(requests, threads):
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "Backend.settings")
+    import django
+    django.setup()
+
+    from django.db import close_old_connections, connections
+    from django.test import Client
+    from django.test.utils import setup_databases, setup_test_environment
+    from rest_framework_simplejwt.tokens import AccessToken
+
+    from core.models import Expense, User
+
+    setup_test_environment()
+    setup_databases(verbosity=0, interactive=False, keepdb=True)
+    user, _ = User.objects.get_or_create(username="pool-bench")
+    Expense.objects.filter(created_by=user).delete()
+    headers = {"Authorization": f"Bearer {AccessToken.for_user(user)}"}
+    connections.close_all()
+
+    def one(i):
+        client = Client()
+        start = time.perf_counter()
+        if i % 3 == 0:
+            client.post(
+                "/api/expenses/",
+                {"transaction_id": f"pool-{os.getpid()}-{i}", "transaction_type": "Bench",
+                 "amount": "1.00", "total": "1.00"},
+                content_type="application/json", headers=headers,
+            )
+        elif i % 3 == 1:
+            client.get("/api/expenses/?from_date=2025-01-01", headers=headers)
+        else:
+            client.get("/api/reports/profit_loss/", headers=headers)
+        close_old_connections()
+        return time.perf_counter() - start
+
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        latencies = list(pool.map(one, range(requests)))
+    print(json.dumps({
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p95_ms": _percentile(latencies, 95) * 1000,
+        "mean_ms": statistics.mean(latencies) * 1000,
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=300)
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        return run_mode(args.requests, args.threads)
+
+    # Generous bucket so the throttle doesn't dominate the measurement.
+    env = dict(os.environ, THROTTLE_BUCKET_CAPACITY="1000000", THROTTLE_REFILL_PER_SECOND="1000000")
+    for mode in MODES:
+        out = subprocess.run(
+            [sys.executable, "-m", "benchmarks.db_pool", "--child",
+             "--requests", str(args.requests), "--threads", str(args.threads)],
+            env=dict(env, DB_POOL_MODE=mode), capture_output=True, text=True, check=True,
+        )
+        result = json.loads(out.stdout.strip().splitlines()[-1])
+        print(
+            f"{mode:10} p50={result['p50_ms']:7.2f}ms p95={result['p95_ms']:7.2f}ms "
+            f"mean={result['mean_ms']:7.2f}ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""
+A local stand-in for ``imaplib.IMAP4_SSL`` that injects network latency.
+
+Point ``GMAIL_IMAP_CLASS`` at ``benchmarks.fake_imap.SlowIMAP`` to exercise
+the Gmail import without a real mailbox. ``LATENCY`` seconds are slept on
+every IMAP round trip and ``MESSAGES`` synthetic statements are served.
+"""
+import itertools
+import time
+
+LATENCY = 0.2
+MESSAGES = 5
+
+_ids = itertools.count(1)
+
+STATEMENT = """\
+From: e.statement@telenorbank.pk
+Subject: Easypaisa Transaction
+Content-Type: text/plain
+
+Transaction ID {tid}
+Transaction Type Money Transfer
+Date & Time 05-Jan-2025 10:{minute:02d}:00
+Account Title Benchmark Payee {n}
+Sender Name Benchmark User
+Transfer amount Rs. {amount}.00
+Fee Rs. 0.00
+Total Rs. {amount}.00
+"""
+
+
+class SlowIMAP:
+    def __init__(self, host, *args, **kwargs):
+        self._wait()
+
+    def _wait(self):
+        time.sleep(LATENCY)
+
+    def login(self, user, password):
+        self._wait()
+        return "OK", [b"Logged in"]
+
+    def select(self, mailbox="INBOX"):
+        self._wait()
+        return "OK", [str(MESSAGES).encode()]
+
+    def search(self, charset, criteria):
+        self._wait()
+        return "OK", [b" ".join(str(i).encode() for i in range(1, MESSAGES + 1))]
+
+    def fetch(self, mail_id, parts):
+        self._wait()
+        n = int(mail_id)
+        body = STATEMENT.format(tid=next(_ids) + 10**9, minute=n % 60, n=n, amount=100 + n)
+        return "OK", [(b"1 (RFC822)", body.encode())]
+
+    def close(self):
+        return "OK", []
+
+    def logout(self):
+        return "BYE", []
@@ -0,0 +1,172 @@
+"""
+Scripted HTTP load test against a running server.
+
+Logs in once per worker, then replays a weighted mix of the expense list,
+report, export and auth endpoints for a fixed duration. Latency percentiles
+and throughput per endpoint are written to a JSON results file; pass
+``--baseline`` with an earlier results file to print the change.
+
+Seed data first (``manage.py generate_ledger``) and start the server with a
+large THROTTLE_BUCKET_CAPACITY, or the throttle becomes the bottleneck.
+
+    python -m benchmarks.loadtest --base-url http://localhost:8000 \\
+        --username synthetic0 --password password --duration 60 \\
+        --concurrency 16 --output results/after.json --baseline results/before.json
+"""
+import argparse
+import json
+import random
+import statistics
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+# (name, method, path, weight)
+SCENARIOS = [
+    ("expense_list", "GET", "/api/expenses/", 40),
+    ("expense_list_range", "GET", "/api/expenses/?from_date={from_date}&to_date={to_date}", 15),
+    ("profit_loss", "GET", "/api/reports/profit_loss/?month={month}", 15),
+    ("type_breakdown", "GET", "/api/reports/type_breakdown/", 10),
+    ("top_expenses", "GET", "/api/reports/top_expenses/?limit=10", 10),
+    ("export_excel", "GET", "/api/reports/export_excel/?month={month}", 3),
+    ("auth_login", "POST", "/api/auth/login/", 7),
+]
+
+
+def _percentile(values, pct):
+    values = sorted(values)
+    if not values:
+        return None
+    return values[min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))]
+
+
+class LoadTest:
+    def __init__(self, args):
+        self.args = args
+        self.latencies = defaultdict(list)
+        self.statuses = defaultdict(lambda: defaultdict(int))
+        self.lock = threading.Lock()
+
+    def _request(self, method, path, token=None, body=None):
+        data = json.dumps(body).encode() if body is not None else None
+        request = urllib.request.Request(self.args.base_url.rstrip("/") + path, data=data, method=method)
+        request.add_header("Content-Type", "application/json")
+        if token:
+            request.add_header("Authorization", f"Bearer {token}")
+        try:
+            with urllib.request.urlopen(request, timeout=self.args.timeout) as response:
+                return response.status, response.read()
+        except urllib.error.HTTPError as e:
+            return e.code, e.read()
+        except (urllib.error.URLError, TimeoutError):
+            return 0, b""
+
+    def _login(self):
+        status, body = self._request(
+            "POST", "/api/auth/login/",
+            body={"username": self.args.username, "password": self.args.password},
+        )
+        if status != 200:
+            raise SystemExit(f"Login failed ({status}): {body[:200]!r}")
+        return json.loads(body)["access"]
+
+    def worker(self, deadline, seed):
+        rng = random.Random(seed)
+        token = self._login()
+        names = [s[0] for s in SCENARIOS]
+        weights = [s[3] for s in SCENARIOS]
+        by_name = {s[0]: s for s in SCENARIOS}
+        while time.monotonic() < deadline:
+            name, method, path, _ = by_name[rng.choices(names, weights)[0]]
+            path = path.format(
+                month=self.args.month,
+                from_date=f"{self.args.month}-01",
+                to_date=f"{self.args.month}-28",
+            )
+            body = None
+            if name == "auth_login":
+                body = {"username": self.args.username, "password": self.args.password}
+            start = time.perf_counter()
+            status, _ = self._request(method, path, token=None if body else token, body=body)
+            elapsed = time.perf_counter() - start
+            with self.lock:
+                self.latencies[name].append(elapsed)
+                self.statuses[name][status] += 1
+
+    def run(self):
+        deadline = time.monotonic() + self.args.duration
+        start = time.monotonic()
+        with ThreadPoolExecutor(max_workers=self.args.concurrency) as pool:
+            futures = [pool.submit(self.worker, deadline, i) for i in range(self.args.concurrency)]
+            for f in futures:
+                f.result()
+        wall = time.monotonic() - start
+
+        endpoints = {}
+        for name, values in sorted(self.latencies.items()):
+            endpoints[name] = {
+                "requests": len(values),
+                "throughput_rps": len(values) / wall,
+                "p50_ms": _percentile(values, 50) * 1000,
+                "p95_ms": _percentile(values, 95) * 1000,
+                "p99_ms": _percentile(values, 99) * 1000,
+                "mean_ms": statistics.mean(values) * 1000,
+                "statuses": {str(k): v for k, v in sorted(self.statuses[name].items())},
+            }
+        total = sum(len(v) for v in self.latencies.values())
+        return {
+            "base_url": self.args.base_url,
+            "label": self.args.label,
+            "started_at": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(time.time() - wall)),
+            "duration_s": wall,
+            "concurrency": self.args.concurrency,
+            "total_requests": total,
+            "throughput_rps": total / wall,
+            "endpoints": endpoints,
+        }
+
+
+def _print_results(results, baseline=None):
+    print(f"{'endpoint':20} {'reqs':>7} {'rps':>8} {'p50':>9} {'p95':>9} {'p99':>9}")
+    for name, row in results["endpoints"].items():
+        line = (
+            f"{name:20} {row['requests']:7d} {row['throughput_rps']:8.1f} "
+            f"{row['p50_ms']:7.1f}ms {row['p95_ms']:7.1f}ms {row['p99_ms']:7.1f}ms"
+        )
+        base = (baseline or {}).get("endpoints", {}).get(name)
+        if base:
+            delta = (row["p95_ms"] - base["p95_ms"]) / base["p95_ms"] * 100 if base["p95_ms"] else 0
+            line += f"  p95 {delta:+6.1f}% vs baseline"
+        print(line)
+    print(f"total {results['total_requests']} requests, {results['throughput_rps']:.1f} req/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--username", required=True)
+    parser.add_argument("--password", required=True)
+    parser.add_argument("--duration", type=float, default=30)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--month", default=time.strftime("%Y-%m"), help="YYYY-MM used by month filters.")
+    parser.add_argument("--timeout", type=float, default=60)
+    parser.add_argument("--label", default="")
+    parser.add_argument("--output", default="loadtest_results.json")
+    parser.add_argument("--baseline")
+    args = parser.parse_args()
+
+    results = LoadTest(args).run()
+    with open(args.output, "w") as fh:
+        json.dump(results, fh, indent=2)
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as fh:
+            baseline = json.load(fh)
+    _print_results(results, baseline)
+
+
+if __name__ == "__main__":
+    main()
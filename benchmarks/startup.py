@@ -0,0 +1,100 @@
+"""
+Cold start cost of a web worker: ``django.setup()``, loading the URLconf
+(which imports every view module) and the resident memory afterwards.
+
+Each sample runs in a fresh interpreter. ``--preload`` additionally imports
+the lazily loaded services, to show what every worker paid before they were
+split out of the views.
+
+    python -m benchmarks.startup --runs 5
+    python -m benchmarks.startup --runs 5 --preload
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+# Modules only the import/export/analytics actions need; a worker must not
+# load them while booting.
+HEAVY_MODULES = (
+    "openpyxl",
+    "bs4",
+    "imaplib",
+    "numpy",
+    "core.analytics",
+    "core.services.excel",
+    "core.services.gmail",
+)
+LAZY_SERVICES = ("core.analytics", "core.services.excel", "core.services.gmail")
+
+
+def _rss_mb():
+    try:
+        with open("/proc/self/statm") as fh:
+            pages = int(fh.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError):
+        import resource
+        # ru_maxrss is KiB on Linux, bytes on macOS.
+        scale = 1024 * 1024 if sys.platform == "darwin" else 1024
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale
+
+
+def sample(preload=False):
+    """Measure this (fresh) interpreter; returns a JSON-serialisable dict."""
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "Backend.settings")
+    start = time.perf_counter()
+    import django
+    django.setup()
+    setup_done = time.perf_counter()
+
+    from django.urls import get_resolver
+    get_resolver().url_patterns  # imports the URLconf and every view module
+    urls_done = time.perf_counter()
+
+    if preload:
+        import importlib
+        for name in LAZY_SERVICES:
+            importlib.import_module(name)
+    return {
+        "setup_seconds": setup_done - start,
+        "urlconf_seconds": urls_done - setup_done,
+        "total_seconds": time.perf_counter() - start,
+        "rss_mb": _rss_mb(),
+        "heavy_loaded": sorted(name for name in HEAVY_MODULES if name in sys.modules),
+    }
+
+
+def run_sample(preload=False):
+    cmd = [sys.executable, "-m", "benchmarks.startup", "--child"]
+    if preload:
+        cmd.append("--preload")
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    output = subprocess.run(cmd, cwd=root, capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--preload", action="store_true")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(sample(args.preload)))
+        return
+
+    samples = [run_sample(args.preload) for _ in range(args.runs)]
+    print(f"{'metric':<18}{'median':>10}{'min':>10}{'max':>10}")
+    for metric in ("setup_seconds", "urlconf_seconds", "total_seconds", "rss_mb"):
+        values = [s[metric] for s in samples]
+        print(f"{metric:<18}{statistics.median(values):>10.3f}{min(values):>10.3f}{max(values):>10.3f}")
+    print("heavy modules loaded at startup:", ", ".join(samples[-1]["heavy_loaded"]) or "none")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+"""
+Vectorised per-user spending analytics.
+
+A user's expenses are loaded once into NumPy arrays (closed months from
+their memory-mapped snapshots, see ``core.snapshots``) and every statistic below is computed with array operations (``bincount``,
+cumulative sums, broadcasting). There are no per-row Python loops after the
+load. Results are memoised in the cache under the user's ledger version
+(``core.versioning``), so they are recomputed only after the ledger changes.
+"""
+import datetime
+
+import numpy as np
+from django.core.cache import cache
+from django.utils import timezone
+
+from . import snapshots
+from .models import Expense
+from .versioning import ledger_version
+
+DAY = 86400
+CACHE_TIMEOUT = 60 * 60
+
+
+def memoise(name, user_id, params, compute):
+    key = f"analytics:{name}:{user_id}:{ledger_version(user_id)}:{params}"
+    result = cache.get(key)
+    if result is None:
+        result = compute()
+        cache.set(key, result, timeout=CACHE_TIMEOUT)
+    return result
+
+
+def load_series(user_id):
+    """Return ``(ids, epoch_seconds, amounts)`` sorted by time.
+
+    Closed months come from their memory-mapped snapshots; only the open
+    month is queried.
+    """
+    return snapshots.expense_series(user_id)
+
+
+def daily_totals(seconds, amounts):
+    """Return ``(first_day_number, totals)`` with one bucket per calendar day (UTC)."""
+    days = (seconds // DAY).astype(np.int64)
+    first = int(days[0])
+    return first, np.bincount(days - first, weights=amounts)
+
+
+def rolling_stats(values, window):
+    """Trailing mean and standard deviation over ``window`` samples (cumsum based)."""
+    cs = np.concatenate(([0.0], np.cumsum(values)))
+    cs2 = np.concatenate(([0.0], np.cumsum(values * values)))
+    idx = np.arange(1, len(values) + 1)
+    lo = np.maximum(idx - window, 0)
+    n = idx - lo
+    mean = (cs[idx] - cs[lo]) / n
+    var = np.maximum((cs2[idx] - cs2[lo]) / n - mean * mean, 0.0)
+    return mean, np.sqrt(var)
+
+
+def weekday_baseline(first_day, totals, weeks=12):
+    """Mean daily spend per weekday (Monday=0) over the last ``weeks`` weeks."""
+    recent = totals[-weeks * 7:]
+    day_numbers = np.arange(first_day + len(totals) - len(recent), first_day + len(totals))
+    weekdays = (day_numbers + 3) % 7  # 1970-01-01 was a Thursday
+    sums = np.bincount(weekdays, weights=recent, minlength=7)
+    counts = np.bincount(weekdays, minlength=7)
+    return np.divide(sums, counts, out=np.zeros(7), where=counts > 0)
+
+
+def timeseries(user_id, window=28):
+    def compute():
+        _, seconds, amounts = load_series(user_id)
+        if not len(seconds):
+            return []
+        first, totals = daily_totals(seconds, amounts)
+        mean, std = rolling_stats(totals, window)
+        dates = np.arange(first, first + len(totals)).astype("datetime64[D]").astype(str)
+        return [
+            {"date": str(d), "total": round(float(t), 2), "rolling_mean": round(float(m), 2), "rolling_std": round(float(s), 2)}
+            for d, t, m, s in zip(dates, totals, mean, std)
+        ]
+    return memoise("timeseries", user_id, window, compute)
+
+
+def forecast_month_end(user_id, today=None):
+    today = today or timezone.now().date()
+
+    def compute():
+        month_start = today.replace(day=1)
+        next_month = (month_start + datetime.timedelta(days=32)).replace(day=1)
+        _, seconds, amounts = load_series(user_id)
+        result = {
+            "month": month_start.strftime("%Y-%m"),
+            "spent_to_date": 0.0,
+            "projected_remaining": 0.0,
+            "projected_total": 0.0,
+            "projected_low": 0.0,
+            "projected_high": 0.0,
+            "days_remaining": (next_month - today).days - 1,
+            "baseline_by_weekday": [0.0] * 7,
+        }
+        if not len(seconds):
+            return result
+
+        start_s = datetime.datetime.combine(month_start, datetime.time.min, datetime.timezone.utc).timestamp()
+        end_s = datetime.datetime.combine(today + datetime.timedelta(days=1), datetime.time.min, datetime.timezone.utc).timestamp()
+        in_month = (seconds >= start_s) & (seconds < end_s)
+        spent = float(amounts[in_month].sum())
+
+        past = seconds < end_s
+        baseline, daily_std = np.zeros(7), 0.0
+        if past.any():
+            first, totals = daily_totals(seconds[past], amounts[past])
+            # Pad with zero-spend days up to today so quiet days count.
+            padding = int(end_s // DAY) - (first + len(totals))
+            totals = np.concatenate((totals, np.zeros(max(padding, 0))))
+            baseline = weekday_baseline(first, totals)
+            daily_std = float(rolling_stats(totals, 28)[1][-1])
+
+        remaining_days = np.arange(int(end_s // DAY), int(end_s // DAY) + result["days_remaining"])
+        remaining = float(baseline[(remaining_days + 3) % 7].sum())
+        spread = daily_std * float(np.sqrt(len(remaining_days)))
+        result.update({
+            "spent_to_date": round(spent, 2),
+            "projected_remaining": round(remaining, 2),
+            "projected_total": round(spent + remaining, 2),
+            "projected_low": round(spent + max(remaining - spread, 0.0), 2),
+            "projected_high": round(spent + remaining + spread, 2),
+            "baseline_by_weekday": [round(float(v), 2) for v in baseline],
+        })
+        return result
+    return memoise("forecast", user_id, today.isoformat(), compute)
+
+
+def anomalies(user_id, threshold=3.0, window=50, min_history=10):
+    """Flag transactions whose log-amount z-score against the trailing
+    ``window`` transactions exceeds ``threshold``."""
+    def compute():
+        ids, seconds, amounts = load_series(user_id)
+        if len(ids) <= min_history:
+            return []
+        logs = np.log1p(np.maximum(amounts, 0.0))
+        mean, std = rolling_stats(logs, window)
+        # Compare each row with the statistics of the rows *before* it.
+        prev_mean, prev_std = mean[:-1], std[:-1]
+        z = np.zeros(len(logs))
+        np.divide(logs[1:] - prev_mean, prev_std, out=z[1:], where=prev_std > 1e-9)
+        z[:min_history] = 0.0
+        flagged = np.flatnonzero(np.abs(z) >= threshold)
+        order = flagged[np.argsort(-np.abs(z[flagged]))]
+        details = Expense.objects.in_bulk([int(ids[i]) for i in order])
+        return [
+            {
+                "id": int(ids[i]),
+                "date_time": details[int(ids[i])].date_time,
+                "amount": float(amounts[i]),
+                "transaction_type": details[int(ids[i])].transaction_type,
+                "receiver_name": details[int(ids[i])].receiver_name,
+                "z_score": round(float(z[i]), 2),
+                "typical_amount": round(float(np.expm1(prev_mean[i - 1])), 2),
+            }
+            for i in order
+            if int(ids[i]) in details
+        ]
+    return memoise("anomalies", user_id, (threshold, window), compute)
@@ -0,0 +1,102 @@
+"""
+Native async endpoints for ASGI deployments.
+
+These mirror ``ExpenseViewSet.fetch_from_gmail`` and the ``ReportsViewSet``
+aggregates without tying up a worker thread while waiting on IMAP or the
+database. They authenticate with the same JWTs, and the import spends the
+same throttle budget as its DRF counterpart.
+"""
+import functools
+
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_http_methods
+from rest_framework import status
+from rest_framework.exceptions import APIException, AuthenticationFailed
+from rest_framework.utils.encoders import JSONEncoder
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+
+from . import db_routers, reports
+from .filters import int_param
+from .throttling import asingle_flight, check_throttle
+
+
+def _json(data, status_code=status.HTTP_200_OK):
+    return JsonResponse(data, status=status_code, encoder=JSONEncoder, safe=False)
+
+
+def _authenticate(request):
+    try:
+        result = JWTAuthentication().authenticate(request)
+    except (InvalidToken, AuthenticationFailed):
+        return None
+    return result[0] if result else None
+
+
+def async_api_view(view_name, action, method="GET", throttle=False):
+    """Authenticate, optionally throttle, and JSON-encode an async view."""
+    def decorator(func):
+        @csrf_exempt
+        @require_http_methods([method])
+        @functools.wraps(func)
+        async def wrapper(request):
+            user = await sync_to_async(_authenticate)(request)
+            if user is None:
+                return _json(
+                    {"detail": "Authentication credentials were not provided."},
+                    status.HTTP_401_UNAUTHORIZED,
+                )
+            allowed, wait = True, 0
+            if throttle:
+                allowed, wait = await sync_to_async(check_throttle)(f"user:{user.pk}", view_name, action)
+            if not allowed:
+                response = _json({"detail": "Request was throttled."}, status.HTTP_429_TOO_MANY_REQUESTS)
+                response["Retry-After"] = str(int(wait) + 1)
+                return response
+            request.user = user
+            token = db_routers.begin(user.pk, allow_replica=method == "GET")
+            try:
+                data, status_code = await func(request)
+            except APIException as e:
+                data, status_code = e.detail, e.status_code
+            finally:
+                db_routers.end(token)
+            return _json(data, status_code)
+        return wrapper
+    return decorator
+
+
+# 1. Gmail import
+@async_api_view("ExpenseViewSet", "fetch_from_gmail", method="POST", throttle=True)
+async def fetch_from_gmail(request):
+    from .services import gmail  # loads bs4 and imaplib on first import
+
+    from_date = request.GET.get("from_date")
+    to_date = request.GET.get("to_date")
+    key = "gmail:{}:{}:{}".format(request.user.pk, from_date or "", to_date or "")
+    return await asingle_flight(
+        key, lambda: gmail.aimport_from_gmail(request.user, from_date, to_date)
+    )
+
+
+# 2. Reports
+# Snapshot reads touch the filesystem and NumPy, so they run in a thread.
+@async_api_view("ReportsViewSet", "profit_loss")
+async def profit_loss(request):
+    data = await sync_to_async(reports.profit_loss)(request.user.pk, request.GET.get("month"))
+    return data, status.HTTP_200_OK
+
+
+@async_api_view("ReportsViewSet", "type_breakdown")
+async def type_breakdown(request):
+    data = await sync_to_async(reports.type_breakdown)(request.user.pk, request.GET.get("month"))
+    return data, status.HTTP_200_OK
+
+
+@async_api_view("ReportsViewSet", "top_expenses")
+async def top_expenses(request):
+    limit = int_param(request.GET, "limit", 5, minimum=0)
+    rows = reports.top_expenses(request.user, request.GET.get("month"), limit)
+    return [row async for row in rows], status.HTTP_200_OK
@@ -0,0 +1,63 @@
+"""
+PostgreSQL backend that instruments connection use.
+
+Behaves exactly like ``django.db.backends.postgresql``. What is measured
+depends on ``DB_POOL_MODE``:
+
+- "pool": checkouts and wait time come from the psycopg pool's own
+  statistics (``db_pool_requests_num``, ``db_pool_returns_bad``,
+  ``db_pool_requests_wait_ms``, ...), collected before each snapshot. The
+  pool does not count returns, so ``db_pool_returns_total`` counts them
+  here; a gap to ``db_pool_requests_num`` is connections still checked out.
+- "persistent" / "none": there are no checkouts, so physical connects and
+  closes are counted instead (``db_connections_opened_total``,
+  ``db_connections_closed_total``, ``db_connect_seconds_sum``). With
+  persistent connections these grow only when ``CONN_MAX_AGE`` expires or
+  a connection breaks.
+"""
+import time
+
+from django.db.backends.postgresql import base
+
+from core import metrics
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    def _pool_mode(self):
+        if self.settings_dict["OPTIONS"].get("pool"):
+            return "pool"
+        return "persistent" if self.settings_dict["CONN_MAX_AGE"] else "none"
+
+    def get_new_connection(self, conn_params):
+        mode = self._pool_mode()
+        if mode == "pool":
+            return super().get_new_connection(conn_params)
+        start = time.perf_counter()
+        connection = super().get_new_connection(conn_params)
+        metrics.inc("db_connections_opened_total", alias=self.alias, mode=mode)
+        metrics.inc("db_connect_seconds_sum", time.perf_counter() - start, alias=self.alias, mode=mode)
+        return connection
+
+    def _close(self):
+        mode = self._pool_mode()
+        if self.connection is not None:
+            if mode == "pool":
+                metrics.inc("db_pool_returns_total", alias=self.alias)
+            else:
+                metrics.inc("db_connections_closed_total", alias=self.alias, mode=mode)
+        return super()._close()
+
+
+@metrics.register_collector
+def _collect_pool_stats():
+    for alias, pool in list(base.DatabaseWrapper._connection_pools.items()):
+        stats = pool.get_stats()
+        for stat in ("pool_min", "pool_max"):
+            # Configuration, identical in every worker.
+            metrics.set_gauge(f"db_pool_{stat}", stats.get(stat, 0), merge="max", alias=alias)
+        for stat in ("pool_size", "pool_available", "requests_waiting"):
+            metrics.set_gauge(f"db_pool_{stat}", stats.get(stat, 0), alias=alias)
+        for stat in ("requests_num", "requests_queued", "requests_wait_ms", "requests_errors",
+                     "returns_bad", "connections_num", "connections_ms", "connections_errors"):
+            # psycopg_pool reports these as running totals for this process.
+            metrics.set_gauge(f"db_pool_{stat}", stats.get(stat, 0), alias=alias)
@@ -0,0 +1,150 @@
+"""
+Monthly budgets with running spend counters.
+
+Each expense adds its amount to two ``BudgetCounter`` rows: its
+transaction_type's and the user's all-types row ("") for its month. That is
+one ``UPDATE ... SET spent = spent + x`` per affected counter, in the
+caller's transaction, however many expense rows the month already has.
+
+The UPDATE holds the counter's row lock until commit, so re-reading it gives
+the exact spend after the change and ``new - delta`` the spend before it.
+A threshold is crossed when ``limit * pct`` falls inside that interval; no
+expense rows are re-aggregated to find out.
+"""
+import datetime
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import F, Sum
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+
+from .models import Budget, BudgetAlert, BudgetCounter, Expense
+
+THRESHOLDS = (80, 100)
+ALL_TYPES = ""
+
+
+def month_of(value):
+    if isinstance(value, datetime.datetime) and timezone.is_aware(value):
+        value = timezone.localtime(value)
+    return datetime.date(value.year, value.month, 1)
+
+
+def _deltas(expenses, sign):
+    deltas = defaultdict(Decimal)
+    for expense in expenses:
+        month = month_of(expense.date_time)
+        amount = Decimal(str(expense.amount)) * sign
+        deltas[(month, expense.transaction_type)] += amount
+        deltas[(month, ALL_TYPES)] += amount
+    return deltas
+
+
+def _add(user_id, month, transaction_type, delta):
+    """Add ``delta`` to one counter and return its new value."""
+    counters = BudgetCounter.objects.filter(user_id=user_id, month=month, transaction_type=transaction_type)
+    if not counters.update(spent=F("spent") + delta):
+        try:
+            with transaction.atomic():
+                BudgetCounter.objects.create(
+                    user_id=user_id, month=month, transaction_type=transaction_type, spent=delta
+                )
+            return delta
+        except IntegrityError:
+            # Created concurrently; ours is an ordinary increment after all.
+            counters.update(spent=F("spent") + delta)
+    return counters.values_list("spent", flat=True).get()
+
+
+def apply(user_id, expenses, sign=1):
+    """Add (``sign=1``) or remove (``sign=-1``) ``expenses`` from the counters."""
+    deltas = _deltas(expenses, sign)
+    if not deltas:
+        return []
+    with transaction.atomic():
+        changes = {
+            key: _add(user_id, key[0], key[1], delta)
+            for key, delta in sorted(deltas.items()) if delta
+        }
+        if sign < 0:
+            return []
+        return _check_thresholds(user_id, {k: (v - deltas[k], v) for k, v in changes.items()})
+
+
+def _check_thresholds(user_id, movements):
+    """Create alerts for every threshold crossed by the ``(before, after)`` movements."""
+    budgets = {b.transaction_type: b for b in Budget.objects.filter(user_id=user_id)}
+    alerts = []
+    for (month, transaction_type), (before, after) in movements.items():
+        budget = budgets.get(transaction_type)
+        if budget is None or budget.limit <= 0:
+            continue
+        for pct in THRESHOLDS:
+            mark = budget.limit * pct / 100
+            if before < mark <= after:
+                alerts.append(BudgetAlert(budget=budget, month=month, threshold=pct, spent=after))
+    if alerts:
+        BudgetAlert.objects.bulk_create(alerts, ignore_conflicts=True)
+    return alerts
+
+
+def check_budget(budget, month=None):
+    """Alert on thresholds a new or changed budget is already past this month."""
+    month = month or month_of(timezone.now())
+    spent = BudgetCounter.objects.filter(
+        user_id=budget.user_id, month=month, transaction_type=budget.transaction_type
+    ).values_list("spent", flat=True).first()
+    if not spent:
+        return []
+    return _check_thresholds(budget.user_id, {(month, budget.transaction_type): (Decimal("0"), spent)})
+
+
+def status(user_id, month):
+    """Budget usage for ``month`` (first day), read from the counters only."""
+    spent = dict(
+        BudgetCounter.objects.filter(user_id=user_id, month=month)
+        .values_list("transaction_type", "spent")
+    )
+    alerted = defaultdict(list)
+    for budget_id, threshold in BudgetAlert.objects.filter(
+        budget__user_id=user_id, month=month
+    ).values_list("budget_id", "threshold"):
+        alerted[budget_id].append(threshold)
+
+    rows = []
+    for budget in Budget.objects.filter(user_id=user_id).order_by("transaction_type"):
+        used = spent.get(budget.transaction_type, Decimal("0"))
+        rows.append({
+            "id": budget.pk,
+            "transaction_type": budget.transaction_type or None,
+            "limit": budget.limit,
+            "spent": used,
+            "remaining": budget.limit - used,
+            "percent": round(float(used / budget.limit * 100), 1) if budget.limit else None,
+            "alerts": sorted(alerted[budget.pk]),
+        })
+    return rows
+
+
+def rebuild(user_id):
+    """Recompute a user's counters from the expense table (backfills and repairs)."""
+    with transaction.atomic():
+        BudgetCounter.objects.filter(user_id=user_id).delete()
+        rows = (
+            Expense.objects.filter(created_by_id=user_id)
+            .annotate(month=TruncMonth("date_time"))
+            .values_list("month", "transaction_type")
+            .annotate(spent=Sum("amount"))
+            .order_by()
+        )
+        counters = defaultdict(Decimal)
+        for month, transaction_type, spent in rows:
+            month = month_of(month)
+            counters[(month, transaction_type)] += spent
+            counters[(month, ALL_TYPES)] += spent
+        BudgetCounter.objects.bulk_create([
+            BudgetCounter(user_id=user_id, month=month, transaction_type=transaction_type, spent=spent)
+            for (month, transaction_type), spent in counters.items()
+        ])
@@ -0,0 +1,169 @@
+"""
+Keyword rules that categorise expenses.
+
+A user's rules are compiled into one combined, case-insensitive regex per
+field, so categorising an expense is a single scan of its receiver name and
+transaction type however many rules there are. Alternatives are ordered by
+priority (then keyword length), and the best-ranked match wins.
+
+Compiled matchers are cached per process for the ``MATCHER_CACHE_SIZE`` most
+recently used users, under the user's rule version, which every rule change
+bumps in the shared cache (see ``core.signals``), so all workers recompile
+after an edit.
+"""
+import re
+import threading
+from collections import OrderedDict
+
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+from . import sync
+from .models import CategoryRule, Expense
+from .versioning import bump_ledger_version
+
+RECLASSIFY_CHUNK_SIZE = 10000
+
+MATCHER_CACHE_SIZE = 256
+
+_lock = threading.Lock()
+_matchers = OrderedDict()  # user_id -> (rules version, Matcher), least recently used first
+
+
+def _version_key(user_id):
+    return f"category_rules:version:{user_id}"
+
+
+def rules_version(user_id):
+    version = cache.get(_version_key(user_id))
+    if version is None:
+        cache.add(_version_key(user_id), 1, timeout=None)
+        version = cache.get(_version_key(user_id), 1)
+    return version
+
+
+def bump_rules_version(user_id):
+    try:
+        cache.incr(_version_key(user_id))
+    except ValueError:
+        cache.add(_version_key(user_id), 2, timeout=None)
+
+
+class Matcher:
+    def __init__(self, rules):
+        # Rank 0 is the best: highest priority, then the longest keyword.
+        ranked = sorted(
+            (r for r in rules if r.keyword.strip()),
+            key=lambda r: (-r.priority, -len(r.keyword), r.pk or 0),
+        )
+        self.categories = [r.category for r in ranked]
+        self.patterns = {
+            field: self._compile([
+                (rank, r.keyword.strip()) for rank, r in enumerate(ranked) if r.field in ("any", field)
+            ])
+            for field in ("receiver_name", "transaction_type")
+        }
+
+    @staticmethod
+    def _compile(keywords):
+        if not keywords:
+            return None
+        # Each alternative sits in a lookahead, so the scan tries every
+        # start position and overlapping keywords all match.
+        return re.compile(
+            "|".join(f"(?=(?P<r{rank}>{re.escape(keyword)}))" for rank, keyword in keywords),
+            re.IGNORECASE,
+        )
+
+    def _best_rank(self, pattern, text):
+        if pattern is None or not text:
+            return None
+        # At one position only the first matching alternative is reported,
+        # which is also the best-ranked there.
+        ranks = [int(m.lastgroup[1:]) for m in pattern.finditer(text)]
+        return min(ranks) if ranks else None
+
+    def match(self, receiver_name, transaction_type):
+        ranks = [
+            rank for rank in (
+                self._best_rank(self.patterns["receiver_name"], receiver_name),
+                self._best_rank(self.patterns["transaction_type"], transaction_type),
+            ) if rank is not None
+        ]
+        return self.categories[min(ranks)] if ranks else None
+
+    def __bool__(self):
+        return bool(self.categories)
+
+
+def get_matcher(user_id):
+    version = rules_version(user_id)
+    with _lock:
+        cached = _matchers.get(user_id)
+        if cached and cached[0] == version:
+            _matchers.move_to_end(user_id)
+            return cached[1]
+    matcher = Matcher(CategoryRule.objects.filter(user_id=user_id))
+    with _lock:
+        _matchers[user_id] = (version, matcher)
+        _matchers.move_to_end(user_id)
+        while len(_matchers) > MATCHER_CACHE_SIZE:
+            _matchers.popitem(last=False)
+    return matcher
+
+
+def match(user_id, receiver_name, transaction_type):
+    matcher = get_matcher(user_id)
+    return matcher.match(receiver_name, transaction_type) if matcher else None
+
+
+def categorize(user_id, expenses):
+    """Fill in ``category`` on unsaved ``expenses`` that don't have one."""
+    matcher = get_matcher(user_id)
+    if not matcher:
+        return
+    for expense in expenses:
+        if not expense.category:
+            expense.category = matcher.match(expense.receiver_name, expense.transaction_type)
+
+
+def reclassify(user_id, only_uncategorised=False, chunk_size=RECLASSIFY_CHUNK_SIZE):
+    """Re-apply the user's rules to their whole ledger.
+
+    Walks the expenses in primary-key chunks, matches them in memory and
+    writes one ``UPDATE ... WHERE id IN (...)`` per category per chunk.
+    Rows no rule matches keep their category. Returns the number of rows
+    changed.
+    """
+    matcher = get_matcher(user_id)
+    if not matcher:
+        return 0
+    qs = Expense.objects.filter(created_by_id=user_id)
+    if only_uncategorised:
+        qs = qs.filter(category__isnull=True)
+    changed = 0
+    last_id = 0
+    while True:
+        rows = list(
+            qs.filter(id__gt=last_id).order_by("id")
+            .values_list("id", "receiver_name", "transaction_type", "category")[:chunk_size]
+        )
+        if not rows:
+            break
+        last_id = rows[-1][0]
+        updates = {}
+        for pk, receiver_name, transaction_type, current in rows:
+            category = matcher.match(receiver_name, transaction_type)
+            if category is not None and category != current:
+                updates.setdefault(category, []).append(pk)
+        if updates:
+            now = timezone.now()
+            with transaction.atomic():
+                for category, ids in updates.items():
+                    Expense.objects.filter(id__in=ids).update(category=category, updated_at=now)
+                    sync.record(user_id, "expense", ids)
+            changed += sum(len(ids) for ids in updates.values())
+    if changed:
+        bump_ledger_version(user_id)
+    return changed
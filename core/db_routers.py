@@ -0,0 +1,167 @@
+"""
+Read-replica routing.
+
+Views opt in per request (``ReplicaReadMixin`` / ``begin``); everything
+else, and every write, goes to ``default``. Routing is read-your-writes
+safe: a write pins its user to the primary for ``READ_AFTER_WRITE_PIN_SECONDS``
+(shared through the cache, so it holds across workers). A replica that is
+unreachable or further behind than ``REPLICA_MAX_LAG_SECONDS`` is skipped,
+falling back to the primary when none is usable.
+
+Replica aliases come from ``settings.DATABASE_REPLICAS``.
+"""
+import contextvars
+import random
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+from rest_framework.permissions import SAFE_METHODS
+
+from . import metrics
+
+LAG_CHECK_INTERVAL = getattr(settings, "REPLICA_LAG_CHECK_INTERVAL", 5)
+
+# Caught up (receive == replay LSN) counts as no lag even when the primary
+# has been idle; a server that isn't a standby reports NULLs, i.e. 0.
+LAG_SQL = """
+SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+            ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+       END
+"""
+
+
+class RoutingState:
+    __slots__ = ("user_id", "allow_replica", "pinned", "replica")
+
+    def __init__(self, user_id, allow_replica, pinned):
+        self.user_id = user_id
+        self.allow_replica = allow_replica
+        self.pinned = pinned
+        self.replica = None
+
+
+# Holds a mutable RoutingState so writes made in sync_to_async threads
+# (which run in a copy of the context) still pin the request.
+_state = contextvars.ContextVar("db_routing", default=None)
+_lag_lock = threading.Lock()
+_lag = {}  # alias -> (checked_at, seconds or None when unreachable)
+
+
+def _pin_key(user_id):
+    return f"db:pin:{user_id}"
+
+
+def replicas():
+    return list(getattr(settings, "DATABASE_REPLICAS", []))
+
+
+def is_pinned(user_id):
+    return user_id is not None and cache.get(_pin_key(user_id)) is not None
+
+
+def pin(user_id):
+    cache.set(_pin_key(user_id), 1, timeout=getattr(settings, "READ_AFTER_WRITE_PIN_SECONDS", 10))
+
+
+def begin(user_id, allow_replica):
+    """Start routing a request; returns a token for ``end``."""
+    allow = allow_replica and bool(replicas())
+    return _state.set(RoutingState(user_id, allow, allow and is_pinned(user_id)))
+
+
+def end(token):
+    _state.reset(token)
+
+
+def replica_lag(alias):
+    """Seconds behind the primary, or ``None`` if unreachable (cached briefly)."""
+    now = time.monotonic()
+    checked = _lag.get(alias)
+    if checked and now - checked[0] < LAG_CHECK_INTERVAL:
+        return checked[1]
+    with _lag_lock:
+        checked = _lag.get(alias)
+        if checked and now - checked[0] < LAG_CHECK_INTERVAL:
+            return checked[1]
+        try:
+            connection = connections[alias]
+            if connection.vendor == "postgresql":
+                with connection.cursor() as cursor:
+                    cursor.execute(LAG_SQL)
+                    lag = float(cursor.fetchone()[0] or 0)
+            else:
+                connection.ensure_connection()
+                lag = 0.0
+        except Exception:
+            lag = None
+        _lag[alias] = (now, lag)
+    # Every worker measures the same replica: merge with max, not sum.
+    metrics.set_gauge("db_replica_lag_seconds", -1 if lag is None else lag, merge="max", alias=alias)
+    return lag
+
+
+def healthy_replica():
+    max_lag = getattr(settings, "REPLICA_MAX_LAG_SECONDS", 5)
+    candidates = replicas()
+    random.shuffle(candidates)
+    for alias in candidates:
+        lag = replica_lag(alias)
+        if lag is not None and lag <= max_lag:
+            return alias
+    return None
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        state = _state.get()
+        if state is None or not state.allow_replica or state.pinned:
+            return DEFAULT_DB_ALIAS
+        # Reads inside a transaction on the primary must see its writes.
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        if state.replica is None:
+            # One replica per request keeps its reads mutually consistent.
+            state.replica = healthy_replica() or DEFAULT_DB_ALIAS
+            if state.replica == DEFAULT_DB_ALIAS:
+                metrics.inc("db_replica_fallbacks_total")
+        return state.replica
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state is not None and state.user_id is not None and not state.pinned:
+            state.pinned = True
+            pin(state.user_id)
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        aliases = {DEFAULT_DB_ALIAS, *replicas()}
+        if obj1._state.db in aliases and obj2._state.db in aliases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas receive the schema through replication.
+        return db not in replicas()
+
+
+class ReplicaReadMixin:
+    """Serve safe requests for ``replica_actions`` (``None``: all) from a replica."""
+    replica_actions = None
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        allow = request.method in SAFE_METHODS and (
+            self.replica_actions is None or self.action in self.replica_actions
+        )
+        self._routing_token = begin(request.user.pk, allow)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        token = getattr(self, "_routing_token", None)
+        if token is not None:
+            self._routing_token = None
+            end(token)
+        return response
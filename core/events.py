@@ -0,0 +1,40 @@
+"""
+Hooks run for every expense and income write, on every ingestion path.
+
+Views, the Gmail importer and bulk commands call these instead of updating
+derived per-user state themselves. Bulk paths use ``bulk_create``, which
+skips model signals, so signals can't do this job.
+"""
+from django.db import transaction
+
+from . import budgets, payees, snapshots
+
+
+def expenses_created(user_id, expenses):
+    expenses = list(expenses)
+    if not expenses:
+        return
+    with transaction.atomic():
+        payees.record_expenses(user_id, expenses)
+        budgets.apply(user_id, expenses)
+        # Signals cover saved rows; this catches bulk_create.
+        snapshots.invalidate(user_id, expenses)
+
+
+def expense_updated(user_id, before, expense):
+    """``before`` is a detached copy of ``expense`` taken before the save."""
+    with transaction.atomic():
+        payees.update_expense(user_id, before, expense)
+        budgets.apply(user_id, [before], sign=-1)
+        budgets.apply(user_id, [expense])
+
+
+def expense_deleted(user_id, expense):
+    with transaction.atomic():
+        payees.remove_expense(user_id, expense.receiver_name, expense.amount)
+        budgets.apply(user_id, [expense], sign=-1)
+
+
+def incomes_created(user_id, incomes):
+    """Bulk-inserted incomes; saved and deleted ones are covered by signals."""
+    snapshots.invalidate(user_id, incomes)
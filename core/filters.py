@@ -0,0 +1,182 @@
+"""
+Query-string filters and facet counts for the expense list.
+
+Every filter becomes a plain range/equality predicate on a raw column
+(``date_time >= start`` rather than ``date_time::date >= day``) so the
+``(created_by, date_time)`` index and partition pruning can be used.
+"""
+import datetime
+import math
+from decimal import Decimal, InvalidOperation
+
+from django.db.models import Count, Q
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+
+# (label, lower bound inclusive, upper bound exclusive)
+AMOUNT_BUCKETS = [
+    ("0-500", None, Decimal("500")),
+    ("500-2000", Decimal("500"), Decimal("2000")),
+    ("2000-10000", Decimal("2000"), Decimal("10000")),
+    ("10000-50000", Decimal("10000"), Decimal("50000")),
+    ("50000+", Decimal("50000"), None),
+]
+TRUE_VALUES = {"1", "true", "yes"}
+FALSE_VALUES = {"0", "false", "no"}
+
+
+def start_of_day(value, param):
+    try:
+        day = datetime.date.fromisoformat(value)
+    except ValueError:
+        raise ValidationError({param: "Expected a date in YYYY-MM-DD format."})
+    return timezone.make_aware(datetime.datetime.combine(day, datetime.time.min))
+
+
+def _decimal(value, param):
+    try:
+        return Decimal(value)
+    except InvalidOperation:
+        raise ValidationError({param: "Expected a number."})
+
+
+def int_param(params, param, default, minimum=None, maximum=None):
+    value = params.get(param)
+    if value in (None, ""):
+        return default
+    try:
+        number = int(value)
+    except ValueError:
+        raise ValidationError({param: "Expected an integer."})
+    if minimum is not None and number < minimum:
+        raise ValidationError({param: f"Must be at least {minimum}."})
+    if maximum is not None and number > maximum:
+        raise ValidationError({param: f"Must be at most {maximum}."})
+    return number
+
+
+def float_param(params, param, default, minimum=None):
+    value = params.get(param)
+    if value in (None, ""):
+        return default
+    try:
+        number = float(value)
+    except ValueError:
+        raise ValidationError({param: "Expected a number."})
+    if not math.isfinite(number):
+        raise ValidationError({param: "Expected a finite number."})
+    if minimum is not None and number < minimum:
+        raise ValidationError({param: f"Must be at least {minimum}."})
+    return number
+
+
+def filter_groups(params):
+    """
+    The filters in ``params`` as ``{facet: Q}``; a facet's own filter can be
+    dropped so its counts cover the values a client could switch to.
+    """
+    groups = {}
+    from_date = params.get("from_date")
+    to_date = params.get("to_date")
+    if from_date:
+        groups["from_date"] = Q(date_time__gte=start_of_day(from_date, "from_date"))
+    if to_date:
+        groups["to_date"] = Q(date_time__lt=start_of_day(to_date, "to_date") + datetime.timedelta(days=1))
+
+    amount = Q()
+    min_amount = params.get("min_amount")
+    max_amount = params.get("max_amount")
+    if min_amount:
+        amount &= Q(amount__gte=_decimal(min_amount, "min_amount"))
+    if max_amount:
+        amount &= Q(amount__lte=_decimal(max_amount, "max_amount"))
+    if amount:
+        groups["amount"] = amount
+
+    has_fee = params.get("has_fee", "").lower()
+    if has_fee in TRUE_VALUES:
+        groups["has_fee"] = Q(fee__gt=0)
+    elif has_fee in FALSE_VALUES:
+        groups["has_fee"] = Q(fee=0)
+
+    types = [t.strip() for t in params.get("transaction_type", "").split(",") if t.strip()]
+    if types:
+        groups["transaction_type"] = Q(transaction_type__in=types)
+
+    receiver = params.get("receiver")
+    if receiver:
+        groups["receiver"] = Q(receiver_name=receiver)
+
+    category = params.get("category")
+    if category == "none":
+        groups["category"] = Q(category__isnull=True)
+    elif category:
+        groups["category"] = Q(category__in=[c.strip() for c in category.split(",") if c.strip()])
+    return groups
+
+
+def filter_expenses(qs, params):
+    return qs.filter(*filter_groups(params).values())
+
+
+def _bucket_q(low, high):
+    q = Q()
+    if low is not None:
+        q &= Q(amount__gte=low)
+    if high is not None:
+        q &= Q(amount__lt=high)
+    return q
+
+
+FACETS = ("transaction_type", "amount", "has_fee")
+
+
+def _all_but(groups, facet=None):
+    q = Q()
+    for name, group in groups.items():
+        if name != facet:
+            q &= group
+    return q
+
+
+def expense_facets(qs, params):
+    """
+    Facet counts for ``qs`` filtered by ``params``, in one grouped,
+    conditionally aggregated query. Each facet is counted with every filter
+    except its own, so selecting a transaction type still lists the others.
+    """
+    groups = filter_groups(params)
+    qs = qs.filter(*(group for name, group in groups.items() if name not in FACETS))
+    matches = _all_but(groups)
+    aggregates = {
+        "total": Count("id", filter=matches),
+        "count": Count("id", filter=_all_but(groups, "transaction_type")),
+        "with_fee": Count("id", filter=_all_but(groups, "has_fee") & Q(fee__gt=0)),
+        "without_fee": Count("id", filter=_all_but(groups, "has_fee") & Q(fee=0)),
+    }
+    others = _all_but(groups, "amount")
+    for i, (_, low, high) in enumerate(AMOUNT_BUCKETS):
+        aggregates[f"bucket_{i}"] = Count("id", filter=others & _bucket_q(low, high))
+    rows = list(qs.order_by().values("transaction_type").annotate(**aggregates))
+
+    return {
+        "total": sum(row["total"] for row in rows),
+        "transaction_type": [
+            {"value": row["transaction_type"], "count": row["count"]}
+            for row in sorted(rows, key=lambda row: (-row["count"], row["transaction_type"]))
+            if row["count"]
+        ],
+        "amount": [
+            {
+                "label": label,
+                "min": low,
+                "max": high,
+                "count": sum(row[f"bucket_{i}"] for row in rows),
+            }
+            for i, (label, low, high) in enumerate(AMOUNT_BUCKETS)
+        ],
+        "has_fee": {
+            "true": sum(row["with_fee"] for row in rows),
+            "false": sum(row["without_fee"] for row in rows),
+        },
+    }
@@ -0,0 +1,151 @@
+"""
+Admin reporting across all users.
+
+The user id space is cut into ``FLEET_CHUNK_SIZE`` ranges and each range is
+aggregated by its own thread (``FLEET_WORKERS``), so no single query has to
+scan the whole ledger. Each chunk makes two grouped queries and returns
+partial sums; ``report`` merges them. The merged result is cached for
+``FLEET_CACHE_SECONDS`` and computed under ``single_flight``, so concurrent
+admins share one run.
+
+Threads rather than processes: chunks are I/O-bound database queries, and
+each thread runs in a copy of the request context so replica routing
+(``core.db_routers``) applies to it too.
+"""
+import contextvars
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncMonth
+
+from . import metrics
+from .budgets import month_of
+from .models import Expense, LedgerEntry, User
+from .throttling import single_flight
+
+CHUNK_SIZE = getattr(settings, "FLEET_CHUNK_SIZE", 500)
+WORKERS = getattr(settings, "FLEET_WORKERS", 4)
+CACHE_SECONDS = getattr(settings, "FLEET_CACHE_SECONDS", 300)
+PERCENTILES = (50, 90, 99)
+
+
+def user_chunks(size=CHUNK_SIZE):
+    """``(first_id, last_id)`` ranges of ``size`` users each.
+
+    Walks the primary key by keyset, fetching only each range's boundary ids.
+    """
+    ids = User.objects.order_by("id").values_list("id", flat=True)
+    chunks = []
+    first = ids.first()
+    while first is not None:
+        rest = ids.filter(id__gte=first)
+        last = next(iter(rest[size - 1:size]), None)
+        if last is None:
+            last = rest.order_by("-id").first()
+        chunks.append((first, last))
+        first = ids.filter(id__gt=last).first()
+    return chunks
+
+
+def _chunk(first_id, last_id, start, end):
+    try:
+        entries = (
+            LedgerEntry.objects.filter(user_id__gte=first_id, user_id__lte=last_id, ts__gte=start, ts__lt=end)
+            .annotate(month=TruncMonth("ts"))
+            .values_list("month", "user_id", "kind")
+            .annotate(total=Sum("amount"), n=Count("id"))
+            .order_by()
+        )
+        types = (
+            Expense.objects.filter(
+                created_by_id__gte=first_id, created_by_id__lte=last_id, date_time__gte=start, date_time__lt=end
+            )
+            .values_list("transaction_type")
+            .annotate(total=Sum("amount"), n=Count("id"))
+            .order_by()
+        )
+        return list(entries), list(types)
+    finally:
+        connections.close_all()  # this thread's connections only
+
+
+def _percentile(values, pct):
+    """Linear-interpolated percentile of sorted ``values``."""
+    if not values:
+        return None
+    pos = (len(values) - 1) * pct / 100
+    lo = int(pos)
+    hi = min(lo + 1, len(values) - 1)
+    return round(float(values[lo] + (values[hi] - values[lo]) * Decimal(pos - lo)), 2)
+
+
+def _merge(parts):
+    totals = {kind: {"amount": Decimal("0"), "count": 0} for kind in ("expense", "income")}
+    active = set()
+    months = defaultdict(lambda: {"users": set(), "expense": Decimal("0"), "income": Decimal("0"), "spend": []})
+    types = defaultdict(lambda: [Decimal("0"), 0])
+    for entries, type_rows in parts:
+        for month, user_id, kind, total, n in entries:
+            totals[kind]["amount"] += total
+            totals[kind]["count"] += n
+            active.add(user_id)
+            bucket = months[month_of(month)]
+            bucket["users"].add(user_id)
+            bucket[kind] += total
+            if kind == "expense":
+                bucket["spend"].append(total)
+        for transaction_type, total, n in type_rows:
+            types[transaction_type][0] += total
+            types[transaction_type][1] += n
+
+    timeline = []
+    for month in sorted(months):
+        bucket = months[month]
+        spend = sorted(bucket["spend"])
+        timeline.append({
+            "month": month.strftime("%Y-%m"),
+            "active_users": len(bucket["users"]),
+            "expenses": bucket["expense"],
+            "income": bucket["income"],
+            "spend_percentiles": {f"p{pct}": _percentile(spend, pct) for pct in PERCENTILES},
+        })
+    return {
+        "totals": totals,
+        "active_users": len(active),
+        "transaction_types": [
+            {"transaction_type": t, "total": total, "count": n}
+            for t, (total, n) in sorted(types.items(), key=lambda item: -item[1][0])
+        ],
+        "months": timeline,
+    }
+
+
+def compute(start, end, chunk_size=CHUNK_SIZE, workers=WORKERS):
+    chunks = user_chunks(chunk_size)
+    with metrics.timer("fleet_report_seconds"), ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = [
+            pool.submit(contextvars.copy_context().run, _chunk, first_id, last_id, start, end)
+            for first_id, last_id in chunks
+        ]
+        parts = [future.result() for future in futures]
+    result = _merge(parts)
+    result.update(users=User.objects.count(), chunks=len(chunks), start=start, end=end)
+    return result
+
+
+def report(start, end):
+    """Fleet-wide report for ``[start, end)``, cached and computed once at a time."""
+    key = f"fleet:report:{start:%Y%m%d}:{end:%Y%m%d}"
+    result = cache.get(key)
+    if result is None:
+        def build():
+            value = compute(start, end)
+            cache.set(key, value, timeout=CACHE_SECONDS)
+            return value
+        result = single_flight(key, build)
+    return result
@@ -0,0 +1,156 @@
+"""
+Unified ledger over expenses and incomes.
+
+``core_ledger`` is a plain database view (``UNION ALL`` of both tables) with
+one row per transaction: a signed amount (incomes positive, expenses
+negative), a single ``ts`` timestamp (incomes at midnight UTC of their date),
+the kind and the source. ``LedgerEntry`` maps it read-only, so reports and
+exports read one ordered stream instead of two tables with separate
+aggregates. Each branch is served by its table's (user, time) index.
+
+Each version of the view SQL is kept as a constant (``LEDGER_SQL_V1``, ...)
+and migrations name the version they create, so an old migration replays the
+view it shipped with. ``LEDGER_SQL`` is the current one.
+"""
+from django.db.migrations.operations.base import Operation
+from django.db.models import DecimalField, F, Sum, Value, Window
+
+from .models import LedgerEntry
+
+VIEW = "core_ledger"
+
+LEDGER_SQL_V1 = {
+    "postgresql": f"""
+CREATE OR REPLACE VIEW {VIEW} AS
+SELECT 'expense-' || e.id AS id, 'expense' AS kind, e.id AS source_id,
+       e.created_by_id AS user_id, e.date_time AS ts,
+       e.amount AS amount, -e.amount AS signed_amount,
+       e.transaction_type AS source, e.receiver_name AS counterparty
+FROM core_expense e
+UNION ALL
+SELECT 'income-' || i.id, 'income', i.id,
+       i.created_by_id, (i.date::timestamp AT TIME ZONE 'UTC'),
+       i.amount, i.amount,
+       i.source, i.title
+FROM core_income i
+""",
+    "sqlite": f"""
+CREATE VIEW IF NOT EXISTS {VIEW} AS
+SELECT 'expense-' || e.id AS id, 'expense' AS kind, e.id AS source_id,
+       e.created_by_id AS user_id, e.date_time AS ts,
+       e.amount AS amount, -e.amount AS signed_amount,
+       e.transaction_type AS source, e.receiver_name AS counterparty
+FROM core_expense e
+UNION ALL
+SELECT 'income-' || i.id, 'income', i.id,
+       i.created_by_id, i.date || ' 00:00:00',
+       i.amount, i.amount,
+       i.source, i.title
+FROM core_income i
+""",
+}
+
+LEDGER_SQL = LEDGER_SQL_V1
+
+# Lets the income branch of the view keep its ORDER BY ts on an index.
+INCOME_TS_INDEX = (
+    "CREATE INDEX IF NOT EXISTS income_user_ts_idx "
+    "ON core_income (created_by_id, ((date::timestamp AT TIME ZONE 'UTC')))"
+)
+
+
+def _create_sql(connection, sql):
+    try:
+        return sql[connection.vendor]
+    except KeyError:
+        raise NotImplementedError(f"No ledger view for database vendor '{connection.vendor}'.")
+
+
+DROP_SQL = f"DROP VIEW IF EXISTS {VIEW}"
+
+
+def create_view(connection, sql=LEDGER_SQL):
+    with connection.cursor() as cursor:
+        cursor.execute(_create_sql(connection, sql))
+
+
+def drop_view(connection):
+    with connection.cursor() as cursor:
+        cursor.execute(DROP_SQL)
+
+
+class RecreateView(Operation):
+    """Run ``operations`` with the ledger view dropped, then create it from ``sql``.
+
+    SQLite rebuilds a table to alter it and refuses while a view depends on
+    it, so migrations that alter Expense or Income wrap those operations in
+    this. ``sql`` is one of the pinned ``LEDGER_SQL_V*`` versions.
+    """
+
+    def __init__(self, operations, sql):
+        self.operations = operations
+        self.sql = sql
+
+    def state_forwards(self, app_label, state):
+        for operation in self.operations:
+            operation.state_forwards(app_label, state)
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        schema_editor.execute(DROP_SQL)
+        for operation in self.operations:
+            to_state = from_state.clone()
+            operation.state_forwards(app_label, to_state)
+            operation.database_forwards(app_label, schema_editor, from_state, to_state)
+            from_state = to_state
+        schema_editor.execute(_create_sql(schema_editor.connection, self.sql))
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        states = [to_state]
+        for operation in self.operations[:-1]:
+            state = states[-1].clone()
+            operation.state_forwards(app_label, state)
+            states.append(state)
+        schema_editor.execute(DROP_SQL)
+        after = from_state
+        for operation, before in zip(reversed(self.operations), reversed(states)):
+            operation.database_backwards(app_label, schema_editor, after, before)
+            after = before
+        schema_editor.execute(_create_sql(schema_editor.connection, self.sql))
+
+    def describe(self):
+        return "Recreate the ledger view around: " + "; ".join(op.describe() for op in self.operations)
+
+
+def entries(user, start=None, end=None, kind=None):
+    """Return the user's ledger rows in ``[start, end)`` in chronological order."""
+    qs = LedgerEntry.objects.filter(user=user)
+    if start:
+        qs = qs.filter(ts__gte=start)
+    if end:
+        qs = qs.filter(ts__lt=end)
+    if kind:
+        qs = qs.filter(kind=kind)
+    return qs.order_by("ts", "id")
+
+
+def opening_balance(user, start):
+    """Net of everything before ``start`` (0 when the feed is unbounded)."""
+    if not start:
+        return 0
+    return LedgerEntry.objects.filter(user=user, ts__lt=start).aggregate(
+        total=Sum("signed_amount")
+    )["total"] or 0
+
+
+def feed(user, start=None, end=None):
+    """Chronological rows annotated with ``running_balance``.
+
+    The running sum is a SQL window over the filtered range, offset by the
+    opening balance, so paginating the feed never replays earlier rows in
+    Python.
+    """
+    money = DecimalField(max_digits=14, decimal_places=2)
+    window = Window(Sum("signed_amount"), order_by=[F("ts").asc(), F("id").asc()])
+    return entries(user, start, end).annotate(
+        running_balance=window + Value(opening_balance(user, start), output_field=money)
+    )
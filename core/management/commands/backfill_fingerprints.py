@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from core import fingerprints
+from core.models import User
+
+
+class Command(BaseCommand):
+    help = "Fingerprint expenses created before fingerprinting and report likely duplicates."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--user", action="append", help="Username; repeat for several. Default: all users.")
+        parser.add_argument("--chunk-size", type=int, default=fingerprints.BACKFILL_CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        users = User.objects.all()
+        if options["user"]:
+            users = users.filter(username__in=options["user"])
+        for user in users.iterator():
+            done = fingerprints.backfill(user.pk, options["chunk_size"])
+            groups = fingerprints.duplicate_groups(user.pk)
+            extra = sum(n - 1 for _, n in groups)
+            self.stdout.write(
+                f"{user.username}: {done} fingerprinted, {len(groups)} duplicate groups ({extra} extra rows)"
+            )
@@ -0,0 +1,16 @@
+import datetime
+
+from django.core.management.base import BaseCommand
+
+from core import receipts
+
+
+class Command(BaseCommand):
+    help = "Delete receipts no expense references any more, and their files."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--grace-hours", type=int, default=24, help="Keep receipts younger than this.")
+
+    def handle(self, *args, **options):
+        deleted = receipts.delete_unreferenced(datetime.timedelta(hours=options["grace_hours"]))
+        self.stdout.write(f"Deleted {deleted} unreferenced receipts")
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from core import sync
+from core.models import User
+
+
+class Command(BaseCommand):
+    help = "Drop superseded sync changes and tombstones past SYNC_RETENTION_DAYS."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=int, default=sync.RETENTION_DAYS, help="Tombstone retention in days.")
+
+    def handle(self, *args, **options):
+        total = 0
+        for user_id in User.objects.order_by("id").values_list("id", flat=True).iterator():
+            total += sync.compact(user_id, options["days"])
+        self.stdout.write(f"Deleted {total} sync changes")
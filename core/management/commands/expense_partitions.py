@@ -0,0 +1,65 @@
+import datetime
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from core import partitions
+
+
+class Command(BaseCommand):
+    help = "Manage monthly partitions of the expense table (PostgreSQL only)."
+
+    def add_arguments(self, parser):
+        sub = parser.add_subparsers(dest="subcommand", required=True)
+        sub.add_parser("status", help="List partitions and row estimates.")
+        enable = sub.add_parser("enable", help="Convert core_expense into a partitioned table.")
+        enable.add_argument("--months-ahead", type=int, default=3)
+        ensure = sub.add_parser("ensure", help="Create partitions for upcoming months.")
+        ensure.add_argument("--months-ahead", type=int, default=3)
+        archive = sub.add_parser("archive", help="Detach old partitions into compressed files.")
+        archive.add_argument("--older-than", type=int, default=24, help="Age in months.")
+        archive.add_argument("--dir", default=getattr(settings, "EXPENSE_ARCHIVE_DIR", "archive"))
+        archive.add_argument("--dry-run", action="store_true")
+
+    def handle(self, *args, **options):
+        if connection.vendor != "postgresql":
+            raise CommandError("Expense partitioning requires PostgreSQL.")
+        subcommand = options["subcommand"]
+        if subcommand != "enable" and not partitions.is_partitioned(connection):
+            raise CommandError("core_expense is not partitioned; run `expense_partitions enable` first.")
+        getattr(self, f"handle_{subcommand}")(**options)
+
+    def handle_status(self, **options):
+        for name, rows in partitions.list_partitions(connection):
+            self.stdout.write(f"{name:32} ~{max(rows, 0)} rows")
+
+    def handle_enable(self, **options):
+        with transaction.atomic():
+            converted = partitions.partition_table(connection, options["months_ahead"])
+        self.stdout.write("Partitioned core_expense." if converted else "core_expense is already partitioned.")
+
+    def handle_ensure(self, **options):
+        until = datetime.date.today()
+        for _ in range(options["months_ahead"]):
+            until = partitions.next_month(until)
+        with transaction.atomic():
+            created = partitions.ensure_partitions(connection, until)
+        self.stdout.write(f"Created {len(created)} partition(s): {', '.join(created) or '-'}")
+
+    def handle_archive(self, **options):
+        cutoff = partitions.month_start(datetime.date.today())
+        for _ in range(options["older_than"]):
+            cutoff = datetime.date(cutoff.year - (cutoff.month == 1), (cutoff.month - 2) % 12 + 1, 1)
+        for name, rows in partitions.list_partitions(connection):
+            if name == partitions.DEFAULT_PARTITION:
+                continue
+            month = datetime.date(int(name[-7:-3]), int(name[-2:]), 1)
+            if month >= cutoff:
+                continue
+            if options["dry_run"]:
+                self.stdout.write(f"Would archive {name} (~{max(rows, 0)} rows)")
+                continue
+            with transaction.atomic():
+                path = partitions.archive_partition(connection, month, options["dir"])
+            self.stdout.write(f"Archived {name} to {path}")
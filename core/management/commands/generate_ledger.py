@@ -0,0 +1,134 @@
+import datetime
+import math
+import random
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from core import categories, events, fingerprints, sync
+from core.models import Expense, Income, Role, User
+from core.versioning import bump_ledger_version
+
+# Rough shape of real Easypaisa statements: transfers dominate, the long tail
+# is rare. Amounts are log-normal around a per-type median (PKR).
+TRANSACTION_TYPES = [
+    ("Money Transfer", 55, 2500),
+    ("Bill Payment", 18, 4000),
+    ("Mobile Load", 12, 300),
+    ("Raast Transfer", 8, 7000),
+    ("Merchant Payment", 5, 1500),
+    ("ATM Withdrawal", 2, 10000),
+]
+INCOME_SOURCES = [("Salary", 60), ("Freelance", 25), ("Rent", 10), ("Gift", 5)]
+FIRST_NAMES = ["Ali", "Ahmed", "Fatima", "Ayesha", "Bilal", "Hassan", "Sana", "Usman", "Zainab", "Omar"]
+LAST_NAMES = ["Khan", "Malik", "Sheikh", "Butt", "Qureshi", "Chaudhry", "Raza", "Siddiqui"]
+BILLERS = ["K-Electric", "SSGC", "PTCL", "LESCO", "Jazz", "Zong", "Daraz", "Foodpanda", "Careem"]
+
+
+class Command(BaseCommand):
+    help = "Generate synthetic expense/income ledgers for performance testing."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=10)
+        parser.add_argument("--years", type=float, default=1)
+        parser.add_argument("--per-day", type=float, default=5, help="Mean expenses per user per day.")
+        parser.add_argument("--incomes-per-month", type=int, default=2)
+        parser.add_argument("--payees", type=int, default=200, help="Distinct receivers per user.")
+        parser.add_argument("--prefix", default="synthetic")
+        parser.add_argument("--batch-size", type=int, default=5000)
+        parser.add_argument("--seed", type=int, default=None)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        role, _ = Role.objects.get_or_create(name="user")
+        end = timezone.now().replace(microsecond=0)
+        start = end - datetime.timedelta(days=int(365 * options["years"]))
+        days = (end - start).days
+
+        type_names = [t[0] for t in TRANSACTION_TYPES]
+        type_weights = [t[1] for t in TRANSACTION_TYPES]
+        medians = {t[0]: t[2] for t in TRANSACTION_TYPES}
+        # Zipf-like popularity: a handful of payees receive most payments.
+        payee_weights = [1 / (rank ** 1.2) for rank in range(1, options["payees"] + 1)]
+
+        total_expenses = total_incomes = 0
+        for u in range(options["users"]):
+            username = f"{options['prefix']}{u}"
+            user, created = User.objects.get_or_create(
+                username=username, defaults={"email": f"{username}@example.com", "role": role}
+            )
+            if created:
+                user.set_password("password")
+                user.save(update_fields=["password"])
+
+            payees = [self._payee(rng) for _ in range(options["payees"])]
+            expenses = []
+            seq = Expense.objects.filter(created_by=user).count()
+            for day in range(days):
+                date = start + datetime.timedelta(days=day)
+                for _ in range(self._poisson(rng, options["per_day"])):
+                    ttype = rng.choices(type_names, type_weights)[0]
+                    amount = Decimal(round(rng.lognormvariate(0, 0.8) * medians[ttype])).quantize(Decimal("0.01"))
+                    fee = Decimal("0.00") if rng.random() < 0.8 else Decimal(rng.choice([10, 15, 25, 40]))
+                    seq += 1
+                    expenses.append(Expense(
+                        transaction_id=f"syn-{user.pk}-{seq}",
+                        transaction_type=ttype,
+                        sender_name=username,
+                        receiver_name=rng.choices(payees, payee_weights)[0],
+                        amount=amount,
+                        fee=fee,
+                        total=amount + fee,
+                        # Daytime-heavy: most payments between 08:00 and 23:00.
+                        date_time=date.replace(hour=0, minute=0, second=0)
+                        + datetime.timedelta(seconds=int(min(max(rng.gauss(15.5, 4), 0), 23.99) * 3600)),
+                        origin="generated",
+                        created_by=user,
+                    ))
+
+            incomes = []
+            for month in range(int(days / 30)):
+                for _ in range(options["incomes_per_month"]):
+                    source = rng.choices([s[0] for s in INCOME_SOURCES], [s[1] for s in INCOME_SOURCES])[0]
+                    incomes.append(Income(
+                        title=f"{source} payment",
+                        amount=Decimal(round(rng.lognormvariate(0, 0.4) * 80000)).quantize(Decimal("0.01")),
+                        source=source,
+                        date=(start + datetime.timedelta(days=month * 30 + rng.randrange(30))).date(),
+                        created_by=user,
+                    ))
+
+            categories.categorize(user.pk, expenses)
+            for expense in expenses:
+                expense.fingerprint = fingerprints.of(expense)
+            with transaction.atomic():
+                Expense.objects.bulk_create(expenses, batch_size=options["batch_size"])
+                events.expenses_created(user.pk, expenses)
+                Income.objects.bulk_create(incomes, batch_size=options["batch_size"])
+                events.incomes_created(user.pk, incomes)
+                sync.record(user.pk, "expense", [e.pk for e in expenses])
+                sync.record(user.pk, "income", [i.pk for i in incomes])
+            bump_ledger_version(user.pk)
+            total_expenses += len(expenses)
+            total_incomes += len(incomes)
+            self.stdout.write(f"{username}: {len(expenses)} expenses, {len(incomes)} incomes")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Generated {total_expenses} expenses and {total_incomes} incomes for {options['users']} users."
+        ))
+
+    def _payee(self, rng):
+        if rng.random() < 0.2:
+            return rng.choice(BILLERS)
+        return f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"
+
+    def _poisson(self, rng, mean):
+        # Knuth's method; fine for the small per-day means used here.
+        limit, k, p = math.exp(-mean), 0, 1.0
+        while True:
+            p *= rng.random()
+            if p <= limit:
+                return k
+            k += 1
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from core import payees
+from core.models import User
+
+
+class Command(BaseCommand):
+    help = "Recompute payee aggregates from the expense table (backfill or repair)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--user", action="append", help="Username; repeat for several. Default: all users.")
+
+    def handle(self, *args, **options):
+        users = User.objects.all()
+        if options["user"]:
+            users = users.filter(username__in=options["user"])
+        for user in users.iterator():
+            payees.rebuild(user.pk)
+            self.stdout.write(f"{user.username}: {user.payees.count()} payees")
@@ -0,0 +1,24 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core import categories
+from core.models import User
+
+
+class Command(BaseCommand):
+    help = "Re-apply users' category rules to their existing expenses."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--user", action="append", help="Username; repeat for several. Default: all users.")
+        parser.add_argument("--only-uncategorised", action="store_true", help="Leave expenses that already have a category.")
+        parser.add_argument("--chunk-size", type=int, default=categories.RECLASSIFY_CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        users = User.objects.filter(category_rules__isnull=False).distinct()
+        if options["user"]:
+            users = users.filter(username__in=options["user"])
+        for user in users.iterator():
+            start = time.perf_counter()
+            changed = categories.reclassify(user.pk, options["only_uncategorised"], options["chunk_size"])
+            self.stdout.write(f"{user.username}: {changed} expenses updated in {time.perf_counter() - start:.2f}s")
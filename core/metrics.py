@@ -0,0 +1,260 @@
+"""
+Lightweight process-local metrics with cross-process aggregation.
+
+Every worker accumulates samples in plain in-memory dicts (no I/O on the hot
+path) and a background thread publishes a snapshot of them to the shared
+cache every ``FLUSH_INTERVAL`` seconds. The /metrics endpoint merges the
+snapshots of all live workers and renders them in the Prometheus text
+exposition format.
+
+Each worker claims one of ``MAX_PROCESSES`` slot keys with an atomic
+``cache.add`` and keeps it alive by republishing. A snapshot expires
+``SNAPSHOT_TTL`` (a few flush intervals) after its worker stops, which also
+frees the slot.
+"""
+import bisect
+import contextlib
+import contextvars
+import os
+import socket
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+
+FLUSH_INTERVAL = getattr(settings, "METRICS_FLUSH_INTERVAL", 5)
+SNAPSHOT_TTL = getattr(settings, "METRICS_SNAPSHOT_TTL", 3 * FLUSH_INTERVAL)
+MAX_PROCESSES = getattr(settings, "METRICS_MAX_PROCESSES", 256)
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+_lock = threading.Lock()
+_counters = defaultdict(float)
+_gauges = {}
+_gauge_merge = {}  # gauge name -> "max" for non-additive gauges
+_histograms = {}
+_collectors = []
+_last_flush = 0.0
+_slot = None  # (pid, slot index) claimed by this process
+_flusher_pid = None
+# Set while a request is being profiled (see ``record_stages``).
+_stages = contextvars.ContextVar("metrics_stages", default=None)
+
+
+def _process_id():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def _key(name, labels):
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def inc(name, value=1, **labels):
+    with _lock:
+        _counters[_key(name, labels)] += value
+    _maybe_flush()
+
+
+def set_gauge(name, value, merge="sum", **labels):
+    """``merge`` is how workers combine: "sum" for per-process shares (open
+    connections), "max" for values every worker observes on its own (replica
+    lag, configured pool sizes)."""
+    with _lock:
+        _gauges[_key(name, labels)] = value
+        if merge != "sum":
+            _gauge_merge[name] = merge
+
+
+def observe(name, value, buckets=DEFAULT_BUCKETS, **labels):
+    key = _key(name, labels)
+    with _lock:
+        hist = _histograms.get(key)
+        if hist is None:
+            hist = _histograms[key] = [tuple(buckets), [0] * (len(buckets) + 1), 0.0, 0]
+        hist[1][bisect.bisect_left(hist[0], value)] += 1
+        hist[2] += value
+        hist[3] += 1
+    _maybe_flush()
+
+
+@contextlib.contextmanager
+def timer(name, **labels):
+    """Observe the wall time of the ``with`` block into histogram ``name``."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        observe(name, elapsed, **labels)
+        stages = _stages.get()
+        if stages is not None:
+            stages[_key(name, labels)][0] += 1
+            stages[_key(name, labels)][1] += elapsed
+
+
+@contextlib.contextmanager
+def record_stages():
+    """Also collect every ``timer`` block run inside the ``with`` block.
+
+    Yields a dict of ``(name, labels) -> [count, total_seconds]``.
+    """
+    stages = defaultdict(lambda: [0, 0.0])
+    token = _stages.set(stages)
+    try:
+        yield stages
+    finally:
+        _stages.reset(token)
+
+
+def register_collector(func):
+    """Register ``func`` to refresh gauges right before each snapshot."""
+    _collectors.append(func)
+    return func
+
+
+def _flush_loop():
+    while True:
+        time.sleep(FLUSH_INTERVAL)
+        try:
+            flush()
+        except Exception:
+            pass
+
+
+def _ensure_flusher():
+    # Per pid: a forked worker doesn't inherit its parent's thread.
+    global _flusher_pid
+    pid = os.getpid()
+    if _flusher_pid == pid:
+        return
+    with _lock:
+        if _flusher_pid == pid:
+            return
+        _flusher_pid = pid
+    threading.Thread(target=_flush_loop, name="metrics-flush", daemon=True).start()
+
+
+def _maybe_flush():
+    global _last_flush
+    _ensure_flusher()
+    now = time.monotonic()
+    if now - _last_flush < FLUSH_INTERVAL:
+        return
+    _last_flush = now
+    try:
+        flush()
+    except Exception:
+        # A cache outage must never fail the request that recorded a sample.
+        pass
+
+
+def snapshot():
+    for collector in _collectors:
+        try:
+            collector()
+        except Exception:
+            pass
+    with _lock:
+        return {
+            "counters": dict(_counters),
+            "gauges": dict(_gauges),
+            "gauge_merge": dict(_gauge_merge),
+            "histograms": {k: (b, list(c), total, n) for k, (b, c, total, n) in _histograms.items()},
+        }
+
+
+def _slot_key(index):
+    return f"metrics:slot:{index}"
+
+
+def _claim_slot(proc):
+    for index in range(MAX_PROCESSES):
+        if cache.add(_slot_key(index), {"proc": proc}, timeout=SNAPSHOT_TTL):
+            return index
+    return None
+
+
+def flush():
+    global _slot
+    proc, pid = _process_id(), os.getpid()
+    if _slot is not None and _slot[0] == pid:
+        current = cache.get(_slot_key(_slot[1]))
+        if current is None or current.get("proc") != proc:
+            _slot = None  # expired (and maybe reclaimed) while we were stalled
+    if _slot is None or _slot[0] != pid:
+        index = _claim_slot(proc)
+        if index is None:
+            return
+        _slot = (pid, index)
+    cache.set(_slot_key(_slot[1]), {"proc": proc, "snapshot": snapshot()}, timeout=SNAPSHOT_TTL)
+
+
+def collect():
+    """Merge the published snapshots of every live worker process."""
+    flush()
+    slots = cache.get_many([_slot_key(index) for index in range(MAX_PROCESSES)])
+    snapshots = {slot["proc"]: slot["snapshot"] for slot in slots.values() if "snapshot" in slot}
+
+    policies = {}
+    for snap in snapshots.values():
+        policies.update(snap.get("gauge_merge", {}))
+    merged = {"counters": defaultdict(float), "gauges": {}, "histograms": {}}
+    for snap in snapshots.values():
+        for key, value in snap.get("counters", {}).items():
+            merged["counters"][key] += value
+        for key, value in snap.get("gauges", {}).items():
+            current = merged["gauges"].get(key)
+            if current is None:
+                merged["gauges"][key] = value
+            elif policies.get(key[0]) == "max":
+                merged["gauges"][key] = max(current, value)
+            else:
+                merged["gauges"][key] = current + value
+        for key, (buckets, counts, total, n) in snap.get("histograms", {}).items():
+            current = merged["histograms"].get(key)
+            if current is None or current[0] != buckets:
+                merged["histograms"][key] = [buckets, list(counts), total, n]
+            else:
+                current[1] = [a + b for a, b in zip(current[1], counts)]
+                current[2] += total
+                current[3] += n
+    return merged
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    body = ",".join(
+        '{}="{}"'.format(k, v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for k, v in labels
+    )
+    return "{" + body + "}"
+
+
+def render():
+    merged = collect()
+    lines = []
+    for kind, type_name in (("counters", "counter"), ("gauges", "gauge")):
+        by_name = defaultdict(list)
+        for (name, labels), value in merged[kind].items():
+            by_name[name].append((labels, value))
+        for name in sorted(by_name):
+            lines.append(f"# TYPE {name} {type_name}")
+            for labels, value in sorted(by_name[name]):
+                lines.append(f"{name}{_format_labels(labels)} {value:g}")
+
+    by_name = defaultdict(list)
+    for (name, labels), hist in merged["histograms"].items():
+        by_name[name].append((labels, hist))
+    for name in sorted(by_name):
+        lines.append(f"# TYPE {name} histogram")
+        for labels, (buckets, counts, total, n) in sorted(by_name[name], key=lambda item: item[0]):
+            cumulative = 0
+            for bound, count in zip(buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else f"{bound:g}"
+                lines.append(f"{name}_bucket{_format_labels(labels + (('le', le),))} {cumulative}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {total:g}")
+            lines.append(f"{name}_count{_format_labels(labels)} {n}")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,166 @@
+import contextlib
+import cProfile
+import logging
+import random
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+QUERY_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+
+def _view_label(request):
+    match = getattr(request, "resolver_match", None)
+    if match is None:
+        return "unresolved"
+    view_func, method = match.func, request.method
+    cls = getattr(view_func, "cls", None)
+    if cls is None:
+        return f"{view_func.__module__}.{getattr(view_func, '__name__', 'unknown')}"
+    actions = getattr(view_func, "actions", None) or {}
+    return f"{cls.__name__}.{actions.get(method.lower(), method.lower())}"
+
+
+class MetricsMiddleware:
+    """Per-view latency histogram, status counter and DB query count.
+
+    Labels are the resolved view and viewset action, never the raw path, so
+    cardinality stays bounded.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        queries = [0]
+
+        def count_queries(execute, sql, params, many, context):
+            queries[0] += 1
+            return execute(sql, params, many, context)
+
+        start = time.perf_counter()
+        with contextlib.ExitStack() as stack:
+            for conn in connections.all():
+                stack.enter_context(conn.execute_wrapper(count_queries))
+            response = self.get_response(request)
+        view = self._record(request, response, time.perf_counter() - start)
+        metrics.observe("db_queries_per_request", queries[0], buckets=QUERY_BUCKETS, view=view)
+        return response
+
+    async def __acall__(self, request):
+        # Queries of async views run on sync_to_async threads with their own
+        # connections, so only latency and status are recorded here.
+        start = time.perf_counter()
+        response = await self.get_response(request)
+        self._record(request, response, time.perf_counter() - start)
+        return response
+
+    def _record(self, request, response, elapsed):
+        view = _view_label(request)
+        metrics.observe("http_request_duration_seconds", elapsed, view=view, method=request.method)
+        metrics.inc(
+            "http_responses_total", view=view, method=request.method, status=str(response.status_code)
+        )
+        return view
+
+
+class ProfilingMiddleware:
+    """Profile selected requests into the ``core.profiling`` store.
+
+    Removed from the stack at startup unless ``PROFILING_ENABLED`` is set, so
+    it costs nothing when off. When on, a request is profiled if it carries a
+    valid admin token (``X-Profile-Token`` header or ``_profile`` query
+    parameter) or is picked by 1-in-``PROFILING_SAMPLE_RATE`` sampling.
+    Sync-only: under ASGI Django runs it in a thread.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, "PROFILING_ENABLED", False):
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+        rate = getattr(settings, "PROFILING_SAMPLE_RATE", 0)
+        self.sample_probability = 1.0 / rate if rate > 0 else 0.0
+
+    def _trigger(self, request):
+        from . import profiling
+
+        token = request.headers.get("X-Profile-Token") or request.GET.get("_profile")
+        if token and profiling.check_token(token):
+            return "token"
+        if self.sample_probability and random.random() < self.sample_probability:
+            return "sample"
+        return None
+
+    def __call__(self, request):
+        trigger = self._trigger(request)
+        if trigger is None:
+            return self.get_response(request)
+
+        db = {"queries": 0, "seconds": 0.0}
+
+        def time_queries(execute, sql, params, many, context):
+            start = time.perf_counter()
+            try:
+                return execute(sql, params, many, context)
+            finally:
+                db["queries"] += 1
+                db["seconds"] += time.perf_counter() - start
+
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Another profiler is active (PEP 669 allows one per process);
+            # keep the stage timings only.
+            profiler = None
+        start = time.perf_counter()
+        try:
+            with contextlib.ExitStack() as stack:
+                for conn in connections.all():
+                    stack.enter_context(conn.execute_wrapper(time_queries))
+                stages = stack.enter_context(metrics.record_stages())
+                response = self.get_response(request)
+        finally:
+            if profiler is not None:
+                profiler.disable()
+        elapsed = time.perf_counter() - start
+        self._save(request, response, trigger, profiler, elapsed, db, stages)
+        return response
+
+    def _save(self, request, response, trigger, profiler, elapsed, db, stages):
+        from . import profiling
+
+        user = getattr(request, "user", None)
+        meta = {
+            "trigger": trigger,
+            "view": _view_label(request),
+            "method": request.method,
+            "path": request.path,
+            "user": user.pk if user is not None and user.is_authenticated else None,
+            "status": response.status_code,
+            "duration_seconds": round(elapsed, 6),
+            "db_queries": db["queries"],
+            "db_seconds": round(db["seconds"], 6),
+            "stages": [
+                {"name": name, "labels": dict(labels), "count": count, "seconds": round(total, 6)}
+                for (name, labels), (count, total) in sorted(stages.items())
+            ],
+        }
+        try:
+            response["X-Profile-Id"] = profiling.save(profiler, meta)
+        except OSError:
+            logger.exception("Could not store request profile")
+        metrics.inc("profiled_requests_total", trigger=trigger)
@@ -0,0 +1,41 @@
+from django.db import migrations
+
+# Django renders icontains as UPPER(col::text) LIKE UPPER(...), so substring
+# search needs expression indexes; the fuzzy ``%`` operator uses the plain
+# column index.
+SUBSTRING_INDEX = "core_expense_search_upper_trgm"
+FUZZY_INDEX = "core_expense_search_trgm"
+
+
+def create_search_index(apps, schema_editor):
+    # Trigram GIN indexes are PostgreSQL-only; SQLite falls back to icontains.
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    schema_editor.execute(
+        f"CREATE INDEX IF NOT EXISTS {SUBSTRING_INDEX} ON core_expense USING gin ("
+        "UPPER(receiver_name::text) gin_trgm_ops, UPPER(sender_name::text) gin_trgm_ops, "
+        "UPPER(transaction_type::text) gin_trgm_ops, UPPER(transaction_id::text) gin_trgm_ops)"
+    )
+    schema_editor.execute(
+        f"CREATE INDEX IF NOT EXISTS {FUZZY_INDEX} ON core_expense USING gin ("
+        "receiver_name gin_trgm_ops, sender_name gin_trgm_ops)"
+    )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute(f"DROP INDEX IF EXISTS {SUBSTRING_INDEX}")
+    schema_editor.execute(f"DROP INDEX IF EXISTS {FUZZY_INDEX}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_user_gmail_user_gmail_app_password'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
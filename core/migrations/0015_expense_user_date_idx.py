@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-19 14:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_expense_search_trgm_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='expense',
+            index=models.Index(fields=['created_by', '-date_time'], name='expense_user_date_idx'),
+        ),
+    ]
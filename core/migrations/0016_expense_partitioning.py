@@ -0,0 +1,22 @@
+from django.conf import settings
+from django.db import migrations
+
+
+def partition_expenses(apps, schema_editor):
+    # Opt-in: only converts when EXPENSE_PARTITIONING is enabled. It can also
+    # be done later with `manage.py expense_partitions enable`.
+    if not getattr(settings, "EXPENSE_PARTITIONING", False):
+        return
+    from core.partitions import partition_table
+    partition_table(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0015_expense_user_date_idx'),
+    ]
+
+    operations = [
+        migrations.RunPython(partition_expenses, migrations.RunPython.noop),
+    ]
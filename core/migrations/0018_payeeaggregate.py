@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-19 14:56
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0017_receipt'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PayeeAggregate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('normalized_name', models.CharField(max_length=100)),
+                ('display_name', models.CharField(max_length=100)),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('total', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('first_seen', models.DateTimeField()),
+                ('last_seen', models.DateTimeField()),
+                ('interval_count', models.PositiveIntegerField(default=0)),
+                ('mean_interval', models.FloatField(default=0)),
+                ('interval_m2', models.FloatField(default=0)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='payees', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', '-total'], name='payee_user_total_idx'), models.Index(fields=['user', '-first_seen'], name='payee_user_first_seen_idx')],
+                'constraints': [models.UniqueConstraint(fields=('user', 'normalized_name'), name='payee_user_name_uniq')],
+            },
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.2.18 on 2026-10-19 14:57
+
+from django.db import migrations, models
+
+
+def create_ledger_view(apps, schema_editor):
+    from core.ledger import INCOME_TS_INDEX, LEDGER_SQL_V1, create_view
+    create_view(schema_editor.connection, LEDGER_SQL_V1)
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.execute(INCOME_TS_INDEX)
+
+
+def drop_ledger_view(apps, schema_editor):
+    from core.ledger import drop_view
+    drop_view(schema_editor.connection)
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.execute("DROP INDEX IF EXISTS income_user_ts_idx")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0018_payeeaggregate'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LedgerEntry',
+            fields=[
+                ('id', models.CharField(max_length=40, primary_key=True, serialize=False)),
+                ('kind', models.CharField(max_length=10)),
+                ('source_id', models.BigIntegerField()),
+                ('ts', models.DateTimeField()),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('signed_amount', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('source', models.CharField(max_length=100)),
+                ('counterparty', models.CharField(max_length=100, null=True)),
+            ],
+            options={
+                'db_table': 'core_ledger',
+                'managed': False,
+            },
+        ),
+        migrations.AddIndex(
+            model_name='income',
+            index=models.Index(fields=['created_by', '-date'], name='income_user_date_idx'),
+        ),
+        migrations.RunPython(create_ledger_view, drop_ledger_view),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.18 on 2026-10-19 15:00
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+from core import ledger
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0019_ledger'),
+    ]
+
+    operations = [
+        ledger.RecreateView([
+            migrations.AddField(
+                model_name='expense',
+                name='updated_at',
+                field=models.DateTimeField(auto_now=True),
+            ),
+            migrations.AddField(
+                model_name='income',
+                name='updated_at',
+                field=models.DateTimeField(auto_now=True),
+            ),
+        ], sql=ledger.LEDGER_SQL_V1),
+        migrations.CreateModel(
+            name='SyncChange',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('kind', models.CharField(max_length=10)),
+                ('object_id', models.BigIntegerField()),
+                ('op', models.CharField(max_length=10)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sync_changes', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', 'id'], name='syncchange_user_cursor_idx')],
+            },
+        ),
+    ]
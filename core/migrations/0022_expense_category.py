@@ -0,0 +1,44 @@
+# Generated by Django 5.2.18 on 2026-10-19 15:07
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+from core import ledger
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0021_budgets'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CategoryRule',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('keyword', models.CharField(max_length=100)),
+                ('field', models.CharField(choices=[('any', 'Receiver or transaction type'), ('receiver_name', 'Receiver'), ('transaction_type', 'Transaction type')], default='any', max_length=20)),
+                ('category', models.CharField(max_length=50)),
+                ('priority', models.IntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='categoryrule',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='category_rules', to=settings.AUTH_USER_MODEL),
+        ),
+        ledger.RecreateView([
+            migrations.AddField(
+                model_name='expense',
+                name='category',
+                field=models.CharField(blank=True, max_length=50, null=True),
+            ),
+            migrations.AddIndex(
+                model_name='expense',
+                index=models.Index(fields=['created_by', 'category'], name='expense_user_category_idx'),
+            ),
+        ], sql=ledger.LEDGER_SQL_V1),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.18 on 2026-10-19 15:09
+
+from django.db import migrations, models
+
+from core import ledger
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0022_expense_category'),
+    ]
+
+    operations = [
+        ledger.RecreateView([
+            migrations.AddField(
+                model_name='expense',
+                name='fingerprint',
+                field=models.CharField(blank=True, max_length=40, null=True),
+            ),
+            migrations.AddIndex(
+                model_name='expense',
+                index=models.Index(fields=['created_by', 'fingerprint'], name='expense_user_fingerprint_idx'),
+            ),
+        ], sql=ledger.LEDGER_SQL_V1),
+    ]
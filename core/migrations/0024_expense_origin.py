@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-19 16:02
+
+from django.db import migrations, models
+
+from core import ledger
+
+
+def mark_generated(apps, schema_editor):
+    Expense = apps.get_model("core", "Expense")
+    Expense.objects.filter(transaction_id__startswith="syn-").update(origin="generated")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0023_expense_fingerprint'),
+    ]
+
+    operations = [
+        ledger.RecreateView([
+            # Existing rows keep the old assumption that their ids came from
+            # the bank, so no past import starts matching a distinct payment.
+            migrations.AddField(
+                model_name='expense',
+                name='origin',
+                field=models.CharField(choices=[('manual', 'Entered by hand'), ('statement', 'Imported from a bank statement'), ('generated', 'Synthetic data')], default='statement', max_length=10),
+                preserve_default=False,
+            ),
+            migrations.AlterField(
+                model_name='expense',
+                name='origin',
+                field=models.CharField(choices=[('manual', 'Entered by hand'), ('statement', 'Imported from a bank statement'), ('generated', 'Synthetic data')], default='manual', max_length=10),
+            ),
+        ], sql=ledger.LEDGER_SQL_V1),
+        migrations.RunPython(mark_generated, migrations.RunPython.noop),
+    ]
@@ -18,6 +18,19 @@ class Role(models.Model):
 
 # 3. Expense Model
 class Expense(models.Model):
+    # Only statement imports carry an id the bank issued (see core.fingerprints).
+    ORIGIN_CHOICES = [
+        ("manual", "Entered by hand"),
+        ("statement", "Imported from a bank statement"),
+        ("generated", "Synthetic data"),
+    ]
+    # unique=True is the real constraint on SQLite and on an unpartitioned
+    # table. Once core_expense is partitioned (core.partitions) there is no
+    # UNIQUE index on it: the core_expense_txn table and its trigger enforce
+    # uniqueness and raise the same IntegrityError. The field keeps
+    # unique=True so validation and the migration state stay the same, but a
+    # migration altering this field must not run as-is on a partitioned
+    # table; use SeparateDatabaseAndState and update core_expense_txn instead.
     transaction_id = models.CharField(max_length=50, unique=True)
     transaction_type = models.CharField(max_length=100)
     sender_name = models.CharField(max_length=100, blank=True, null=True)
@@ -27,6 +40,18 @@ class Expense(models.Model):
     total = models.DecimalField(max_digits=12, decimal_places=2)
     date_time = models.DateTimeField(default=datetime.datetime.now)
     created_by = models.ForeignKey(User, on_delete=models.CASCADE, related_name="expenses")
+    receipt = models.ForeignKey("Receipt", on_delete=models.SET_NULL, null=True, blank=True, related_name="expenses")
+    category = models.CharField(max_length=50, blank=True, null=True)
+    # sha1 of user, amount, time bucket and counterparty (see core.fingerprints)
+    fingerprint = models.CharField(max_length=40, blank=True, null=True)
+    origin = models.CharField(max_length=10, choices=ORIGIN_CHOICES, default="manual")
+    updated_at = models.DateTimeField(auto_now=True)
+    class Meta:
+        indexes = [
+            models.Index(fields=["created_by", "-date_time"], name="expense_user_date_idx"),
+            models.Index(fields=["created_by", "category"], name="expense_user_category_idx"),
+            models.Index(fields=["created_by", "fingerprint"], name="expense_user_fingerprint_idx"),
+        ]
     def __str__(self):
         return f"{self.transaction_type} - {self.amount}"
 
@@ -37,6 +62,131 @@ class Income(models.Model):
     source = models.CharField(max_length=50)
     date = models.DateField(default=datetime.date.today)
     created_by = models.ForeignKey(User, on_delete=models.CASCADE, related_name="income")
+    updated_at = models.DateTimeField(auto_now=True)
+    class Meta:
+        indexes = [
+            models.Index(fields=["created_by", "-date"], name="income_user_date_idx"),
+        ]
     def __str__(self):
         return f"{self.title} - {self.amount}"
 
+# 5. Receipt Model (content-addressed; shared by identical uploads)
+class Receipt(models.Model):
+    sha256 = models.CharField(max_length=64, unique=True)
+    content_type = models.CharField(max_length=100)
+    size = models.PositiveBigIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    def __str__(self):
+        return self.sha256
+
+# 6. Payee Aggregate Model (maintained incrementally by core.payees)
+class PayeeAggregate(models.Model):
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="payees")
+    normalized_name = models.CharField(max_length=100)
+    display_name = models.CharField(max_length=100)
+    count = models.PositiveIntegerField(default=0)
+    total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    first_seen = models.DateTimeField()
+    last_seen = models.DateTimeField()
+    # Running mean/variance (Welford) of the gaps between payments, in seconds.
+    interval_count = models.PositiveIntegerField(default=0)
+    mean_interval = models.FloatField(default=0)
+    interval_m2 = models.FloatField(default=0)
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["user", "normalized_name"], name="payee_user_name_uniq"),
+        ]
+        indexes = [
+            models.Index(fields=["user", "-total"], name="payee_user_total_idx"),
+            models.Index(fields=["user", "-first_seen"], name="payee_user_first_seen_idx"),
+        ]
+    def __str__(self):
+        return f"{self.display_name} ({self.count})"
+
+# 7. Ledger Entry (read-only DB view unifying Expense and Income, see migration 0019)
+class LedgerEntry(models.Model):
+    id = models.CharField(max_length=40, primary_key=True)  # "expense-<pk>" / "income-<pk>"
+    kind = models.CharField(max_length=10)
+    source_id = models.BigIntegerField()
+    user = models.ForeignKey(User, on_delete=models.DO_NOTHING, db_constraint=False, related_name="+")
+    ts = models.DateTimeField()
+    amount = models.DecimalField(max_digits=12, decimal_places=2)
+    signed_amount = models.DecimalField(max_digits=12, decimal_places=2)
+    source = models.CharField(max_length=100)  # transaction_type / income source
+    counterparty = models.CharField(max_length=100, null=True)
+    class Meta:
+        managed = False
+        db_table = "core_ledger"
+    def __str__(self):
+        return f"{self.kind} {self.signed_amount} @ {self.ts}"
+
+# 8. Sync Change Model (append-only change log; the id is the client's sync cursor)
+class SyncChange(models.Model):
+    id = models.BigAutoField(primary_key=True)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="sync_changes")
+    kind = models.CharField(max_length=10)  # "expense" / "income"
+    object_id = models.BigIntegerField()
+    op = models.CharField(max_length=10)  # "upsert" / "delete"
+    created_at = models.DateTimeField(auto_now_add=True)
+    class Meta:
+        indexes = [
+            models.Index(fields=["user", "id"], name="syncchange_user_cursor_idx"),
+        ]
+    def __str__(self):
+        return f"{self.op} {self.kind} {self.object_id}"
+
+# 9. Budget Model (monthly limit; an empty transaction_type covers all spending)
+class Budget(models.Model):
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="budgets")
+    transaction_type = models.CharField(max_length=100, blank=True, default="")
+    limit = models.DecimalField(max_digits=12, decimal_places=2)
+    created_at = models.DateTimeField(auto_now_add=True)
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["user", "transaction_type"], name="budget_user_type_uniq"),
+        ]
+    def __str__(self):
+        return f"{self.transaction_type or 'All'} - {self.limit}"
+
+# 10. Budget Counter Model (month-to-date spend, maintained by core.budgets)
+class BudgetCounter(models.Model):
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="budget_counters")
+    month = models.DateField()  # first day of the month
+    transaction_type = models.CharField(max_length=100, blank=True, default="")  # "" = all types
+    spent = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["user", "month", "transaction_type"], name="budget_counter_uniq"),
+        ]
+    def __str__(self):
+        return f"{self.month:%Y-%m} {self.transaction_type or 'All'}: {self.spent}"
+
+# 11. Budget Alert Model (one per budget, month and threshold crossed)
+class BudgetAlert(models.Model):
+    budget = models.ForeignKey(Budget, on_delete=models.CASCADE, related_name="alerts")
+    month = models.DateField()
+    threshold = models.PositiveSmallIntegerField()  # percent of the limit
+    spent = models.DecimalField(max_digits=14, decimal_places=2)
+    created_at = models.DateTimeField(auto_now_add=True)
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["budget", "month", "threshold"], name="budget_alert_uniq"),
+        ]
+    def __str__(self):
+        return f"{self.budget} {self.month:%Y-%m} {self.threshold}%"
+
+# 12. Category Rule Model (keyword -> category, applied by core.categories)
+class CategoryRule(models.Model):
+    FIELD_CHOICES = [
+        ("any", "Receiver or transaction type"),
+        ("receiver_name", "Receiver"),
+        ("transaction_type", "Transaction type"),
+    ]
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="category_rules")
+    keyword = models.CharField(max_length=100)  # case-insensitive substring
+    field = models.CharField(max_length=20, choices=FIELD_CHOICES, default="any")
+    category = models.CharField(max_length=50)
+    priority = models.IntegerField(default=0)  # higher wins when several match
+    created_at = models.DateTimeField(auto_now_add=True)
+    def __str__(self):
+        return f"{self.keyword} -> {self.category}"
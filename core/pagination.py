@@ -0,0 +1,18 @@
+from rest_framework.pagination import PageNumberPagination
+
+
+class StandardResultsPagination(PageNumberPagination):
+    page_size = 25
+    page_size_query_param = "page_size"
+    max_page_size = 200
+
+
+class OptionalPagination(StandardResultsPagination):
+    """Paginates only when ``page`` or ``page_size`` is given, for endpoints
+    whose clients predate pagination and expect the full list."""
+
+    def paginate_queryset(self, queryset, request, view=None):
+        params = request.query_params
+        if self.page_query_param not in params and self.page_size_query_param not in params:
+            return None
+        return super().paginate_queryset(queryset, request, view)
@@ -0,0 +1,244 @@
+"""
+Monthly range partitioning of ``core_expense`` on PostgreSQL.
+
+PostgreSQL only enforces UNIQUE constraints on partitioned tables when they
+include the partition key, so ``transaction_id`` uniqueness moves to the
+``core_expense_txn`` side table. An AFTER ROW trigger keeps it in sync and
+raises ``unique_violation`` on duplicates, which Django surfaces as the same
+``IntegrityError`` as before. ``Expense.transaction_id`` still declares
+``unique=True`` (see the note on the model). Migrations that alter it have to
+account for the missing index.
+
+Partitions are named ``core_expense_yYYYYmMM``. Rows outside every monthly
+range land in ``core_expense_default``.
+
+The ``core_ledger`` view depends on the table, so if it exists it is dropped
+before the swap and recreated on the partitioned parent from its own stored
+definition (``pg_get_viewdef``). That keeps whatever SQL the ledger migrations
+installed, and migration 0016 (which runs before the view exists) creates
+none.
+"""
+import datetime
+import gzip
+import os
+
+TABLE = "core_expense"
+DEFAULT_PARTITION = "core_expense_default"
+DEDUP_TABLE = "core_expense_txn"
+SEQUENCE = "core_expense_part_id_seq"
+
+DEDUP_FUNCTION = f"""
+CREATE OR REPLACE FUNCTION {DEDUP_TABLE}_guard() RETURNS trigger AS $$
+DECLARE
+    affected integer;
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        DELETE FROM {DEDUP_TABLE}
+        WHERE transaction_id = OLD.transaction_id AND expense_id = OLD.id;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        INSERT INTO {DEDUP_TABLE} (transaction_id, expense_id, date_time)
+        VALUES (NEW.transaction_id, NEW.id, NEW.date_time)
+        ON CONFLICT (transaction_id) DO UPDATE SET date_time = EXCLUDED.date_time
+        WHERE {DEDUP_TABLE}.expense_id = EXCLUDED.expense_id;
+        GET DIAGNOSTICS affected = ROW_COUNT;
+        IF affected = 0 THEN
+            RAISE EXCEPTION 'duplicate key value violates unique constraint "{DEDUP_TABLE}_pkey"'
+                USING ERRCODE = 'unique_violation',
+                      DETAIL = format('Key (transaction_id)=(%s) already exists.', NEW.transaction_id);
+        END IF;
+        RETURN NEW;
+    END IF;
+    RETURN OLD;
+END
+$$ LANGUAGE plpgsql;
+"""
+
+
+def month_start(value):
+    return datetime.date(value.year, value.month, 1)
+
+
+def next_month(value):
+    return datetime.date(value.year + value.month // 12, value.month % 12 + 1, 1)
+
+
+def partition_name(month):
+    return f"{TABLE}_y{month.year:04d}m{month.month:02d}"
+
+
+def is_partitioned(connection):
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT 1 FROM pg_partitioned_table pt JOIN pg_class c ON c.oid = pt.partrelid "
+            "WHERE c.relname = %s AND pg_table_is_visible(c.oid)",
+            [TABLE],
+        )
+        return cursor.fetchone() is not None
+
+
+def list_partitions(connection):
+    """Return ``[(name, row_estimate)]`` for the attached partitions."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT c.relname, c.reltuples::bigint FROM pg_inherits i "
+            "JOIN pg_class c ON c.oid = i.inhrelid JOIN pg_class p ON p.oid = i.inhparent "
+            "WHERE p.relname = %s ORDER BY c.relname",
+            [TABLE],
+        )
+        return cursor.fetchall()
+
+
+def partition_table(connection, months_ahead=3):
+    """Convert the plain ``core_expense`` table into a partitioned one in place."""
+    if connection.vendor != "postgresql" or is_partitioned(connection):
+        return False
+    from .ledger import VIEW
+
+    legacy = f"{TABLE}_unpartitioned"
+    with connection.cursor() as cursor:
+        cursor.execute(f"LOCK TABLE {TABLE} IN ACCESS EXCLUSIVE MODE")
+        cursor.execute("SELECT pg_get_viewdef(to_regclass(%s), true)", [VIEW])
+        view_sql = cursor.fetchone()[0]
+        cursor.execute(f"DROP VIEW IF EXISTS {VIEW}")
+        cursor.execute(f"ALTER TABLE {TABLE} RENAME TO {legacy}")
+        cursor.execute(
+            f"CREATE TABLE {TABLE} (LIKE {legacy} INCLUDING DEFAULTS) PARTITION BY RANGE (date_time)"
+        )
+        # The legacy id is an identity column, which partitioned tables can't
+        # carry before PostgreSQL 17; a plain sequence keeps ids increasing.
+        cursor.execute(f"CREATE SEQUENCE {SEQUENCE} OWNED BY {TABLE}.id")
+        cursor.execute(
+            f"SELECT setval('{SEQUENCE}', COALESCE((SELECT MAX(id) FROM {legacy}), 0) + 1, false)"
+        )
+        cursor.execute(f"ALTER TABLE {TABLE} ALTER COLUMN id SET DEFAULT nextval('{SEQUENCE}')")
+        cursor.execute(f"ALTER TABLE {TABLE} ADD PRIMARY KEY (id, date_time)")
+        cursor.execute(f"CREATE TABLE {DEFAULT_PARTITION} PARTITION OF {TABLE} DEFAULT")
+
+        cursor.execute(f"SELECT MIN(date_time), MAX(date_time) FROM {legacy}")
+        first, last = cursor.fetchone()
+        today = datetime.date.today()
+        first = month_start(first.date() if first else today)
+        last = month_start(max(last.date() if last else today, today))
+        for _ in range(months_ahead):
+            last = next_month(last)
+        month = first
+        while month <= last:
+            _create_partition(cursor, month)
+            month = next_month(month)
+
+        cursor.execute(f"INSERT INTO {TABLE} SELECT * FROM {legacy}")
+
+        cursor.execute(
+            f"CREATE TABLE {DEDUP_TABLE} ("
+            "transaction_id varchar(50) PRIMARY KEY, "
+            "expense_id bigint NOT NULL, "
+            "date_time timestamp with time zone NOT NULL)"
+        )
+        cursor.execute(
+            f"INSERT INTO {DEDUP_TABLE} (transaction_id, expense_id, date_time) "
+            f"SELECT transaction_id, id, date_time FROM {legacy}"
+        )
+        cursor.execute(DEDUP_FUNCTION)
+        cursor.execute(
+            f"CREATE TRIGGER {DEDUP_TABLE}_guard "
+            f"AFTER INSERT OR UPDATE OF transaction_id, date_time OR DELETE ON {TABLE} "
+            f"FOR EACH ROW EXECUTE FUNCTION {DEDUP_TABLE}_guard()"
+        )
+
+        # Recreate the legacy table's secondary indexes and foreign keys on
+        # the partitioned parent (they cascade to every partition).
+        cursor.execute(
+            "SELECT indexname, indexdef FROM pg_indexes WHERE tablename = %s", [legacy]
+        )
+        indexes = [
+            (name, sql) for name, sql in cursor.fetchall()
+            if "UNIQUE" not in sql and not name.endswith("_pkey")
+        ]
+        cursor.execute(
+            "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint "
+            "WHERE conrelid = %s::regclass AND contype = 'f'",
+            [legacy],
+        )
+        foreign_keys = cursor.fetchall()
+        cursor.execute(f"DROP TABLE {legacy}")
+        for name, sql in indexes:
+            cursor.execute(sql.replace(f" ON public.{legacy} ", f" ON public.{TABLE} ")
+                           .replace(f" ON {legacy} ", f" ON {TABLE} "))
+        for name, definition in foreign_keys:
+            cursor.execute(f"ALTER TABLE {TABLE} ADD CONSTRAINT {name} {definition}")
+        if view_sql:
+            cursor.execute(f"CREATE VIEW {VIEW} AS {view_sql}")
+    return True
+
+
+def _create_partition(cursor, month):
+    cursor.execute(
+        f"CREATE TABLE IF NOT EXISTS {partition_name(month)} PARTITION OF {TABLE} "
+        "FOR VALUES FROM (%s) TO (%s)",
+        [f"{month.isoformat()} 00:00:00+00", f"{next_month(month).isoformat()} 00:00:00+00"],
+    )
+
+
+def ensure_partitions(connection, until):
+    """Create monthly partitions up to and including the month of ``until``.
+
+    Rows that already sit in the default partition for a new month are moved
+    into it first, otherwise ATTACH would fail the range check.
+    """
+    created = []
+    existing = {name for name, _ in list_partitions(connection)}
+    with connection.cursor() as cursor:
+        month = month_start(datetime.date.today())
+        while month <= month_start(until):
+            name = partition_name(month)
+            if name not in existing:
+                start = f"{month.isoformat()} 00:00:00+00"
+                end = f"{next_month(month).isoformat()} 00:00:00+00"
+                cursor.execute(f"CREATE TABLE {name} (LIKE {TABLE} INCLUDING DEFAULTS)")
+                cursor.execute(
+                    f"WITH moved AS (DELETE FROM {DEFAULT_PARTITION} "
+                    "WHERE date_time >= %s AND date_time < %s RETURNING *) "
+                    f"INSERT INTO {name} SELECT * FROM moved",
+                    [start, end],
+                )
+                # The DELETE above fired the dedup trigger; restore the keys.
+                cursor.execute(
+                    f"INSERT INTO {DEDUP_TABLE} (transaction_id, expense_id, date_time) "
+                    f"SELECT transaction_id, id, date_time FROM {name}"
+                )
+                cursor.execute(
+                    f"ALTER TABLE {TABLE} ATTACH PARTITION {name} FOR VALUES FROM (%s) TO (%s)",
+                    [start, end],
+                )
+                created.append(name)
+            month = next_month(month)
+    return created
+
+
+def _copy_out(cursor, sql, fh):
+    raw = cursor.cursor
+    if hasattr(raw, "copy"):  # psycopg 3
+        with raw.copy(sql) as copy:
+            for chunk in copy:
+                fh.write(chunk)
+    else:  # psycopg2
+        raw.copy_expert(sql, fh)
+
+
+def archive_partition(connection, month, directory):
+    """Detach one monthly partition, dump it to a gzipped CSV and drop it.
+
+    The ``core_expense_txn`` keys are kept, so archived transactions are
+    still rejected as duplicates if they are imported again.
+    """
+    name = partition_name(month)
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"{name}.csv.gz")
+    with connection.cursor() as cursor:
+        cursor.execute(f"ALTER TABLE {TABLE} DETACH PARTITION {name}")
+        with gzip.open(path + ".tmp", "wb") as fh:
+            _copy_out(cursor, f"COPY {name} TO STDOUT WITH (FORMAT csv, HEADER)", fh)
+        os.replace(path + ".tmp", path)
+        cursor.execute(f"DROP TABLE {name}")
+    return path
@@ -0,0 +1,177 @@
+"""
+Incrementally maintained per-user payee aggregates.
+
+Every expense write updates one ``PayeeAggregate`` row per affected payee
+(count, sum, first/last seen and a running mean/variance of the payment
+interval). Payee insights and recurring-payment detection then read that
+compact table and never group the raw expense rows.
+"""
+import datetime
+import math
+import re
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Expense, PayeeAggregate
+
+# (label, typical interval in days, tolerance in days)
+CADENCES = [
+    ("weekly", 7, 2),
+    ("biweekly", 14, 3),
+    ("monthly", 30.4, 5),
+    ("quarterly", 91, 10),
+    ("yearly", 365, 20),
+]
+MAX_INTERVAL_CV = 0.35
+_punctuation = re.compile(r"[^\w\s]")
+_spaces = re.compile(r"\s+")
+
+
+def normalize_payee(name):
+    name = _punctuation.sub(" ", (name or "").lower())
+    return _spaces.sub(" ", name).strip()[:100] or "unknown"
+
+
+def _add_interval(agg, seconds):
+    agg.interval_count += 1
+    delta = seconds - agg.mean_interval
+    agg.mean_interval += delta / agg.interval_count
+    agg.interval_m2 += delta * (seconds - agg.mean_interval)
+
+
+def _apply(agg, amount, when, updated=False):
+    if timezone.is_naive(when):
+        when = timezone.make_aware(when)
+    if agg.count == 0:
+        agg.first_seen = agg.last_seen = when
+    elif updated and when in (agg.first_seen, agg.last_seen):
+        # An edited row put back at its own timestamp is not a new gap.
+        pass
+    elif when >= agg.last_seen:
+        _add_interval(agg, (when - agg.last_seen).total_seconds())
+        agg.last_seen = when
+    elif when <= agg.first_seen:
+        _add_interval(agg, (agg.first_seen - when).total_seconds())
+        agg.first_seen = when
+    # A payment between first and last seen splits an existing gap; the
+    # running interval stats are left as they are rather than rescanning.
+    agg.count += 1
+    agg.total += Decimal(str(amount))
+
+
+def record_expenses(user_id, expenses, updated=False):
+    """Fold newly inserted (or, with ``updated``, edited) ``expenses`` into the aggregates.
+
+    Costs one INSERT of any missing payees (conflicts ignored, so concurrent
+    first payments to a new payee don't collide), one SELECT with row locks
+    and one bulk UPDATE, however many expenses are in the batch.
+    """
+    groups = defaultdict(list)
+    for expense in expenses:
+        groups[normalize_payee(expense.receiver_name)].append(expense)
+    if not groups:
+        return
+
+    with transaction.atomic():
+        PayeeAggregate.objects.bulk_create(
+            [
+                PayeeAggregate(
+                    user_id=user_id, normalized_name=key,
+                    display_name=(rows[0].receiver_name or "Unknown")[:100],
+                    first_seen=min(e.date_time for e in rows), last_seen=max(e.date_time for e in rows),
+                )
+                for key, rows in groups.items()
+            ],
+            ignore_conflicts=True,
+        )
+        aggregates = list(
+            PayeeAggregate.objects.select_for_update().filter(user_id=user_id, normalized_name__in=list(groups))
+        )
+        for agg in aggregates:
+            for expense in sorted(groups[agg.normalized_name], key=lambda e: e.date_time):
+                _apply(agg, expense.amount, expense.date_time, updated)
+
+        PayeeAggregate.objects.bulk_update(
+            aggregates,
+            ["count", "total", "first_seen", "last_seen", "interval_count", "mean_interval", "interval_m2"],
+        )
+
+
+def update_expense(user_id, before, expense):
+    """Move an edited expense (``before`` is its pre-save copy) between aggregates.
+
+    When neither the payee nor the date changed only the sum moves, so
+    edits don't replay the payment into the interval statistics.
+    """
+    key = normalize_payee(expense.receiver_name)
+    if key == normalize_payee(before.receiver_name) and expense.date_time == before.date_time:
+        delta = Decimal(str(expense.amount)) - Decimal(str(before.amount))
+        if delta:
+            PayeeAggregate.objects.filter(user_id=user_id, normalized_name=key).update(total=F("total") + delta)
+        return
+    remove_expense(user_id, before.receiver_name, before.amount)
+    record_expenses(user_id, [expense], updated=True)
+
+
+def remove_expense(user_id, receiver_name, amount):
+    """Take a deleted expense out of its payee's count and sum.
+
+    First/last seen and the interval statistics are not rewound; they would
+    need the payee's remaining rows. ``rebuild`` restores them exactly.
+    """
+    key = normalize_payee(receiver_name)
+    PayeeAggregate.objects.filter(user_id=user_id, normalized_name=key).update(
+        count=F("count") - 1, total=F("total") - amount
+    )
+    PayeeAggregate.objects.filter(user_id=user_id, normalized_name=key, count__lte=0).delete()
+
+
+def rebuild(user_id, chunk_size=10000):
+    """Recompute a user's aggregates from scratch (backfills and repairs)."""
+    with transaction.atomic():
+        PayeeAggregate.objects.filter(user_id=user_id).delete()
+        qs = Expense.objects.filter(created_by_id=user_id).only("receiver_name", "amount", "date_time")
+        batch = []
+        for expense in qs.order_by("date_time").iterator(chunk_size=chunk_size):
+            batch.append(expense)
+            if len(batch) >= chunk_size:
+                record_expenses(user_id, batch)
+                batch = []
+        record_expenses(user_id, batch)
+
+
+def interval_stats(agg):
+    """Return ``(mean_days, coefficient_of_variation)`` of the payment gaps."""
+    if agg.interval_count == 0 or agg.mean_interval <= 0:
+        return None, None
+    variance = agg.interval_m2 / agg.interval_count
+    return agg.mean_interval / 86400, math.sqrt(max(variance, 0.0)) / agg.mean_interval
+
+
+def recurring_payments(user_id, min_count=3, now=None):
+    now = now or timezone.now()
+    results = []
+    for agg in PayeeAggregate.objects.filter(user_id=user_id, count__gte=min_count, interval_count__gte=min_count - 1):
+        mean_days, cv = interval_stats(agg)
+        if mean_days is None or cv > MAX_INTERVAL_CV:
+            continue
+        cadence = next((label for label, days, tol in CADENCES if abs(mean_days - days) <= tol), None)
+        if cadence is None:
+            continue
+        # Stop reporting payments that have lapsed for two full cycles.
+        if (now - agg.last_seen).total_seconds() > 2 * agg.mean_interval:
+            continue
+        results.append({
+            "payee": agg.display_name,
+            "cadence": cadence,
+            "interval_days": round(mean_days, 1),
+            "count": agg.count,
+            "average_amount": round(agg.total / agg.count, 2),
+            "last_seen": agg.last_seen,
+            "next_expected": agg.last_seen + datetime.timedelta(seconds=agg.mean_interval),
+        })
+    return sorted(results, key=lambda r: r["next_expected"])
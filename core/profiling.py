@@ -0,0 +1,123 @@
+"""
+On-disk store of sampled request profiles.
+
+``ProfilingMiddleware`` (core.middleware) writes one cProfile dump
+(``<id>.prof``, readable with ``pstats``) and one metadata file
+(``<id>.json``: view, user, status, duration, DB time and ``metrics.timer``
+stages) per profiled request. The directory is kept under
+``PROFILING_MAX_FILES`` profiles and ``PROFILING_MAX_BYTES`` by deleting the
+oldest ones.
+
+Admins trigger a profile by sending a token from ``issue_token`` in the
+``X-Profile-Token`` header or the ``_profile`` query parameter. The token
+names its issuer, who must still be an active staff user when it is used.
+"""
+import io
+import json
+import os
+import pstats
+import re
+import tempfile
+import time
+import uuid
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core import signing
+
+TOKEN_SALT = "core.profiling"
+TOKEN_MAX_AGE = getattr(settings, "PROFILING_TOKEN_MAX_AGE", 60 * 60)
+MAX_FILES = getattr(settings, "PROFILING_MAX_FILES", 200)
+MAX_BYTES = getattr(settings, "PROFILING_MAX_BYTES", 200 * 1024 * 1024)
+PROFILE_ID_RE = re.compile(r"^\d{14}-[0-9a-f]{8}$")
+
+
+def _root():
+    return getattr(settings, "PROFILING_DIR", os.path.join(settings.BASE_DIR, "profiles"))
+
+
+def issue_token(user):
+    return signing.TimestampSigner(salt=TOKEN_SALT).sign(str(user.pk))
+
+
+def check_token(token):
+    try:
+        user_id = signing.TimestampSigner(salt=TOKEN_SALT).unsign(token, max_age=TOKEN_MAX_AGE)
+    except signing.BadSignature:
+        return False
+    return get_user_model().objects.filter(pk=user_id, is_active=True, is_staff=True).exists()
+
+
+def _write_atomic(path, data):
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    with os.fdopen(fd, "wb") as fh:
+        fh.write(data)
+    os.replace(tmp, path)
+
+
+def save(profiler, meta):
+    """Persist ``profiler`` (may be None) with ``meta``; returns the profile id."""
+    root = _root()
+    os.makedirs(root, exist_ok=True)
+    profile_id = f"{time.strftime('%Y%m%d%H%M%S', time.gmtime())}-{uuid.uuid4().hex[:8]}"
+    meta = dict(meta, id=profile_id, created_at=time.time(), has_profile=profiler is not None)
+    if profiler is not None:
+        path = os.path.join(root, f"{profile_id}.prof")
+        profiler.dump_stats(path + ".tmp")
+        os.replace(path + ".tmp", path)
+    _write_atomic(os.path.join(root, f"{profile_id}.json"), json.dumps(meta).encode())
+    _evict(root)
+    return profile_id
+
+
+def _evict(root):
+    profiles = {}
+    with os.scandir(root) as it:
+        for entry in it:
+            stem, ext = os.path.splitext(entry.name)
+            if ext in (".prof", ".json") and PROFILE_ID_RE.match(stem):
+                stat = entry.stat()
+                size, mtime = profiles.get(stem, (0, stat.st_mtime))
+                profiles[stem] = (size + stat.st_size, min(mtime, stat.st_mtime))
+    total = sum(size for size, _ in profiles.values())
+    count = len(profiles)
+    for stem in sorted(profiles, key=lambda s: profiles[s][1]):
+        if count <= MAX_FILES and total <= MAX_BYTES:
+            break
+        for ext in (".prof", ".json"):
+            try:
+                os.unlink(os.path.join(root, stem + ext))
+            except FileNotFoundError:
+                pass
+        total -= profiles[stem][0]
+        count -= 1
+
+
+def list_profiles():
+    root = _root()
+    if not os.path.isdir(root):
+        return []
+    profiles = []
+    for name in os.listdir(root):
+        stem, ext = os.path.splitext(name)
+        if ext == ".json" and PROFILE_ID_RE.match(stem):
+            try:
+                with open(os.path.join(root, name)) as fh:
+                    profiles.append(json.load(fh))
+            except (OSError, ValueError):
+                continue
+    return sorted(profiles, key=lambda p: p["created_at"], reverse=True)
+
+
+def profile_path(profile_id):
+    """Return the ``.prof`` path, or None for unknown or malformed ids."""
+    if not PROFILE_ID_RE.match(profile_id or ""):
+        return None
+    path = os.path.join(_root(), f"{profile_id}.prof")
+    return path if os.path.exists(path) else None
+
+
+def summary(path, limit=50, sort="cumulative"):
+    out = io.StringIO()
+    pstats.Stats(path, stream=out).strip_dirs().sort_stats(sort).print_stats(limit)
+    return out.getvalue()
@@ -0,0 +1,243 @@
+"""
+Content-addressed receipt storage and lazy thumbnails.
+
+Originals live at ``MEDIA_ROOT/receipts/sha256/ab/cd/<sha256>``: identical
+uploads map to the same file and are stored once. Uploads are hashed while
+they are streamed to a temporary file in chunks and renamed into place
+atomically.
+
+Thumbnails are rendered on first request and kept in a size-bounded cache
+directory. The least recently used files are evicted when it grows past
+``THUMBNAIL_CACHE_MAX_BYTES``.
+
+Replacing or removing a receipt only unlinks it from the expense, since other
+expenses may share the file. ``delete_unreferenced`` (the
+``cleanup_receipts`` command) removes receipts that no expense points to any
+more, along with their files.
+"""
+import datetime
+import hashlib
+import os
+import re
+import tempfile
+
+from django.conf import settings
+from django.utils import timezone
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+
+from .models import Receipt
+
+MAX_UPLOAD_BYTES = getattr(settings, "RECEIPT_MAX_UPLOAD_BYTES", 10 * 1024 * 1024)
+ALLOWED_CONTENT_TYPES = {"image/png", "image/jpeg", "image/webp", "image/gif", "application/pdf"}
+THUMBNAIL_SIZES = getattr(settings, "RECEIPT_THUMBNAIL_SIZES", (128, 256, 512))
+THUMBNAIL_CACHE_MAX_BYTES = getattr(settings, "THUMBNAIL_CACHE_MAX_BYTES", 256 * 1024 * 1024)
+CHUNK_SIZE = 64 * 1024
+
+RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+class ReceiptError(Exception):
+    pass
+
+
+def _image_errors(Image):
+    # Everything Pillow raises for a truncated, corrupt or hostile file.
+    return (OSError, ValueError, SyntaxError, Image.DecompressionBombError)
+
+
+def _verify_image(path):
+    try:
+        from PIL import Image
+    except ImportError:
+        return  # nothing will decode it either; thumbnails report the missing dependency
+    try:
+        with Image.open(path) as image:
+            image.verify()
+    except _image_errors(Image):
+        raise ReceiptError("The receipt is not a readable image.")
+
+
+def _root():
+    return os.path.join(settings.MEDIA_ROOT, "receipts")
+
+
+def original_path(sha256):
+    return os.path.join(_root(), "sha256", sha256[:2], sha256[2:4], sha256)
+
+
+def thumbnail_path(sha256, size):
+    return os.path.join(_root(), "thumbs", f"{sha256}_{size}.jpg")
+
+
+def store_upload(uploaded_file):
+    """Stream ``uploaded_file`` to disk and return its (possibly shared) Receipt."""
+    content_type = getattr(uploaded_file, "content_type", None) or "application/octet-stream"
+    if content_type not in ALLOWED_CONTENT_TYPES:
+        raise ReceiptError(f"Unsupported receipt type '{content_type}'.")
+    if uploaded_file.size > MAX_UPLOAD_BYTES:
+        raise ReceiptError(f"Receipts are limited to {MAX_UPLOAD_BYTES // (1024 * 1024)} MB.")
+
+    incoming = os.path.join(_root(), "incoming")
+    os.makedirs(incoming, exist_ok=True)
+    digest = hashlib.sha256()
+    size = 0
+    fd, tmp_path = tempfile.mkstemp(dir=incoming)
+    try:
+        with os.fdopen(fd, "wb") as fh:
+            for chunk in uploaded_file.chunks(CHUNK_SIZE):
+                digest.update(chunk)
+                fh.write(chunk)
+                size += len(chunk)
+        if content_type.startswith("image/"):
+            _verify_image(tmp_path)
+        sha256 = digest.hexdigest()
+        final = original_path(sha256)
+        if os.path.exists(final):
+            os.unlink(tmp_path)
+        else:
+            os.makedirs(os.path.dirname(final), exist_ok=True)
+            os.replace(tmp_path, final)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+    receipt, _ = Receipt.objects.get_or_create(
+        sha256=sha256, defaults={"content_type": content_type, "size": size}
+    )
+    return receipt
+
+
+def delete_unreferenced(grace=datetime.timedelta(days=1)):
+    """Delete receipts no expense references, and their files; return the count.
+
+    ``grace`` spares receipts created recently, so an upload whose expense
+    hasn't been saved yet keeps its row.
+    """
+    orphans = Receipt.objects.filter(expenses__isnull=True, created_at__lt=timezone.now() - grace)
+    deleted = 0
+    for receipt in orphans.iterator():
+        # Re-check in the delete itself: an expense may have linked it since.
+        if not Receipt.objects.filter(pk=receipt.pk, expenses__isnull=True).delete()[0]:
+            continue
+        deleted += 1
+        if Receipt.objects.filter(sha256=receipt.sha256).exists():
+            continue  # uploaded again meanwhile; the file is in use
+        paths = [original_path(receipt.sha256)] + [thumbnail_path(receipt.sha256, s) for s in THUMBNAIL_SIZES]
+        for path in paths:
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+    return deleted
+
+
+def get_thumbnail(receipt, size):
+    """Return the path of a JPEG thumbnail, rendering it on first use."""
+    if size not in THUMBNAIL_SIZES:
+        raise ReceiptError(f"Thumbnail size must be one of {', '.join(map(str, THUMBNAIL_SIZES))}.")
+    path = thumbnail_path(receipt.sha256, size)
+    if os.path.exists(path):
+        os.utime(path)  # mark as recently used for LRU eviction
+        return path
+    if not receipt.content_type.startswith("image/"):
+        raise ReceiptError("Thumbnails are only available for image receipts.")
+
+    try:
+        from PIL import Image
+    except ImportError:
+        raise ReceiptError("Thumbnail support requires Pillow.")
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as fh, Image.open(original_path(receipt.sha256)) as image:
+            image.draft("RGB", (size, size))  # cheap JPEG downscale while decoding
+            image = image.convert("RGB")
+            image.thumbnail((size, size))
+            image.save(fh, "JPEG", quality=80, optimize=True)
+        os.replace(tmp_path, path)
+    except FileNotFoundError:
+        raise Http404("The receipt file is missing.")
+    except _image_errors(Image):
+        raise ReceiptError("The receipt is not a readable image.")
+    finally:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+    _evict_thumbnails()
+    return path
+
+
+def _evict_thumbnails():
+    directory = os.path.join(_root(), "thumbs")
+    entries = []
+    total = 0
+    with os.scandir(directory) as it:
+        for entry in it:
+            if entry.is_file() and entry.name.endswith(".jpg"):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+                total += stat.st_size
+    if total <= THUMBNAIL_CACHE_MAX_BYTES:
+        return
+    for _, file_size, path in sorted(entries):
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+        total -= file_size
+        if total <= THUMBNAIL_CACHE_MAX_BYTES:
+            break
+
+
+def _file_range(path, start, length):
+    with open(path, "rb") as fh:
+        fh.seek(start)
+        while length > 0:
+            chunk = fh.read(min(CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+
+def serve_file(request, path, content_type, etag):
+    """Serve an immutable file with ETag/304 and single-range (206) support."""
+    etag = f'"{etag}"'
+    if etag in [tag.strip() for tag in request.headers.get("If-None-Match", "").split(",")]:
+        response = HttpResponseNotModified()
+        response["ETag"] = etag
+        return response
+
+    try:
+        size = os.path.getsize(path)
+    except FileNotFoundError:
+        raise Http404("The receipt file is missing.")
+    range_header = request.headers.get("Range")
+    match = RANGE_RE.match(range_header) if range_header else None
+    if_range = request.headers.get("If-Range")
+    if match and (not if_range or if_range == etag):
+        first, last = match.groups()
+        if first:
+            start, end = int(first), int(last) if last else size - 1
+        elif last:
+            start, end = max(size - int(last), 0), size - 1
+        else:
+            start, end = size, size
+        end = min(end, size - 1)
+        if start > end:
+            response = HttpResponse(status=416)
+            response["Content-Range"] = f"bytes */{size}"
+            return response
+        response = StreamingHttpResponse(
+            _file_range(path, start, end - start + 1), status=206, content_type=content_type
+        )
+        response["Content-Range"] = f"bytes {start}-{end}/{size}"
+        response["Content-Length"] = str(end - start + 1)
+    else:
+        response = FileResponse(open(path, "rb"), content_type=content_type)
+    response["Accept-Ranges"] = "bytes"
+    response["ETag"] = etag
+    # Content-addressed, so a given URL+ETag never changes.
+    response["Cache-Control"] = "private, max-age=31536000, immutable"
+    return response
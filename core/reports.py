@@ -0,0 +1,69 @@
+"""Query helpers and report functions shared by the sync and async report views.
+
+Both variants of an endpoint call the same function here, so they always
+return the same figures.
+"""
+import datetime
+
+from django.utils import timezone
+
+from .models import Expense, Income, LedgerEntry
+
+# model -> (owner field, time field, whether the time field is a datetime)
+TIME_FIELDS = {
+    Expense: ("created_by", "date_time", True),
+    Income: ("created_by", "date", False),
+    LedgerEntry: ("user", "ts", True),
+}
+
+
+def month_bounds(month):
+    """Return the ``[first day, first day of next month)`` dates of ``YYYY-MM``."""
+    year, mon = map(int, month.split("-"))
+    start = datetime.date(year, mon, 1)
+    return start, datetime.date(year + mon // 12, mon % 12 + 1, 1)
+
+
+def month_range(month):
+    """Like ``month_bounds`` but as aware datetimes, for ``date_time``/``ts`` columns."""
+    start, end = month_bounds(month)
+    return tuple(
+        timezone.make_aware(datetime.datetime.combine(day, datetime.time.min)) for day in (start, end)
+    )
+
+
+def filter_by_month(qs, user, month=None):
+    owner, field, is_datetime = TIME_FIELDS[qs.model]
+    qs = qs.filter(**{owner: user})
+    if month:
+        try:
+            start, end = month_range(month) if is_datetime else month_bounds(month)
+        except ValueError:
+            return qs.none()
+        # Plain range predicates (not __year/__month extracts) so the
+        # (user, date) index and partition pruning apply.
+        qs = qs.filter(**{f"{field}__gte": start, f"{field}__lt": end})
+    return qs
+
+
+def profit_loss(user_id, month=None):
+    from . import snapshots  # imports this module
+
+    totals = snapshots.totals(user_id, month)
+    return {
+        "total_income": totals["income"],
+        "total_expenses": totals["expense"],
+        "profit_loss": totals["income"] - totals["expense"],
+    }
+
+
+def type_breakdown(user_id, month=None):
+    from . import snapshots
+
+    return snapshots.type_totals(user_id, month)
+
+
+def top_expenses(user, month=None, limit=5):
+    """The ``limit`` largest expenses as a lazy values queryset."""
+    expenses = filter_by_month(Expense.objects.all(), user, month)
+    return expenses.order_by("-amount")[:limit].values("transaction_type", "amount", "date_time", "receiver_name")
@@ -0,0 +1,36 @@
+"""
+Ranked search over expenses.
+
+On PostgreSQL the substring and ``%`` predicates are served by the pg_trgm
+GIN indexes created in migration 0014 and results are ranked by trigram
+similarity, so typos in counterparty names still match. Other backends
+(SQLite in tests) fall back to ``icontains`` with a prefix-based rank.
+"""
+from django.db import connections
+from django.db.models import Case, FloatField, Q, Value, When
+from django.db.models.functions import Greatest
+
+SEARCH_FIELDS = ("receiver_name", "sender_name", "transaction_type", "transaction_id")
+FUZZY_FIELDS = ("receiver_name", "sender_name")
+
+
+def search_expenses(qs, query):
+    match = Q()
+    for field in SEARCH_FIELDS:
+        match |= Q(**{f"{field}__icontains": query})
+    exact_id = Case(When(transaction_id=query, then=Value(1.0)), default=Value(0.0), output_field=FloatField())
+
+    if connections[qs.db].vendor == "postgresql":
+        from django.contrib.postgres.search import TrigramSimilarity
+
+        if len(query) >= 3:
+            for field in FUZZY_FIELDS:
+                match |= Q(**{f"{field}__trigram_similar": query})
+        rank = Greatest(*[TrigramSimilarity(field, query) for field in SEARCH_FIELDS]) + exact_id
+    else:
+        rank = exact_id + Case(
+            *[When(**{f"{field}__istartswith": query}, then=Value(0.5)) for field in SEARCH_FIELDS],
+            default=Value(0.1),
+            output_field=FloatField(),
+        )
+    return qs.filter(match).annotate(rank=rank).order_by("-rank", "-date_time")
@@ -1,6 +1,7 @@
 from rest_framework import serializers
+from django.urls import reverse
 from django.contrib.auth.hashers import make_password
-from .models import Role, User, Expense, Income
+from .models import Role, User, Expense, Income, LedgerEntry, Budget, BudgetAlert, CategoryRule
 
 # 1. Role Serializer
 class RoleSerializer(serializers.ModelSerializer):
@@ -45,6 +46,8 @@ class UserSerializer(serializers.ModelSerializer):
 # 4. Expense Serializer
 class ExpenseSerializer(serializers.ModelSerializer):
     created_by = serializers.StringRelatedField(read_only=True)
+    receipt_url = serializers.SerializerMethodField()
+    receipt_thumbnail_url = serializers.SerializerMethodField()
     class Meta:
         model = Expense
         fields = [
@@ -57,15 +60,83 @@ class ExpenseSerializer(serializers.ModelSerializer):
             'fee',
             'total',
             'date_time',
+            'category',
+            'origin',
             'created_by',
+            'receipt_url',
+            'receipt_thumbnail_url',
+            'updated_at',
         ]
-        read_only_fields = ['created_by']
+        read_only_fields = ['created_by', 'origin', 'updated_at']
+
+    # Lists only carry links; the image bytes are fetched separately and are
+    # cacheable forever because the version tag is the content hash.
+    def get_receipt_url(self, obj):
+        if not obj.receipt_id:
+            return None
+        return f"{reverse('expenses-receipt', args=[obj.pk])}?v={obj.receipt.sha256[:16]}"
+
+    def get_receipt_thumbnail_url(self, obj):
+        if not obj.receipt_id or not obj.receipt.content_type.startswith("image/"):
+            return None
+        return f"{reverse('expenses-receipt-thumbnail', args=[obj.pk])}?size=256&v={obj.receipt.sha256[:16]}"
+
+class ExpenseSearchSerializer(ExpenseSerializer):
+    rank = serializers.FloatField(read_only=True)
+    class Meta(ExpenseSerializer.Meta):
+        fields = ExpenseSerializer.Meta.fields + ['rank']
 
 # 5. Income Serializer
 class IncomeSerializer(serializers.ModelSerializer):
     created_by = serializers.StringRelatedField(read_only=True)
     class Meta:
         model = Income
-        fields = ['id', 'title', 'amount', 'source', 'date', 'created_by']
+        fields = ['id', 'title', 'amount', 'source', 'date', 'created_by', 'updated_at']
+        read_only_fields = ['updated_at']
+
+# 6. Ledger Serializer
+class LedgerEntrySerializer(serializers.ModelSerializer):
+    running_balance = serializers.DecimalField(max_digits=14, decimal_places=2, read_only=True)
+    class Meta:
+        model = LedgerEntry
+        fields = ['id', 'kind', 'source_id', 'ts', 'amount', 'signed_amount', 'source', 'counterparty', 'running_balance']
+
+# 7. Budget Serializers
+class BudgetSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Budget
+        fields = ['id', 'transaction_type', 'limit', 'created_at']
+        read_only_fields = ['created_at']
+
+    def validate_limit(self, value):
+        if value <= 0:
+            raise serializers.ValidationError("Limit must be positive.")
+        return value
+
+    def validate_transaction_type(self, value):
+        user = self.context["request"].user
+        existing = Budget.objects.filter(user=user, transaction_type=value)
+        if self.instance is not None:
+            existing = existing.exclude(pk=self.instance.pk)
+        if existing.exists():
+            raise serializers.ValidationError("A budget for this transaction type already exists.")
+        return value
 
+class BudgetAlertSerializer(serializers.ModelSerializer):
+    transaction_type = serializers.CharField(source='budget.transaction_type', read_only=True)
+    limit = serializers.DecimalField(source='budget.limit', max_digits=12, decimal_places=2, read_only=True)
+    class Meta:
+        model = BudgetAlert
+        fields = ['id', 'transaction_type', 'limit', 'month', 'threshold', 'spent', 'created_at']
+
+# 8. Category Rule Serializer
+class CategoryRuleSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = CategoryRule
+        fields = ['id', 'keyword', 'field', 'category', 'priority', 'created_at']
+        read_only_fields = ['created_at']
 
+    def validate_keyword(self, value):
+        if not value.strip():
+            raise serializers.ValidationError("Keyword must not be blank.")
+        return value.strip()
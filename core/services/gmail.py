@@ -0,0 +1,271 @@
+"""
+Gmail (IMAP) ingestion of Easypaisa e-statements.
+
+The network part (``fetch_messages``) is kept apart from parsing and storing
+(``store_messages``) so the async view can run the blocking IMAP session in
+an executor while the ORM work goes through ``sync_to_async``.
+"""
+import asyncio
+import datetime
+import email
+import imaplib
+import logging
+import re
+from concurrent.futures import ThreadPoolExecutor
+from zoneinfo import ZoneInfo
+
+from asgiref.sync import sync_to_async
+from bs4 import BeautifulSoup
+from django.conf import settings
+from django.db import transaction
+from django.utils.module_loading import import_string
+from rest_framework import status
+
+from .. import categories, events, fingerprints, metrics
+from ..models import Expense
+
+logger = logging.getLogger(__name__)
+
+STATEMENT_SENDER = "e.statement@telenorbank.pk"
+LOCAL_TZ = ZoneInfo("Asia/Karachi")
+
+# Dedicated pool for blocking IMAP sessions started from async views, so slow
+# mailboxes never occupy the threads sync_to_async uses for the ORM.
+_imap_executor = ThreadPoolExecutor(
+    max_workers=getattr(settings, "GMAIL_IMAP_MAX_WORKERS", 64),
+    thread_name_prefix="imap",
+)
+
+
+def _imap_class():
+    path = getattr(settings, "GMAIL_IMAP_CLASS", None)
+    return import_string(path) if path else imaplib.IMAP4_SSL
+
+
+def build_search_query(from_date=None, to_date=None):
+    if from_date and to_date:
+        from_dt = datetime.datetime.strptime(from_date, "%Y-%m-%d")
+        to_dt = datetime.datetime.strptime(to_date, "%Y-%m-%d") + datetime.timedelta(days=1)
+        return f'(FROM "{STATEMENT_SENDER}" SINCE {from_dt.strftime("%d-%b-%Y")} BEFORE {to_dt.strftime("%d-%b-%Y")})'
+    elif from_date:
+        from_dt = datetime.datetime.strptime(from_date, "%Y-%m-%d")
+        return f'(FROM "{STATEMENT_SENDER}" SINCE {from_dt.strftime("%d-%b-%Y")})'
+    elif to_date:
+        to_dt = datetime.datetime.strptime(to_date, "%Y-%m-%d") + datetime.timedelta(days=1)
+        return f'(FROM "{STATEMENT_SENDER}" BEFORE {to_dt.strftime("%d-%b-%Y")})'
+    return f'(FROM "{STATEMENT_SENDER}")'
+
+
+def fetch_messages(address, password, search_query):
+    """Return ``[(mail_id, raw_rfc822_bytes), ...]``, newest first."""
+    # Log out on every path: imports run in many threads at once, and a
+    # session leaked per failed login or fetch adds up.
+    imap = None
+    try:
+        with metrics.timer("gmail_import_stage_seconds", stage="login"):
+            imap = _imap_class()(getattr(settings, "GMAIL_IMAP_HOST", "imap.gmail.com"))
+            imap.login(address, password)
+            imap.select("inbox")
+        with metrics.timer("gmail_import_stage_seconds", stage="search"):
+            status_, messages = imap.search(None, search_query)
+        mail_ids = messages[0].split()
+
+        fetched = []
+        with metrics.timer("gmail_import_stage_seconds", stage="fetch"):
+            for mail_id in reversed(mail_ids):
+                status_, data = imap.fetch(mail_id, "(RFC822)")
+                fetched.append((mail_id, data[0][1]))
+        metrics.inc("gmail_emails_fetched_total", len(fetched))
+        imap.close()
+    finally:
+        if imap is not None:
+            try:
+                imap.logout()
+            except Exception:
+                logger.warning("IMAP logout failed", exc_info=True)
+    return fetched
+
+
+def parse_message(raw):
+    """Extract the transaction fields from one statement email."""
+    msg = email.message_from_bytes(raw)
+
+    body = ""
+    if msg.is_multipart():
+        for part in msg.walk():
+            ctype = part.get_content_type()
+            if ctype == "text/plain":
+                body = part.get_payload(decode=True).decode(errors="ignore")
+                break
+            elif ctype == "text/html":
+                body = part.get_payload(decode=True).decode(errors="ignore")
+    else:
+        body = msg.get_payload(decode=True).decode(errors="ignore")
+
+    soup = BeautifulSoup(body, "html.parser")
+    text = soup.get_text(separator="\n")
+
+    parsed = {
+        "transaction_id": None,
+        "transaction_type": None,
+        "receiver_name": None,
+        "sender_name": None,
+        "amount": None,
+        "fee": None,
+        "total": None,
+        "date_time": datetime.datetime.now(tz=LOCAL_TZ),
+    }
+
+    m = re.search(r"Transaction ID\s+(\d+)", text)
+    if m:
+        parsed["transaction_id"] = m.group(1).strip()
+
+    m = re.search(r"Transaction Type\s+([A-Za-z ]+)", text)
+    if m:
+        parsed["transaction_type"] = m.group(1).strip()
+
+    m = re.search(r"Date & Time\s+([0-9]{2}-[A-Za-z]{3}-[0-9]{4}\s+[0-9:]+)", text)
+    if m:
+        try:
+            naive_dt = datetime.datetime.strptime(m.group(1).strip(), "%d-%b-%Y %H:%M:%S")
+            parsed["date_time"] = naive_dt.replace(tzinfo=LOCAL_TZ)
+        except Exception:
+            pass
+
+    m = re.search(r"Account Title\s+(.+)", text)
+    if m:
+        parsed["receiver_name"] = m.group(1).strip()
+
+    m = re.search(r"Sender Name\s+(.+)", text)
+    if m:
+        parsed["sender_name"] = m.group(1).strip()
+
+    m = re.search(r"Transfer amount\s+Rs\.?\s*([0-9,\.]+)", text)
+    if m:
+        parsed["amount"] = float(m.group(1).replace(",", ""))
+
+    m = re.search(r"Fee\s+Rs\.?\s*([0-9,\.]+)", text)
+    if m:
+        parsed["fee"] = float(m.group(1).replace(",", ""))
+
+    m = re.search(r"Total\s+Rs\.?\s*([0-9,\.]+)", text)
+    if m:
+        parsed["total"] = float(m.group(1).replace(",", ""))
+
+    return parsed
+
+
+def store_messages(user, messages):
+    candidates = []
+    for _, raw in messages:
+        with metrics.timer("gmail_import_stage_seconds", stage="parse"):
+            parsed = parse_message(raw)
+        metrics.inc("gmail_emails_parsed_total")
+        amount = parsed["amount"]
+        if not amount:
+            metrics.inc("gmail_emails_skipped_total", reason="no_amount")
+            continue
+        candidates.append(Expense(
+            receiver_name=parsed["receiver_name"] or parsed["transaction_type"],
+            amount=amount,
+            date_time=parsed["date_time"],
+            transaction_id=parsed["transaction_id"],
+            transaction_type=parsed["transaction_type"] or "Unknown",
+            sender_name=parsed["sender_name"] or "Unknown",
+            fee=parsed["fee"] or 0.0,
+            total=parsed["total"] or amount,
+            origin="statement",
+            created_by=user,
+        ))
+
+    # One indexed lookup per batch for each dedup key.
+    with metrics.timer("gmail_import_stage_seconds", stage="dedup"):
+        known_ids = set(
+            Expense.objects.filter(
+                transaction_id__in=[e.transaction_id for e in candidates if e.transaction_id]
+            ).values_list("transaction_id", flat=True)
+        )
+        fresh = []
+        for expense in candidates:
+            if expense.transaction_id and expense.transaction_id in known_ids:
+                metrics.inc("gmail_emails_skipped_total", reason="duplicate")
+                continue
+            known_ids.add(expense.transaction_id)
+            fresh.append(expense)
+        fresh, duplicates = fingerprints.split_duplicates(user.pk, fresh)
+        metrics.inc("gmail_emails_skipped_total", len(duplicates), reason="fingerprint")
+
+    categories.categorize(user.pk, fresh)
+    imported = []
+    # Rows and their derived state (budgets, payees, snapshots) commit together.
+    with transaction.atomic():
+        for expense in fresh:
+            # Statements without an id get a stable one derived from the content.
+            expense.transaction_id = expense.transaction_id or f"fp-{expense.fingerprint}"
+            try:
+                with transaction.atomic():  # savepoint: a bad row doesn't abort the batch
+                    expense.save()
+                imported.append(expense)
+            except Exception:
+                metrics.inc("gmail_import_errors_total", stage="store")
+                logger.exception("Failed to store Gmail transaction %s", expense.transaction_id)
+
+        events.expenses_created(user.pk, imported)
+    imported_ids = [expense.id for expense in imported]
+    metrics.inc("gmail_rows_inserted_total", len(imported_ids))
+
+    if not imported_ids:
+        return {"message": "No new valid transactions found."}, status.HTTP_200_OK
+
+    return (
+        {"message": f"{len(imported_ids)} expenses imported.", "ids": imported_ids},
+        status.HTTP_201_CREATED,
+    )
+
+
+def _credentials(user):
+    if not user.gmail or not user.gmail_app_password:
+        return None
+    return user.gmail, user.gmail_app_password
+
+
+MISSING_CREDENTIALS = (
+    {"error": "Your Gmail or App Password is not set in your profile."},
+    status.HTTP_400_BAD_REQUEST,
+)
+NO_EMAILS = {"message": "No Easypaisa emails found."}, status.HTTP_200_OK
+
+
+def import_from_gmail(user, from_date=None, to_date=None):
+    """Run a full import and return ``(payload, status_code)``."""
+    try:
+        credentials = _credentials(user)
+        if not credentials:
+            return MISSING_CREDENTIALS
+        messages = fetch_messages(*credentials, build_search_query(from_date, to_date))
+        if not messages:
+            return NO_EMAILS
+        return store_messages(user, messages)
+    except Exception as e:
+        metrics.inc("gmail_import_errors_total", stage="import")
+        logger.exception("Gmail import failed for user %s", user.pk)
+        return {"error": str(e)}, status.HTTP_500_INTERNAL_SERVER_ERROR
+
+
+async def aimport_from_gmail(user, from_date=None, to_date=None):
+    """Async twin of ``import_from_gmail`` that never blocks the event loop."""
+    try:
+        credentials = _credentials(user)
+        if not credentials:
+            return MISSING_CREDENTIALS
+        loop = asyncio.get_running_loop()
+        messages = await loop.run_in_executor(
+            _imap_executor, fetch_messages, *credentials, build_search_query(from_date, to_date)
+        )
+        if not messages:
+            return NO_EMAILS
+        return await sync_to_async(store_messages)(user, messages)
+    except Exception as e:
+        metrics.inc("gmail_import_errors_total", stage="import")
+        logger.exception("Gmail import failed for user %s", user.pk)
+        return {"error": str(e)}, status.HTTP_500_INTERNAL_SERVER_ERROR
@@ -0,0 +1,77 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import snapshots, sync
+from .categories import bump_rules_version
+from .models import CategoryRule, Expense, Income, User
+from .versioning import bump_ledger_version
+
+
+@receiver(post_save, sender=Expense)
+@receiver(post_delete, sender=Expense)
+@receiver(post_save, sender=Income)
+@receiver(post_delete, sender=Income)
+def ledger_changed(sender, instance, **kwargs):
+    bump_ledger_version(instance.created_by_id)
+
+
+@receiver(post_save, sender=Expense)
+@receiver(post_save, sender=Income)
+def record_upsert(sender, instance, **kwargs):
+    sync.record(instance.created_by_id, sync.KINDS[sender], [instance.pk])
+
+
+@receiver(post_delete, sender=Expense)
+@receiver(post_delete, sender=Income)
+def record_delete(sender, instance, origin=None, **kwargs):
+    # Rows cascading from a deleted user take their change log with them.
+    if isinstance(origin, User):
+        return
+    sync.record(instance.created_by_id, sync.KINDS[sender], [instance.pk], op=sync.DELETE)
+
+
+# Fields a snapshot row is built from (see core.snapshots).
+SNAPSHOT_FIELDS = {
+    Expense: {"date_time", "amount", "transaction_type", "receiver_name"},
+    Income: {"date", "amount", "source", "title"},
+}
+
+
+@receiver(pre_save, sender=Expense)
+@receiver(pre_save, sender=Income)
+def invalidate_previous_month(sender, instance, raw=False, update_fields=None, **kwargs):
+    # An edit can move a row out of a closed month; that month goes stale too.
+    if raw or instance.pk is None:
+        return
+    if update_fields is not None and not SNAPSHOT_FIELDS[sender].intersection(update_fields):
+        return
+    previous = sender._base_manager.filter(pk=instance.pk).first()
+    if previous is not None:
+        snapshots.invalidate(previous.created_by_id, [previous])
+
+
+@receiver(post_save, sender=Expense)
+@receiver(post_save, sender=Income)
+def invalidate_snapshot(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and not SNAPSHOT_FIELDS[sender].intersection(update_fields):
+        return
+    snapshots.invalidate(instance.created_by_id, [instance])
+
+
+@receiver(post_delete, sender=Expense)
+@receiver(post_delete, sender=Income)
+def invalidate_deleted(sender, instance, origin=None, **kwargs):
+    if isinstance(origin, User):
+        return  # user_deleted drops all their snapshots
+    snapshots.invalidate(instance.created_by_id, [instance])
+
+
+@receiver(post_delete, sender=User)
+def user_deleted(sender, instance, **kwargs):
+    snapshots.drop_user(instance.pk)
+
+
+@receiver(post_save, sender=CategoryRule)
+@receiver(post_delete, sender=CategoryRule)
+def category_rules_changed(sender, instance, **kwargs):
+    bump_rules_version(instance.user_id)
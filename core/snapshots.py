@@ -0,0 +1,366 @@
+"""
+Columnar snapshots of closed ledger months.
+
+Months before the current one rarely change, yet reports, time series and
+exports read them again on every request. ``build`` writes one closed month
+of a user's ledger (expenses and incomes, in ``ts, id`` order) to
+``MEDIA_ROOT/snapshots/v<FORMAT>/<user>/<YYYY-MM>/``: ``columns.npy``, one
+array of fixed-width records, and ``strings.json``, the dictionary the
+string columns index into (-1 is null):
+
+    source_id     int64  Expense/Income primary key
+    kind          int8   index into ``KINDS``
+    ts            int64  epoch seconds
+    cents         int64  amount in cents, so sums are exact
+    source        int32  transaction type / income source
+    counterparty  int32  receiver name / income title
+
+``load`` memory-maps the records (``np.load(mmap_mode="r")``) and each column
+is a zero-copy view of them, so a closed month is read from the page cache
+rather than the database; only the open month is queried live (``split``).
+A write that touches a closed month drops its snapshot after commit
+(``invalidate``, called from the model signals in ``core.signals`` and from
+``core.events`` for bulk inserts) and the next read rebuilds it. Snapshots
+are always built from the primary.
+
+A single-month read builds that month if it is missing. A whole-ledger read
+builds at most ``BUILDS_PER_READ`` missing months and reads the others live
+from SQL, so a user's first report doesn't build years of months inline;
+later reads fill in the rest.
+
+NumPy is imported inside the functions that need it, so importing this
+module (``core.signals`` does) keeps web workers light.
+"""
+import datetime
+import heapq
+import json
+import os
+import shutil
+import tempfile
+import time
+import uuid
+from collections import defaultdict
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models import Min, Q, Sum
+from django.utils import timezone
+
+from . import metrics
+from .budgets import month_of
+from .models import Expense, Income, LedgerEntry
+from .reports import month_bounds, month_range
+
+FORMAT = 1
+KINDS = ("expense", "income")
+# Record dtype of columns.npy; bump FORMAT when it changes.
+COLUMNS = [
+    ("source_id", "<i8"),
+    ("kind", "i1"),
+    ("ts", "<i8"),
+    ("cents", "<i8"),
+    ("source", "<i4"),
+    ("counterparty", "<i4"),
+]
+# How long an invalidation vetoes builds that started before it.
+INVALIDATION_TTL = 60 * 60
+BUILDS_PER_READ = getattr(settings, "SNAPSHOT_BUILDS_PER_READ", 2)
+
+
+def _root():
+    return os.path.join(settings.MEDIA_ROOT, "snapshots", f"v{FORMAT}")
+
+
+def month_dir(user_id, month):
+    return os.path.join(_root(), str(user_id), f"{month:%Y-%m}")
+
+
+def _marker(user_id, month):
+    return f"snapshots:invalidated:{user_id}:{month:%Y-%m}"
+
+
+def open_month():
+    return month_of(timezone.now())
+
+
+def _next_month(month):
+    return datetime.date(month.year + month.month // 12, month.month % 12 + 1, 1)
+
+
+def _income_ts(day):
+    # Incomes sit at midnight UTC of their date in the ledger view.
+    return datetime.datetime.combine(day, datetime.time.min, tzinfo=datetime.timezone.utc)
+
+
+def entry_month(entry):
+    """Ledger month of an Expense or Income."""
+    if isinstance(entry, Income):
+        return month_of(_income_ts(entry.date))
+    return month_of(entry.date_time)
+
+
+class Snapshot:
+    """One month's columns (memory-mapped when read from disk) and string dictionary."""
+
+    def __init__(self, columns, strings):
+        self.columns = columns
+        self.strings = strings
+
+    def __getitem__(self, name):
+        return self.columns[name]
+
+    def __len__(self):
+        return len(self.columns)
+
+    def label(self, code):
+        return self.strings[code] if code >= 0 else None
+
+
+def build(user_id, month):
+    """Write ``month`` (first day) of the user's ledger to disk and return it."""
+    import numpy as np
+
+    started = time.time()
+    start, end = month_range(f"{month:%Y-%m}")
+    rows = list(
+        # From the primary: a replica a few seconds behind would be persisted.
+        LedgerEntry.objects.using(DEFAULT_DB_ALIAS)
+        .filter(user_id=user_id, ts__gte=start, ts__lt=end)
+        .order_by("ts", "id")
+        .values_list("source_id", "kind", "ts", "amount", "source", "counterparty")
+    )
+    strings, codes = [], {}
+
+    def code(value):
+        if value is None:
+            return -1
+        if value not in codes:
+            codes[value] = len(strings)
+            strings.append(value)
+        return codes[value]
+
+    columns = np.array(
+        [
+            (pk, KINDS.index(kind), int(ts.timestamp()), int(amount * 100), code(source), code(counterparty))
+            for pk, kind, ts, amount, source, counterparty in rows
+        ],
+        dtype=COLUMNS,
+    )
+
+    path = month_dir(user_id, month)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = tempfile.mkdtemp(dir=os.path.dirname(path), prefix=".build-")
+    try:
+        np.save(os.path.join(tmp, "columns.npy"), columns)
+        with open(os.path.join(tmp, "strings.json"), "w") as fh:
+            json.dump(strings, fh)
+        # Don't publish what an edit committed during the build has outdated.
+        invalidated = cache.get(_marker(user_id, month))
+        if invalidated is None or invalidated < started:
+            try:
+                os.rename(tmp, path)
+                tmp = None
+            except OSError:
+                pass  # a concurrent build published first
+    finally:
+        if tmp is not None:
+            shutil.rmtree(tmp, ignore_errors=True)
+    return Snapshot(columns, strings)
+
+
+def _read(user_id, month):
+    """Memory-map the snapshot of closed ``month``, or None if it isn't built."""
+    import numpy as np
+
+    path = month_dir(user_id, month)
+    try:
+        # Mapped pages stay readable if an invalidation removes the files.
+        columns = np.load(os.path.join(path, "columns.npy"), mmap_mode="r")
+        with open(os.path.join(path, "strings.json")) as fh:
+            strings = json.load(fh)
+    except FileNotFoundError:
+        return None
+    metrics.inc("snapshot_reads_total", result="hit")
+    return Snapshot(columns, strings)
+
+
+def _build(user_id, month):
+    metrics.inc("snapshot_reads_total", result="build")
+    with metrics.timer("snapshot_build_seconds"):
+        return build(user_id, month)
+
+
+def load(user_id, month):
+    """Memory-map the snapshot of closed ``month``, building it if missing."""
+    snap = _read(user_id, month)
+    return _build(user_id, month) if snap is None else snap
+
+
+def _remove(path):
+    # Rename first so readers never see a half-deleted month; open memory
+    # maps stay valid after the unlink.
+    trash = f"{path}.{uuid.uuid4().hex[:8]}.old"
+    try:
+        os.rename(path, trash)
+    except FileNotFoundError:
+        return
+    shutil.rmtree(trash, ignore_errors=True)
+
+
+def _drop(user_id, months):
+    now = time.time()
+    for month in months:
+        cache.set(_marker(user_id, month), now, timeout=INVALIDATION_TTL)
+        _remove(month_dir(user_id, month))
+
+
+def invalidate(user_id, entries):
+    """Drop the snapshots of the closed months ``entries`` fall in, after commit."""
+    current = open_month()
+    stale = sorted({month for month in map(entry_month, entries) if month < current})
+    if stale:
+        transaction.on_commit(lambda: _drop(user_id, stale))
+
+
+def drop_user(user_id):
+    _remove(os.path.join(_root(), str(user_id)))
+
+
+def first_month(user_id):
+    first_expense = Expense.objects.filter(created_by_id=user_id).aggregate(m=Min("date_time"))["m"]
+    first_income = Income.objects.filter(created_by_id=user_id).aggregate(m=Min("date"))["m"]
+    months = []
+    if first_expense:
+        months.append(month_of(first_expense))
+    if first_income:
+        months.append(month_of(_income_ts(first_income)))
+    return min(months) if months else None
+
+
+def split(user_id, month=None):
+    """Split a period into closed-month snapshots and a live LedgerEntry queryset.
+
+    ``month`` is ``YYYY-MM``, or None for the whole ledger. Invalid months
+    yield nothing. The live queryset covers the open month and, for the
+    whole ledger, closed months left unbuilt, so it can precede snapshots.
+    """
+    live = LedgerEntry.objects.filter(user_id=user_id)
+    current = open_month()
+    if month:
+        try:
+            start, end = month_range(month)
+            first_day = month_bounds(month)[0]
+        except ValueError:
+            return [], live.none()
+        if first_day >= current:
+            return [], live.filter(ts__gte=start, ts__lt=end)
+        first = first_month(user_id)
+        # Months before the user's first entry are empty; don't snapshot them.
+        snaps = [load(user_id, first_day)] if first and first <= first_day else []
+        return snaps, live.none()
+
+    snaps, builds = [], BUILDS_PER_READ
+    start, _ = month_range(f"{current:%Y-%m}")
+    unbuilt = Q(ts__gte=start)
+    month = first_month(user_id)
+    while month and month < current:
+        snap = _read(user_id, month)
+        if snap is None and builds > 0:
+            snap, builds = _build(user_id, month), builds - 1
+        if snap is None:
+            metrics.inc("snapshot_reads_total", result="live")
+            month_start, month_end = month_range(f"{month:%Y-%m}")
+            unbuilt |= Q(ts__gte=month_start, ts__lt=month_end)
+        else:
+            snaps.append(snap)
+        month = _next_month(month)
+    return snaps, live.filter(unbuilt)
+
+
+def _decimal(cents):
+    return Decimal(int(cents)) / 100
+
+
+def totals(user_id, month=None):
+    """``{"expense": total, "income": total}`` over the period."""
+    snaps, live = split(user_id, month)
+    cents = {kind: 0 for kind in KINDS}
+    for snap in snaps:
+        for index, kind in enumerate(KINDS):
+            cents[kind] += int(snap["cents"][snap["kind"] == index].sum())
+    live_totals = live.aggregate(
+        expense=Sum("amount", filter=Q(kind="expense")),
+        income=Sum("amount", filter=Q(kind="income")),
+    )
+    return {kind: _decimal(cents[kind]) + (live_totals[kind] or 0) for kind in KINDS}
+
+
+def type_totals(user_id, month=None):
+    """Expense totals per transaction type, ordered by type."""
+    import numpy as np
+
+    snaps, live = split(user_id, month)
+    cents = defaultdict(int)
+    for snap in snaps:
+        expense = snap["kind"] == KINDS.index("expense")
+        # Shift codes by one so null (-1) gets a bucket too.
+        codes = snap["source"][expense] + 1
+        counts = np.bincount(codes)
+        sums = np.bincount(codes, weights=snap["cents"][expense])
+        for code in np.flatnonzero(counts):
+            cents[snap.label(int(code) - 1)] += int(round(sums[code]))
+    result = {transaction_type: _decimal(total) for transaction_type, total in cents.items()}
+    for transaction_type, total in (
+        live.filter(kind="expense").values_list("source").annotate(total=Sum("amount")).order_by()
+    ):
+        result[transaction_type] = result.get(transaction_type, 0) + total
+    return [
+        {"transaction_type": transaction_type, "total": result[transaction_type]}
+        for transaction_type in sorted(result, key=lambda t: (t is None, t or ""))
+    ]
+
+
+def rows(user_id, month=None):
+    """``(source, kind, amount, ts)`` for the period, in chronological order."""
+    snaps, live = split(user_id, month)
+
+    def snapshot_rows():
+        for snap in snaps:
+            columns = (snap["source"].tolist(), snap["kind"].tolist(), snap["cents"].tolist(), snap["ts"].tolist())
+            for source, kind, cents, ts in zip(*columns):
+                yield (
+                    snap.label(source), KINDS[kind], _decimal(cents),
+                    datetime.datetime.fromtimestamp(ts, datetime.timezone.utc),
+                )
+
+    # Both streams are sorted and never share a month, so merging on ts
+    # keeps (ts, id) order.
+    live_rows = live.order_by("ts", "id").values_list("source", "kind", "amount", "ts").iterator()
+    yield from heapq.merge(snapshot_rows(), live_rows, key=lambda row: row[3])
+
+
+def expense_series(user_id):
+    """``(ids, epoch_seconds, amounts)`` of the user's expenses, sorted by time."""
+    import numpy as np
+
+    snaps, live = split(user_id)
+    ids, seconds, amounts = [], [], []
+    for snap in snaps:
+        expense = snap["kind"] == KINDS.index("expense")
+        ids.append(snap["source_id"][expense])
+        seconds.append(snap["ts"][expense].astype(np.float64))
+        amounts.append(snap["cents"][expense] / 100)
+    recent = list(live.filter(kind="expense").order_by("ts", "id").values_list("source_id", "ts", "amount"))
+    if recent:
+        ids.append(np.fromiter((r[0] for r in recent), np.int64, len(recent)))
+        seconds.append(np.fromiter((r[1].timestamp() for r in recent), np.float64, len(recent)))
+        amounts.append(np.fromiter((r[2] for r in recent), np.float64, len(recent)))
+    if not ids:
+        return np.empty(0, np.int64), np.empty(0, np.float64), np.empty(0, np.float64)
+    ids, seconds, amounts = np.concatenate(ids), np.concatenate(seconds), np.concatenate(amounts)
+    # Unbuilt months come back with the live rows; a stable sort on time
+    # puts them in place and keeps the (ts, id) order within each month.
+    order = np.argsort(seconds, kind="stable")
+    return ids[order], seconds[order], amounts[order]
@@ -0,0 +1,117 @@
+"""
+Delta sync for expense and income clients.
+
+Every write appends a ``SyncChange`` row (see ``core.signals``; bulk paths
+call ``record`` themselves). Its auto-increment id is the sync cursor: a
+client keeps the last cursor it saw and asks for ``changes?since=<cursor>``,
+getting only the rows written after it plus tombstones for deletions.
+
+Ids are allocated when a row is inserted but become visible when its
+transaction commits, so two concurrent writers could commit out of order and
+a client could move its cursor past a change that was still in flight.
+``record`` therefore takes a row lock on the user first: a user's sync writes
+commit one at a time, in id order.
+
+The user's newest cursor also serves as the ETag of the list endpoints, so an
+unchanged ledger costs one index lookup and a 304.
+
+``compact`` (the ``compact_sync_changes`` command) keeps the table bounded:
+it drops rows superseded by a later change to the same object, and
+tombstones older than ``SYNC_RETENTION_DAYS``. Expiring tombstones leaves a
+``reset`` marker whose ``object_id`` is the newest cursor expired; a client
+behind it has missed deletions and gets ``ResyncRequired``.
+"""
+import datetime
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from .models import Expense, Income, SyncChange, User
+
+UPSERT = "upsert"
+DELETE = "delete"
+MODELS = {"expense": Expense, "income": Income}
+KINDS = {model: kind for kind, model in MODELS.items()}
+RELATED = {"expense": ("created_by__role", "receipt"), "income": ("created_by__role",)}
+RESET = "reset"
+MAX_PAGE = 1000
+RETENTION_DAYS = getattr(settings, "SYNC_RETENTION_DAYS", 90)
+
+
+class ResyncRequired(Exception):
+    """The cursor predates compacted tombstones; sync again from 0."""
+
+
+def _lock_user(user_id):
+    # Held until the surrounding transaction commits. NO KEY UPDATE doesn't
+    # conflict with the KEY SHARE lock the FK check of the insert just took.
+    list(User.objects.select_for_update(no_key=True).filter(pk=user_id).values_list("pk", flat=True))
+
+
+def record(user_id, kind, object_ids, op=UPSERT):
+    with transaction.atomic():
+        _lock_user(user_id)
+        SyncChange.objects.bulk_create(
+            [SyncChange(user_id=user_id, kind=kind, object_id=pk, op=op) for pk in object_ids]
+        )
+
+
+def current_cursor(user_id):
+    return (
+        SyncChange.objects.filter(user_id=user_id)
+        .order_by("-id").values_list("id", flat=True).first()
+        or 0
+    )
+
+
+def changes(user_id, since=0, limit=MAX_PAGE):
+    """Return ``(cursor, has_more, upserts, deletes)`` for changes after ``since``.
+
+    Several changes to the same object collapse into the latest one.
+    ``upserts`` maps kind to the current model instances; ``deletes`` is a
+    list of ``(kind, object_id)`` tombstones. Raises ``ResyncRequired`` if
+    tombstones after ``since`` have been compacted away.
+    """
+    if since and SyncChange.objects.filter(user_id=user_id, op=RESET, object_id__gt=since).exists():
+        raise ResyncRequired
+    rows = list(
+        SyncChange.objects.filter(user_id=user_id, id__gt=since)
+        .order_by("id").values_list("id", "kind", "object_id", "op")[:limit + 1]
+    )
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    latest = {}
+    for _, kind, object_id, op in rows:
+        if op == RESET:
+            continue
+        latest[(kind, object_id)] = op
+
+    upserts = {}
+    for kind, model in MODELS.items():
+        ids = [pk for (k, pk), op in latest.items() if k == kind and op == UPSERT]
+        # Objects deleted since are skipped; their tombstone is further on.
+        qs = model.objects.select_related(*RELATED[kind]).filter(created_by_id=user_id, pk__in=ids)
+        upserts[kind] = list(qs) if ids else []
+    deletes = [key for key, op in latest.items() if op == DELETE]
+    return (rows[-1][0] if rows else since), has_more, upserts, deletes
+
+
+def compact(user_id, retention_days=RETENTION_DAYS):
+    """Drop superseded changes and expired tombstones; return rows deleted."""
+    changes = SyncChange.objects.filter(user_id=user_id)
+    later = changes.filter(kind=OuterRef("kind"), object_id=OuterRef("object_id"), id__gt=OuterRef("id"))
+    cutoff = timezone.now() - datetime.timedelta(days=retention_days)
+    with transaction.atomic():
+        _lock_user(user_id)
+        # Whatever cursor a client holds, the latest change per object is
+        # still ahead of it or already seen, so earlier ones can go.
+        deleted, _ = changes.exclude(op=RESET).filter(Exists(later)).delete()
+        expired = changes.filter(op=DELETE, created_at__lt=cutoff)
+        floor = expired.order_by("-id").values_list("id", flat=True).first()
+        if floor is not None:
+            deleted += expired.delete()[0]
+            deleted += changes.filter(op=RESET).delete()[0]
+            SyncChange.objects.create(user_id=user_id, kind="", object_id=floor, op=RESET)
+    return deleted
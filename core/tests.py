@@ -1,3 +1,994 @@
-from django.test import TestCase
+import asyncio
+import datetime
+import io
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+from decimal import Decimal
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import DEFAULT_DB_ALIAS
+from django.test import AsyncClient, Client, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from benchmarks.startup import run_sample
+from . import budgets, categories, db_routers, events, fingerprints, fleet, ledger, metrics, payees, profiling, receipts, snapshots, sync, throttling
+from .models import (
+    Budget, BudgetAlert, BudgetCounter, CategoryRule, Expense, Income, PayeeAggregate, Receipt, SyncChange, User,
+)
+
+
+class StartupTests(SimpleTestCase):
+    """Cold-start budget of a web worker (see ``benchmarks/startup.py``)."""
+
+    def test_heavy_dependencies_load_lazily(self):
+        result = run_sample()
+        self.assertEqual(result["heavy_loaded"], [], "imported while booting a worker")
+
+    def test_preloading_services_loads_them(self):
+        # Guards the check above against silently measuring nothing.
+        result = run_sample(preload=True)
+        self.assertIn("core.services.gmail", result["heavy_loaded"])
+        self.assertIn("openpyxl", result["heavy_loaded"])
+
+
+class ReplicaRouterTests(SimpleTestCase):
+    """The test settings always have a replica: a mirror of the primary unless
+    DB_REPLICA_HOSTS names real ones."""
+    databases = "__all__"
+
+    def setUp(self):
+        cache.clear()
+        db_routers._lag.clear()
+        self.router = db_routers.ReplicaRouter()
+
+    def begin(self, user_id, allow_replica=True):
+        self.addCleanup(db_routers.end, db_routers.begin(user_id, allow_replica))
+
+    def test_reads_outside_a_request_use_primary(self):
+        self.assertEqual(self.router.db_for_read(Expense), DEFAULT_DB_ALIAS)
+
+    def test_safe_reads_use_replica(self):
+        self.begin(1)
+        self.assertIn(self.router.db_for_read(Expense), settings.DATABASE_REPLICAS)
+
+    @override_settings(DATABASE_REPLICAS=["missing"])
+    def test_unreachable_replica_falls_back_to_primary(self):
+        self.begin(1)
+        self.assertEqual(self.router.db_for_read(Expense), DEFAULT_DB_ALIAS)
+        self.assertIsNone(db_routers.replica_lag("missing"))
+
+    @override_settings(DATABASE_REPLICAS=["missing"])
+    def test_write_pins_user_to_primary(self):
+        self.begin(1, allow_replica=False)
+        self.assertEqual(self.router.db_for_write(Expense), DEFAULT_DB_ALIAS)
+        self.assertTrue(db_routers.is_pinned(1))
+        self.assertFalse(db_routers.is_pinned(2))
+        self.begin(1)
+        self.assertTrue(db_routers._state.get().pinned)
+
+
+class SnapshotTests(TestCase):
+    def setUp(self):
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media, ignore_errors=True)
+        self.enterContext(override_settings(MEDIA_ROOT=media))
+        self.user = User.objects.create_user("snap", "snap@example.com", "pw")
+        self.closed = datetime.datetime(2024, 3, 10, 12, tzinfo=datetime.timezone.utc)
+        self.expense = self.add_expense("e1", "12.50", self.closed)
+        self.add_expense("e2", "7.25", timezone.now())
+        Income.objects.create(title="Salary", amount=Decimal("100"), source="Job", date=self.closed.date(), created_by=self.user)
+
+    def add_expense(self, transaction_id, amount, when):
+        return Expense.objects.create(
+            transaction_id=transaction_id, transaction_type="Bill Payment", amount=Decimal(amount),
+            total=Decimal(amount), date_time=when, created_by=self.user,
+        )
+
+    def test_closed_months_are_read_from_snapshots(self):
+        self.assertEqual(snapshots.totals(self.user.pk), {"expense": Decimal("19.75"), "income": Decimal("100")})
+        self.assertTrue(os.path.isdir(snapshots.month_dir(self.user.pk, datetime.date(2024, 3, 1))))
+        self.assertFalse(os.path.exists(snapshots.month_dir(self.user.pk, snapshots.open_month())))
+        self.assertEqual(
+            snapshots.type_totals(self.user.pk, "2024-03"),
+            [{"transaction_type": "Bill Payment", "total": Decimal("12.50")}],
+        )
+
+    def test_editing_a_closed_month_invalidates_it(self):
+        snapshots.totals(self.user.pk, "2024-03")
+        before = Expense.objects.get(pk=self.expense.pk)
+        self.expense.amount = Decimal("20")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.expense.save()
+            events.expense_updated(self.user.pk, before, self.expense)
+        self.assertFalse(os.path.exists(snapshots.month_dir(self.user.pk, datetime.date(2024, 3, 1))))
+        self.assertEqual(snapshots.totals(self.user.pk, "2024-03")["expense"], Decimal("20"))
+
+    def test_any_save_or_delete_invalidates_the_month(self):
+        march = datetime.date(2024, 3, 1)
+        snapshots.totals(self.user.pk, "2024-03")
+        income = Income.objects.get(created_by=self.user)
+        income.date = timezone.now().date()  # moved out of the closed month
+        with self.captureOnCommitCallbacks(execute=True):
+            income.save()
+        self.assertFalse(os.path.exists(snapshots.month_dir(self.user.pk, march)))
+        self.assertEqual(snapshots.totals(self.user.pk, "2024-03")["income"], Decimal("0"))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.expense.delete()
+        self.assertEqual(snapshots.totals(self.user.pk, "2024-03")["expense"], Decimal("0"))
+
+    def test_whole_ledger_reads_build_a_few_months_at_a_time(self):
+        jan = self.add_expense("e0", "5", datetime.datetime(2024, 1, 15, tzinfo=datetime.timezone.utc))
+        feb = self.add_expense("e3", "3", datetime.datetime(2024, 2, 15, tzinfo=datetime.timezone.utc))
+        built = lambda: [m for m in (1, 2, 3) if os.path.isdir(snapshots.month_dir(self.user.pk, datetime.date(2024, m, 1)))]
+        with mock.patch.object(snapshots, "BUILDS_PER_READ", 1):
+            for months in ([1], [1, 2], [1, 2, 3]):
+                self.assertEqual(snapshots.totals(self.user.pk), {"expense": Decimal("27.75"), "income": Decimal("100")})
+                self.assertEqual(built(), months)
+
+        snapshots._drop(self.user.pk, [datetime.date(2024, 1, 1)])
+        with mock.patch.object(snapshots, "BUILDS_PER_READ", 0):
+            # January is read live, yet still comes before the snapshots.
+            ids = list(snapshots.expense_series(self.user.pk)[0])
+            self.assertEqual(ids, [jan.pk, feb.pk, self.expense.pk, self.expense.pk + 1])
+            timestamps = [row[3] for row in snapshots.rows(self.user.pk)]
+            self.assertEqual((len(timestamps), timestamps), (5, sorted(timestamps)))
+            self.assertEqual(snapshots.totals(self.user.pk)["expense"], Decimal("27.75"))
+        self.assertEqual(built(), [2, 3])
+
+class FailingIMAP:
+    """Stands in for IMAP4_SSL; the search fails after a successful login."""
+    sessions = []
+
+    def __init__(self, host):
+        self.logged_out = False
+        FailingIMAP.sessions.append(self)
+
+    def login(self, user, password):
+        pass
+
+    def select(self, mailbox="INBOX"):
+        pass
+
+    def search(self, charset, criteria):
+        raise OSError("connection reset")
+
+    def logout(self):
+        self.logged_out = True
+
+
+class AsyncViewTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media, ignore_errors=True)
+        self.enterContext(override_settings(MEDIA_ROOT=media))
+        self.user = User.objects.create_user("async", "async@example.com", "pw")
+        closed = datetime.datetime(2024, 3, 10, 12, tzinfo=datetime.timezone.utc)
+        for i, (amount, when, kind) in enumerate([
+            ("12.50", closed, "Bill Payment"), ("30", closed, "Money Transfer"), ("7.25", timezone.now(), "Bill Payment"),
+        ]):
+            Expense.objects.create(
+                transaction_id=f"a{i}", transaction_type=kind, amount=Decimal(amount), total=Decimal(amount),
+                date_time=when, created_by=self.user,
+            )
+        Income.objects.create(title="Salary", amount=Decimal("100"), source="Job", date=closed.date(), created_by=self.user)
+        self.auth = {"headers": {"Authorization": f"Bearer {AccessToken.for_user(self.user)}"}}
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def async_get(self, url, **extra):
+        return async_to_sync(AsyncClient().get)(url, **extra)
+
+    def test_async_reports_match_the_sync_ones(self):
+        for name in ("profit_loss", "type_breakdown", "top_expenses"):
+            for query in ("", "?month=2024-03", "?month=bad"):
+                with self.subTest(name=name, query=query):
+                    expected = self.client.get(f"/api/reports/{name}/{query}")
+                    response = self.async_get(f"/api/async/reports/{name}/{query}", **self.auth)
+                    self.assertEqual(response.status_code, expected.status_code)
+                    self.assertEqual(response.json(), json.loads(expected.content))
+        self.assertEqual(self.async_get("/api/async/reports/profit_loss/").status_code, 401)
+
+    def test_async_import_is_throttled(self):
+        with mock.patch.dict(throttling.COSTS, {"fetch_from_gmail": throttling.BUCKET_CAPACITY + 1}):
+            response = async_to_sync(AsyncClient().post)("/api/async/expenses/fetch_from_gmail/", **self.auth)
+        self.assertEqual(response.status_code, 429)
+        self.assertIn("Retry-After", response)
+
+    @override_settings(GMAIL_IMAP_CLASS="core.tests.FailingIMAP")
+    def test_failed_fetch_logs_out(self):
+        from .services import gmail
+
+        FailingIMAP.sessions = []
+        with self.assertRaises(OSError):
+            gmail.fetch_messages("me@example.com", "pw", gmail.build_search_query())
+        self.assertEqual([session.logged_out for session in FailingIMAP.sessions], [True])
+
+
+class AsyncSingleFlightTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+
+    async def test_concurrent_callers_share_one_run(self):
+        runs = []
+
+        async def work():
+            runs.append(1)
+            await asyncio.sleep(0.05)
+            return None
+
+        results = await asyncio.gather(*[throttling.asingle_flight("sf:async", work, poll_interval=0.01) for _ in range(3)])
+        self.assertEqual((results, len(runs)), ([None, None, None], 1))
+
+
+class ThrottleTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_token_bucket_refills(self):
+        with mock.patch("core.throttling.time.time", return_value=1000.0) as now:
+            self.assertEqual([throttling.take_tokens("t", 2, capacity=5, rate=1)[0] for _ in range(3)], [True, True, False])
+            self.assertEqual(throttling.take_tokens("t", 2, capacity=5, rate=1), (False, 1))
+            now.return_value = 1001.0
+            self.assertEqual(throttling.take_tokens("t", 2, capacity=5, rate=1), (True, 0))
+
+    def test_contention_fails_closed(self):
+        cache.add("t:lock", 1)
+        with mock.patch("core.throttling.time.sleep"):
+            self.assertEqual(throttling.take_tokens("t", 1), (False, throttling.LOCK_RETRY_SECONDS))
+
+    def test_only_expensive_actions_are_charged(self):
+        user = User.objects.create_user("throttled", "throttled@example.com", "pw")
+        client = APIClient()
+        client.force_authenticate(user)
+        huge = throttling.BUCKET_CAPACITY + 1
+        with mock.patch.dict(throttling.COSTS, {"default": huge, "export_excel": huge}):
+            response = client.get("/api/reports/export_excel/")
+            self.assertEqual(response.status_code, 429)
+            self.assertIn("Retry-After", response)
+            for _ in range(3):
+                self.assertEqual(client.get("/api/expenses/").status_code, 200)
+            login = {"username": "throttled", "password": "wrong"}
+            self.assertEqual(APIClient().post("/api/auth/login/", login).status_code, 401)
+
+    def test_single_flight_shares_a_none_result(self):
+        started, release = threading.Event(), threading.Event()
+        followers = []
+
+        def leader():
+            started.set()
+            release.wait(5)
+            return None
+
+        thread = threading.Thread(target=throttling.single_flight, args=("sf:none", leader))
+        thread.start()
+        started.wait(5)
+        follower = threading.Thread(target=lambda: followers.append(
+            throttling.single_flight("sf:none", lambda: followers.append("ran"), poll_interval=0.01)
+        ))
+        follower.start()
+        time.sleep(0.1)  # let it attach to the leader
+        release.set()
+        thread.join(5)
+        follower.join(5)
+        self.assertEqual(followers, [None])
+
+
+class SyncTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("sync", "sync@example.com", "pw")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def add_expense(self, transaction_id):
+        return Expense.objects.create(
+            transaction_id=transaction_id, transaction_type="Bill Payment", amount=Decimal("10"),
+            total=Decimal("10"), date_time=timezone.now(), created_by=self.user,
+        )
+
+    def test_changes_since_cursor(self):
+        first = self.add_expense("s1")
+        cursor = self.client.get("/api/changes/").json()["cursor"]
+        second = self.add_expense("s2")
+        first.amount = Decimal("12")
+        first.save()
+        second_id = second.pk
+        second.delete()
+        body = self.client.get(f"/api/changes/?since={cursor}").json()
+        self.assertEqual([e["id"] for e in body["expenses"]], [first.pk])
+        self.assertEqual(body["deleted"], [{"kind": "expense", "id": second_id}])
+        self.assertEqual(body["cursor"], sync.current_cursor(self.user.pk))
+        self.assertEqual(self.client.get(f"/api/changes/?since={body['cursor']}").json()["expenses"], [])
+
+    def test_list_etag(self):
+        self.add_expense("s1")
+        etag = self.client.get("/api/expenses/")["ETag"]
+        self.assertEqual(self.client.get("/api/expenses/", HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.add_expense("s2")
+        response = self.client.get("/api/expenses/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_compaction(self):
+        kept = self.add_expense("s1")
+        kept.save()
+        gone = self.add_expense("s2")
+        gone.delete()
+        stale = sync.current_cursor(self.user.pk) - 1
+        SyncChange.objects.filter(op=sync.DELETE).update(created_at=timezone.now() - datetime.timedelta(days=365))
+        self.assertEqual(sync.compact(self.user.pk), 3)  # kept's first upsert, gone's upsert and tombstone
+        body = self.client.get("/api/changes/").json()
+        self.assertEqual(([e["id"] for e in body["expenses"]], body["deleted"]), ([kept.pk], []))
+        self.assertEqual(self.client.get(f"/api/changes/?since={stale}").status_code, 410)
+        self.assertEqual(self.client.get(f"/api/changes/?since={body['cursor']}").status_code, 200)
+
+
+class ReceiptTests(TestCase):
+    def setUp(self):
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media, ignore_errors=True)
+        self.enterContext(override_settings(MEDIA_ROOT=media))
+        self.user = User.objects.create_user("rcpt", "rcpt@example.com", "pw")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.expense = Expense.objects.create(
+            transaction_id="R1", transaction_type="Bill Payment", amount=Decimal("10"),
+            total=Decimal("10"), date_time=timezone.now(), created_by=self.user,
+        )
+
+    def upload(self, content, content_type="application/pdf"):
+        return self.client.post(
+            f"/api/expenses/{self.expense.pk}/receipt/",
+            {"file": SimpleUploadedFile("r", content, content_type=content_type)},
+        )
+
+    def png(self):
+        from PIL import Image
+
+        buffer = io.BytesIO()
+        Image.new("RGB", (40, 30), "red").save(buffer, "PNG")
+        return buffer.getvalue()
+
+    def test_bad_images_are_rejected_and_missing_files_are_404(self):
+        self.assertEqual(self.upload(b"not a png", "image/png").status_code, 400)
+        self.assertFalse(Receipt.objects.exists())
+        self.assertEqual(os.listdir(os.path.join(settings.MEDIA_ROOT, "receipts", "incoming")), [])
+
+        self.assertEqual(self.upload(self.png(), "image/png").status_code, 201)
+        url = f"/api/expenses/{self.expense.pk}/receipt/"
+        self.assertEqual(self.client.get(url + "thumbnail/?size=128").status_code, 200)
+        receipt = Receipt.objects.get()
+        with open(receipts.original_path(receipt.sha256), "wb") as fh:
+            fh.write(b"\x89PNG\r\n\x1a\n truncated")  # corrupted on disk
+        self.assertEqual(self.client.get(url + "thumbnail/?size=256").status_code, 400)
+        self.assertEqual(os.listdir(os.path.dirname(receipts.thumbnail_path(receipt.sha256, 256))),
+                         [os.path.basename(receipts.thumbnail_path(receipt.sha256, 128))])
+        os.unlink(receipts.original_path(receipt.sha256))
+        self.assertEqual(self.client.get(url).status_code, 404)
+        self.assertEqual(self.client.get(url + "thumbnail/?size=512").status_code, 404)
+
+    def test_replacing_a_receipt_bumps_updated_at_and_cleans_up(self):
+        before = Expense.objects.get(pk=self.expense.pk).updated_at
+        self.assertEqual(self.upload(b"first").status_code, 201)
+        first = Receipt.objects.get()
+        self.assertGreater(Expense.objects.get(pk=self.expense.pk).updated_at, before)
+        self.upload(b"second")
+        self.assertEqual(receipts.delete_unreferenced(), 0)  # still within the grace period
+        self.assertEqual(receipts.delete_unreferenced(grace=datetime.timedelta(0)), 1)
+        self.assertFalse(Receipt.objects.filter(pk=first.pk).exists())
+        self.assertFalse(os.path.exists(receipts.original_path(first.sha256)))
+        second = Expense.objects.get(pk=self.expense.pk).receipt
+        self.assertTrue(os.path.exists(receipts.original_path(second.sha256)))
+
+
+class LedgerTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("ledger", "ledger@example.com", "pw")
+        utc = datetime.timezone.utc
+        Income.objects.create(title="Salary", amount=Decimal("100"), source="Job", date=datetime.date(2024, 3, 1), created_by=self.user)
+        for tid, amount, when in [
+            ("L1", "30", datetime.datetime(2024, 3, 10, 9, tzinfo=utc)),
+            ("L2", "20", datetime.datetime(2024, 4, 5, 18, tzinfo=utc)),
+        ]:
+            Expense.objects.create(
+                transaction_id=tid, transaction_type="Bill Payment", receiver_name="Shop", amount=Decimal(amount),
+                total=Decimal(amount), date_time=when, created_by=self.user,
+            )
+        Income.objects.create(title="Bonus", amount=Decimal("50"), source="Job", date=datetime.date(2024, 4, 20), created_by=self.user)
+        other = User.objects.create_user("other", "other@example.com", "pw")
+        Income.objects.create(title="Theirs", amount=Decimal("999"), source="Job", date=datetime.date(2024, 3, 2), created_by=other)
+
+    def balances(self, start=None, end=None):
+        return [(row.kind, row.signed_amount, row.running_balance) for row in ledger.feed(self.user, start, end)]
+
+    def test_running_balance(self):
+        self.assertEqual(self.balances(), [
+            ("income", 100, 100), ("expense", -30, 70), ("expense", -20, 50), ("income", 50, 100),
+        ])
+
+    def test_a_window_starts_from_the_opening_balance(self):
+        start, end = datetime.datetime(2024, 4, 1, tzinfo=datetime.timezone.utc), datetime.datetime(2024, 5, 1, tzinfo=datetime.timezone.utc)
+        self.assertEqual(ledger.opening_balance(self.user, start), 70)
+        self.assertEqual(self.balances(start, end), [("expense", -20, 50), ("income", 50, 100)])
+        client = APIClient()
+        client.force_authenticate(self.user)
+        body = client.get("/api/reports/ledger/?month=2024-04&page_size=1").json()
+        self.assertEqual((body["count"], body["results"][0]["running_balance"]), (2, "50.00"))
+        self.assertEqual(client.get("/api/reports/ledger/?month=2024-4x").status_code, 400)
+
+
+class ExpenseFilterTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("filters", "filters@example.com", "pw")
+        utc = datetime.timezone.utc
+        for tid, kind, receiver, amount, fee, day in [
+            ("F1", "Bill Payment", "Power Co", "300", "0", 1),
+            ("F2", "Bill Payment", "Water Co", "1500", "10", 2),
+            ("F3", "Money Transfer", "Ali", "2500", "25", 3),
+            ("F4", "Money Transfer", "Ali", "60000", "0", 4),
+            ("F5", "Mobile Top-up", "Telco", "100", "0", 5),
+        ]:
+            Expense.objects.create(
+                transaction_id=tid, transaction_type=kind, receiver_name=receiver, amount=Decimal(amount),
+                fee=Decimal(fee), total=Decimal(amount) + Decimal(fee),
+                date_time=datetime.datetime(2024, 5, day, 12, tzinfo=utc), created_by=self.user,
+            )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def ids(self, query):
+        response = self.client.get(f"/api/expenses/?{query}")
+        self.assertEqual(response.status_code, 200)
+        return sorted(row["transaction_id"] for row in response.json())
+
+    def test_filters(self):
+        self.assertEqual(self.ids("from_date=2024-05-02&to_date=2024-05-03"), ["F2", "F3"])
+        self.assertEqual(self.ids("min_amount=500&max_amount=2500"), ["F2", "F3"])
+        self.assertEqual(self.ids("has_fee=true"), ["F2", "F3"])
+        self.assertEqual(self.ids("has_fee=no"), ["F1", "F4", "F5"])
+        self.assertEqual(self.ids("transaction_type=Bill Payment, Mobile Top-up"), ["F1", "F2", "F5"])
+        self.assertEqual(self.ids("receiver=Ali&has_fee=0"), ["F4"])
+        self.assertEqual(self.ids("category=none"), ["F1", "F2", "F3", "F4", "F5"])
+
+    def test_invalid_params_are_rejected(self):
+        for query, param in [
+            ("from_date=05/01/2024", "from_date"), ("min_amount=lots", "min_amount"),
+        ]:
+            response = self.client.get(f"/api/expenses/?{query}")
+            self.assertEqual(response.status_code, 400)
+            self.assertIn(param, response.json())
+        for query, message in [
+            ("days=abc", "Expected an integer."), ("days=-1", "Must be at least 0."),
+            ("days=99999", "Must be at most 36500."),
+        ]:
+            self.assertEqual(self.client.get(f"/api/reports/new_payees/?{query}").json(), {"days": message})
+        for query, message in [
+            ("threshold=x", "Expected a number."), ("threshold=nan", "Expected a finite number."),
+            ("threshold=-2", "Must be at least 0."),
+        ]:
+            self.assertEqual(self.client.get(f"/api/reports/anomalies/?{query}").json(), {"threshold": message})
+
+    def test_facets_exclude_their_own_filter(self):
+        facets = self.client.get("/api/expenses/facets/?transaction_type=Bill Payment&has_fee=false").json()
+        self.assertEqual(facets["total"], 1)
+        # Other types stay selectable; each count still honours has_fee.
+        self.assertEqual(facets["transaction_type"], [
+            {"value": "Bill Payment", "count": 1}, {"value": "Mobile Top-up", "count": 1},
+            {"value": "Money Transfer", "count": 1},
+        ])
+        # has_fee ignores its own filter but keeps the type filter.
+        self.assertEqual(facets["has_fee"], {"true": 1, "false": 1})
+        self.assertEqual([bucket["count"] for bucket in facets["amount"]], [1, 0, 0, 0, 0])
+
+        facets = self.client.get("/api/expenses/facets/?min_amount=2000").json()
+        self.assertEqual(facets["total"], 2)
+        self.assertEqual([bucket["count"] for bucket in facets["amount"]], [2, 1, 1, 0, 1])
+        self.assertEqual(facets["has_fee"], {"true": 1, "false": 1})
+
+
+class SearchTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("search", "search@example.com", "pw")
+        utc = datetime.timezone.utc
+        for tid, receiver, sender, day in [
+            ("123456", "K-Electric", "", 1),
+            ("223456", "Karachi Water", "", 2),
+            ("323456", "Daraz", "Kashif", 3),
+            ("423456", "Careem", "", 4),
+            ("KE77", "Makan Store", "", 5),
+        ]:
+            Expense.objects.create(
+                transaction_id=tid, transaction_type="Bill Payment", receiver_name=receiver, sender_name=sender,
+                amount=Decimal("10"), total=Decimal("10"),
+                date_time=datetime.datetime(2024, 6, day, tzinfo=utc), created_by=self.user,
+            )
+        other = User.objects.create_user("searcher", "searcher@example.com", "pw")
+        Expense.objects.create(
+            transaction_id="999999", transaction_type="Bill Payment", receiver_name="Karachi Gas",
+            amount=Decimal("10"), total=Decimal("10"), date_time=timezone.now(), created_by=other,
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def search(self, query):
+        response = self.client.get("/api/expenses/search/", {"q": query, "page_size": 2})
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_icontains_fallback_ranks_prefix_matches_first(self):
+        body = self.search("ka")
+        # Prefix matches (newest first) beat the substring match in "Makan Store".
+        self.assertEqual(body["count"], 3)
+        self.assertEqual([row["transaction_id"] for row in body["results"]], ["323456", "223456"])
+        self.assertEqual([row["rank"] for row in body["results"]], [0.5, 0.5])
+        page = self.client.get(body["next"]).json()
+        self.assertEqual([(row["transaction_id"], row["rank"]) for row in page["results"]], [("KE77", 0.1)])
+
+    def test_exact_transaction_id_ranks_first(self):
+        rows = self.search("123456")["results"]
+        self.assertEqual([(row["transaction_id"], row["rank"]) for row in rows], [("123456", 1.5)])
+        self.assertEqual(self.search("k-ELEC")["results"][0]["receiver_name"], "K-Electric")
+
+    def test_query_is_required(self):
+        self.assertEqual(self.client.get("/api/expenses/search/?q=%20").status_code, 400)
+
+
+class AnalyticsTests(TestCase):
+    def setUp(self):
+        from . import analytics
+
+        self.analytics = analytics
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media, ignore_errors=True)
+        self.enterContext(override_settings(MEDIA_ROOT=media))
+        cache.clear()
+        self.user = User.objects.create_user("numbers", "numbers@example.com", "pw")
+        # Daily totals: 30 on Sat 1 June, nothing on the 2nd, 60 on Mon 3 June.
+        for tid, amount, day in [("A1", "10", 1), ("A2", "20", 1), ("A3", "60", 3)]:
+            self.spend(tid, amount, datetime.datetime(2024, 6, day, 12, tzinfo=datetime.timezone.utc))
+
+    def spend(self, tid, amount, when):
+        return Expense.objects.create(
+            transaction_id=tid, transaction_type="Bill Payment", receiver_name="Shop",
+            amount=Decimal(amount), total=Decimal(amount), date_time=when, created_by=self.user,
+        )
+
+    def test_timeseries(self):
+        self.assertEqual(self.analytics.timeseries(self.user.pk, window=2), [
+            {"date": "2024-06-01", "total": 30.0, "rolling_mean": 30.0, "rolling_std": 0.0},
+            {"date": "2024-06-02", "total": 0.0, "rolling_mean": 15.0, "rolling_std": 15.0},
+            {"date": "2024-06-03", "total": 60.0, "rolling_mean": 30.0, "rolling_std": 30.0},
+        ])
+
+    def test_forecast(self):
+        forecast = self.analytics.forecast_month_end(self.user.pk, today=datetime.date(2024, 6, 3))
+        # 27 days left: four Saturdays at 30 and three Mondays at 60. The
+        # spread is the 3-day std (sqrt(600)) scaled by sqrt(27) = 127.28.
+        self.assertEqual(forecast, {
+            "month": "2024-06",
+            "spent_to_date": 90.0,
+            "projected_remaining": 300.0,
+            "projected_total": 390.0,
+            "projected_low": 262.72,
+            "projected_high": 517.28,
+            "days_remaining": 27,
+            "baseline_by_weekday": [60.0, 0.0, 0.0, 0.0, 0.0, 30.0, 0.0],
+        })
+
+    def test_memo_is_invalidated_by_a_ledger_write(self):
+        with mock.patch.object(self.analytics, "load_series", wraps=self.analytics.load_series) as load:
+            self.analytics.timeseries(self.user.pk, window=2)
+            self.analytics.timeseries(self.user.pk, window=2)
+            self.assertEqual(load.call_count, 1)
+            with self.captureOnCommitCallbacks(execute=True):
+                self.spend("A4", "5", datetime.datetime(2024, 6, 2, 12, tzinfo=datetime.timezone.utc))
+            series = self.analytics.timeseries(self.user.pk, window=2)
+            self.assertEqual(load.call_count, 2)
+        self.assertEqual(series[1]["total"], 5.0)
+
+
+class ProfilingTests(TestCase):
+    def setUp(self):
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root, ignore_errors=True)
+        self.enterContext(override_settings(PROFILING_DIR=root))
+        self.admin = User.objects.create_user("prof", "prof@example.com", "pw", is_staff=True)
+
+    def test_token(self):
+        token = profiling.issue_token(self.admin)
+        self.assertTrue(profiling.check_token(token))
+        self.assertFalse(profiling.check_token(token[:-1] + ("A" if token[-1] != "A" else "B")))
+        self.assertFalse(profiling.check_token(profiling.issue_token(User.objects.create_user("plain", "plain@example.com", "pw"))))
+        with mock.patch("django.core.signing.time.time", return_value=time.time() + profiling.TOKEN_MAX_AGE + 5):
+            self.assertFalse(profiling.check_token(token))
+        User.objects.filter(pk=self.admin.pk).update(is_staff=False)
+        self.assertFalse(profiling.check_token(token))
+
+    def test_profile_ids_are_validated(self):
+        profile_id = profiling.save(None, {"view": "test"})
+        self.assertIsNone(profiling.profile_path(profile_id))  # metadata only
+        self.assertIsNone(profiling.profile_path(f"../{profile_id}"))
+        self.assertIsNone(profiling.profile_path("20240101000000-deadbeef"))
+        self.assertEqual([p["id"] for p in profiling.list_profiles()], [profile_id])
+
+    def test_store_evicts_the_oldest_profiles(self):
+        with mock.patch.object(profiling, "MAX_FILES", 2):
+            first = profiling.save(None, {})
+            old = time.time() - 60
+            os.utime(os.path.join(settings.PROFILING_DIR, f"{first}.json"), (old, old))
+            second = profiling.save(None, {})
+            third = profiling.save(None, {})
+        self.assertEqual({p["id"] for p in profiling.list_profiles()}, {second, third})
+
+    @override_settings(PROFILING_ENABLED=True, PROFILING_SAMPLE_RATE=0)
+    def test_middleware_profiles_requests_with_a_valid_token(self):
+        client = APIClient()
+        client.force_authenticate(self.admin)
+        token = profiling.issue_token(self.admin)
+        self.assertNotIn("X-Profile-Id", client.get("/api/expenses/"))
+        response = client.get("/api/expenses/", HTTP_X_PROFILE_TOKEN=token)
+        profile_id = response["X-Profile-Id"]
+        self.assertIsNotNone(profiling.profile_path(profile_id))
+        meta = client.get("/api/admin/profiles/").json()["results"][0]
+        self.assertEqual((meta["id"], meta["trigger"], meta["user"]), (profile_id, "token", self.admin.pk))
+        self.assertIn("cumulative", client.get(f"/api/admin/profiles/{profile_id}/summary/").content.decode())
+
+        User.objects.filter(pk=self.admin.pk).update(is_staff=False)
+        self.assertNotIn("X-Profile-Id", client.get(f"/api/expenses/?_profile={token}"))
+
+
+class FingerprintTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("fp", "fp@example.com", "pw")
+        self.when = datetime.datetime(2025, 5, 1, 9, 0, tzinfo=datetime.timezone.utc)
+
+    def expense(self, transaction_id, minutes=0, payee="Ali Khan", origin="statement"):
+        return Expense(
+            transaction_id=transaction_id, transaction_type="Money Transfer", receiver_name=payee,
+            amount=Decimal("100"), total=Decimal("100"), created_by=self.user, origin=origin,
+            date_time=self.when + datetime.timedelta(minutes=minutes),
+        )
+
+    def save(self, expense):
+        fingerprints.split_duplicates(self.user.pk, [expense])
+        expense.save()
+        return expense
+
+    def test_statement_without_id_matches_manual_entry(self):
+        self.save(self.expense("TXN1"))
+        new, duplicates = fingerprints.split_duplicates(self.user.pk, [self.expense(None, minutes=10, payee="ALI  KHAN")])
+        self.assertEqual((len(new), len(duplicates)), (0, 1))
+
+    def test_distinct_bank_ids_are_separate_payments(self):
+        self.save(self.expense("TXN1"))
+        new, duplicates = fingerprints.split_duplicates(self.user.pk, [self.expense("TXN2", minutes=5)])
+        self.assertEqual((len(new), len(duplicates)), (1, 0))
+
+    def test_same_batch(self):
+        batch = [self.expense(None), self.expense(None, minutes=1), self.expense("TXN1"), self.expense("TXN2")]
+        new, duplicates = fingerprints.split_duplicates(self.user.pk, batch)
+        # The id-less repeat and both id-bearing rows match the first id-less one.
+        self.assertEqual(new, batch[:1])
+        batch = [self.expense("TXN1"), self.expense("TXN2"), self.expense("TXN2", minutes=1)]
+        new, duplicates = fingerprints.split_duplicates(self.user.pk, batch)
+        self.assertEqual((new, duplicates), (batch[:2], batch[2:]))
+
+    def test_api_conflict_and_override(self):
+        self.save(self.expense("fp-generated"))
+        client = APIClient()
+        client.force_authenticate(self.user)
+        payload = {
+            "transaction_id": "MANUAL1", "transaction_type": "Money Transfer", "receiver_name": "Ali Khan",
+            "amount": "100", "total": "100", "date_time": self.when.isoformat(),
+        }
+        self.assertEqual(client.post("/api/expenses/", payload, format="json").status_code, 409)
+        self.assertEqual(client.post("/api/expenses/?allow_duplicate=true", payload, format="json").status_code, 201)
+
+    def test_manual_entry_matches_gmail_import_of_the_same_payment(self):
+        from .services import gmail
+
+        client = APIClient()
+        client.force_authenticate(self.user)
+        manual = client.post("/api/expenses/", {
+            "transaction_id": "my-ref-1", "transaction_type": "Money Transfer", "receiver_name": "Ali Khan",
+            "amount": "100", "total": "100", "date_time": "2025-05-05T10:05:00+05:00",
+        }, format="json").json()
+        self.assertEqual(manual["origin"], "manual")
+        # The statement carries the bank's id, which differs from the typed one.
+        body, status_code = gmail.store_messages(self.user, [(b"1", statement("9001", "100"))])
+        self.assertEqual(status_code, 200, body)
+        self.assertEqual(Expense.objects.filter(created_by=self.user).count(), 1)
+        body, status_code = gmail.store_messages(self.user, [(b"2", statement("9002", "250"))])
+        self.assertEqual(status_code, 201, body)
+        new = Expense.objects.get(transaction_id="9002")
+        self.assertEqual(new.origin, "statement")
+
+
+class PayeeAggregateTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("payer", "payer@example.com", "pw")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        start = timezone.now() - datetime.timedelta(days=90)
+        for month in range(4):
+            self.last = self.client.post("/api/expenses/", {
+                "transaction_id": f"RENT{month}", "transaction_type": "Bill Payment", "receiver_name": "Landlord",
+                "amount": "50000", "total": "50000",
+                "date_time": (start + datetime.timedelta(days=30 * month)).isoformat(),
+            }, format="json").data
+
+    def test_monthly_payments_are_recurring(self):
+        [rent] = payees.recurring_payments(self.user.pk)
+        self.assertEqual((rent["cadence"], rent["count"]), ("monthly", 4))
+
+    def test_edits_keep_interval_statistics(self):
+        before = PayeeAggregate.objects.get(user=self.user)
+        for _ in range(5):
+            self.client.patch(f"/api/expenses/{self.last['id']}/", {"category": "Rent"}, format="json")
+        self.client.patch(f"/api/expenses/{self.last['id']}/", {"amount": "55000"}, format="json")
+        after = PayeeAggregate.objects.get(user=self.user)
+        self.assertEqual(
+            (after.count, after.interval_count, after.mean_interval),
+            (before.count, before.interval_count, before.mean_interval),
+        )
+        self.assertEqual(after.total, before.total + 5000)
+        self.assertEqual(len(payees.recurring_payments(self.user.pk)), 1)
+
+    def test_recording_onto_a_row_created_concurrently(self):
+        # The aggregate row appears between our check and insert (another transaction won).
+        expense = Expense(receiver_name="New Shop", amount=Decimal("10"), date_time=timezone.now())
+        PayeeAggregate.objects.create(
+            user=self.user, normalized_name="new shop", display_name="New Shop", count=1, total=Decimal("5"),
+            first_seen=expense.date_time - datetime.timedelta(days=1), last_seen=expense.date_time - datetime.timedelta(days=1),
+        )
+        payees.record_expenses(self.user.pk, [expense])
+        agg = PayeeAggregate.objects.get(user=self.user, normalized_name="new shop")
+        self.assertEqual((agg.count, agg.total, agg.interval_count), (2, Decimal("15"), 1))
+
+    def test_report_parameters_are_validated(self):
+        self.assertEqual(len(self.client.get("/api/reports/top_payees/?limit=1").json()), 1)
+        for url in ("/api/reports/top_payees/?limit=ten", "/api/reports/new_payees/?days=99999999999"):
+            self.assertEqual(self.client.get(url).status_code, 400, url)
+
+
+def statement(transaction_id, amount, when="05-May-2025 10:00:00", payee="Ali Khan"):
+    """A minimal Easypaisa statement email as fetched over IMAP."""
+    lines = [
+        f"Transaction ID {transaction_id}" if transaction_id else "",
+        "Transaction Type Money Transfer",
+        f"Date & Time {when}",
+        f"Account Title {payee}",
+        f"Transfer amount Rs. {amount}",
+        f"Total Rs. {amount}",
+    ]
+    return b"Subject: Statement\nContent-Type: text/plain\n\n" + "\n".join(lines).encode()
+
+
+class BudgetTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("budget", "budget@example.com", "pw")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.month = budgets.month_of(timezone.now())
+        self.budget = Budget.objects.create(user=self.user, transaction_type="", limit=Decimal("1000"))
+
+    def spend(self, transaction_id, amount):
+        return self.client.post("/api/expenses/", {
+            "transaction_id": transaction_id, "transaction_type": "Bill Payment", "receiver_name": transaction_id,
+            "amount": amount, "total": amount, "date_time": timezone.now().isoformat(),
+        }, format="json").data
+
+    def spent(self, transaction_type=""):
+        return BudgetCounter.objects.get(user=self.user, month=self.month, transaction_type=transaction_type).spent
+
+    def test_counters_follow_creates_edits_and_deletes(self):
+        first = self.spend("b1", "300")
+        self.spend("b2", "200")
+        self.assertEqual((self.spent(), self.spent("Bill Payment")), (Decimal("500"), Decimal("500")))
+        self.client.patch(f"/api/expenses/{first['id']}/", {"amount": "100"}, format="json")
+        self.assertEqual(self.spent(), Decimal("300"))
+        self.client.delete(f"/api/expenses/{first['id']}/")
+        self.assertEqual(self.spent(), Decimal("200"))
+
+    def test_each_threshold_alerts_once(self):
+        self.spend("b1", "700")
+        self.assertFalse(BudgetAlert.objects.exists())
+        self.spend("b2", "150")
+        self.spend("b3", "10")
+        self.spend("b4", "500")
+        self.assertEqual(sorted(BudgetAlert.objects.values_list("threshold", flat=True)), [80, 100])
+
+    def test_new_budget_already_exceeded_alerts(self):
+        self.spend("b1", "90")
+        self.client.post("/api/budgets/", {"transaction_type": "Bill Payment", "limit": "100"}, format="json")
+        self.assertEqual(list(BudgetAlert.objects.values_list("threshold", flat=True)), [80])
+
+    def test_gmail_import_updates_counters_in_the_same_transaction(self):
+        from .services import gmail
+
+        messages = [(b"1", statement("111", "400")), (b"2", statement("222", "100", payee="Sara"))]
+        with mock.patch.object(events.budgets, "apply", side_effect=RuntimeError("boom")):
+            with self.assertRaises(RuntimeError):
+                gmail.store_messages(self.user, messages)
+        self.assertFalse(Expense.objects.filter(created_by=self.user).exists())
+
+        gmail.store_messages(self.user, messages)
+        self.assertEqual(budgets.status(self.user.pk, budgets.month_of(datetime.date(2025, 5, 1)))[0]["spent"], Decimal("500"))
+
+
+class CategoryRuleTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("rules", "rules@example.com", "pw")
+
+    def rule(self, keyword, category, priority=0, field="any"):
+        CategoryRule.objects.create(user=self.user, keyword=keyword, category=category, priority=priority, field=field)
+
+    def test_best_ranked_keyword_wins_even_when_overlapped(self):
+        self.rule("AB", "Low")
+        self.rule("BC", "High", priority=5)
+        self.assertEqual(categories.match(self.user.pk, "xABCx", None), "High")
+        self.rule("electric", "Utilities")
+        self.rule("k-electric", "Power", priority=1)
+        self.assertEqual(categories.match(self.user.pk, "K-ELECTRIC Ltd", None), "Power")
+
+    def test_field_specific_rules(self):
+        self.rule("transfer", "Transfers", field="transaction_type")
+        self.assertIsNone(categories.match(self.user.pk, "Transfer Shop", "Bill Payment"))
+        self.assertEqual(categories.match(self.user.pk, "Ali", "Money Transfer"), "Transfers")
+
+    def test_rule_changes_recompile_and_reclassify(self):
+        expense = Expense.objects.create(
+            transaction_id="c1", transaction_type="Bill Payment", receiver_name="SSGC", amount=Decimal("10"),
+            total=Decimal("10"), date_time=timezone.now(), created_by=self.user,
+        )
+        self.assertEqual(categories.reclassify(self.user.pk), 0)
+        self.rule("ssgc", "Gas")
+        self.assertEqual(categories.reclassify(self.user.pk), 1)
+        self.assertEqual(Expense.objects.get(pk=expense.pk).category, "Gas")
+        self.assertEqual(categories.reclassify(self.user.pk), 0)
+
+    def test_matcher_cache_is_bounded(self):
+        with mock.patch.object(categories, "MATCHER_CACHE_SIZE", 2):
+            for user_id in (self.user.pk, 10**6, 10**6 + 1):
+                categories.get_matcher(user_id)
+        self.assertEqual(list(categories._matchers)[-2:], [10**6, 10**6 + 1])
+        self.assertLessEqual(len(categories._matchers), 2)
+
+
+class MetricsTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+
+    def publish(self, index, proc, counters=(), gauges=()):
+        snap = {"counters": dict(counters), "gauges": dict(gauges), "histograms": {}}
+        cache.set(metrics._slot_key(index), {"proc": proc, "snapshot": snap}, timeout=metrics.SNAPSHOT_TTL)
+
+    def test_live_workers_are_merged_and_dead_ones_drop_out(self):
+        key = metrics._key("test_events_total", {})
+        metrics.inc("test_events_total", 2)
+        self.publish(metrics.MAX_PROCESSES - 1, "other:1", counters={key: 3})
+        self.assertEqual(metrics.collect()["counters"][key], 5)
+        cache.delete(metrics._slot_key(metrics.MAX_PROCESSES - 1))  # its TTL ran out
+        self.assertEqual(metrics.collect()["counters"][key], 2)
+
+    def test_a_stopped_worker_drops_out_after_its_ttl(self):
+        metrics.inc("test_workers_total", 1, worker="any")
+        line = 'test_workers_total{worker="any"}'
+        # Publish this process's samples a second time as worker "other:3".
+        with mock.patch.object(metrics, "_slot", None), \
+                mock.patch.object(metrics, "_process_id", return_value="other:3"), \
+                mock.patch.object(metrics.os, "getpid", return_value=-3):
+            metrics.flush()
+        self.assertIn(f"{line} 2\n", Client().get("/metrics").content.decode())
+
+        later = time.time() + metrics.SNAPSHOT_TTL + 1
+        with mock.patch("time.time", return_value=later):
+            # The live worker republishes on collect; "other:3" never does.
+            self.assertIn(f"{line} 1\n", Client().get("/metrics").content.decode())
+
+    def test_a_reclaimed_slot_is_not_overwritten(self):
+        metrics.flush()
+        pid, index = metrics._slot
+        self.publish(index, "other:2")
+        metrics.flush()
+        self.assertNotEqual(metrics._slot[1], index)
+        self.assertEqual(cache.get(metrics._slot_key(index))["proc"], "other:2")
+
+    def test_shared_gauges_merge_with_max(self):
+        lag = metrics._key("db_replica_lag_seconds", {"alias": "replica1"})
+        size = metrics._key("db_pool_size", {"alias": "default"})
+        metrics.set_gauge("db_replica_lag_seconds", 2.0, merge="max", alias="replica1")
+        metrics.set_gauge("db_pool_size", 4, alias="default")
+        self.publish(metrics.MAX_PROCESSES - 1, "other:1", gauges={lag: 1.5, size: 3})
+        gauges = metrics.collect()["gauges"]
+        self.assertEqual((gauges[lag], gauges[size]), (2.0, 7))
+
+
+try:
+    from .backends.postgresql import base as pg_base
+except ImportError:  # no psycopg driver installed
+    pg_base = None
+
+
+@unittest.skipIf(pg_base is None, "needs a PostgreSQL driver")
+class ConnectionCounterTests(SimpleTestCase):
+    def wrapper(self, **settings_dict):
+        wrapper = pg_base.DatabaseWrapper(dict({"OPTIONS": {}, "CONN_MAX_AGE": 0}, **settings_dict), alias="counted")
+        wrapper.connection = mock.MagicMock()
+        return wrapper
+
+    def counter(self, name, **labels):
+        return metrics.snapshot()["counters"].get(metrics._key(name, labels), 0)
+
+    def test_pool_returns_are_counted(self):
+        wrapper = self.wrapper(OPTIONS={"pool": True})
+        before = self.counter("db_pool_returns_total", alias="counted")
+        with mock.patch.object(pg_base.DatabaseWrapper, "pool", new_callable=mock.PropertyMock, return_value=mock.Mock()):
+            wrapper._close()
+        self.assertEqual(self.counter("db_pool_returns_total", alias="counted"), before + 1)
+        self.assertIsNone(wrapper.connection)
+
+    def test_closes_are_counted_without_a_pool(self):
+        wrapper = self.wrapper(CONN_MAX_AGE=600)
+        before = self.counter("db_connections_closed_total", alias="counted", mode="persistent")
+        with mock.patch.object(pg_base.DatabaseWrapper, "pool", new_callable=mock.PropertyMock, return_value=None):
+            wrapper._close()
+        self.assertEqual(self.counter("db_connections_closed_total", alias="counted", mode="persistent"), before + 1)
+        self.assertEqual(self.counter("db_pool_returns_total", alias="counted"), 0)
+
+
+class FleetTests(TransactionTestCase):
+    # The report runs its chunks in worker threads, so the rows must be committed.
+    def setUp(self):
+        cache.clear()
+        self.when = datetime.datetime(2025, 5, 10, 12, tzinfo=datetime.timezone.utc)
+        self.users = [User.objects.create_user(f"fleet{i}", f"fleet{i}@example.com", "pw") for i in range(5)]
+        for i, user in enumerate(self.users):
+            for j in range(i + 1):
+                Expense.objects.create(
+                    transaction_id=f"F{i}-{j}", transaction_type="Bill Payment" if j % 2 else "Money Transfer",
+                    amount=Decimal("10"), total=Decimal("10"), date_time=self.when, created_by=user,
+                )
+        Income.objects.create(title="Salary", amount=Decimal("100"), source="Job", date=self.when.date(), created_by=self.users[0])
+        self.range = (self.when - datetime.timedelta(days=30), self.when + datetime.timedelta(days=30))
+
+    def test_user_chunks(self):
+        ids = [user.pk for user in self.users]
+        self.assertEqual(fleet.user_chunks(2), [(ids[0], ids[1]), (ids[2], ids[3]), (ids[4], ids[4])])
+        self.assertEqual(fleet.user_chunks(5), [(ids[0], ids[4])])
+
+    def test_chunking_does_not_change_the_report(self):
+        whole = fleet.compute(*self.range, chunk_size=100, workers=1)
+        chunked = fleet.compute(*self.range, chunk_size=2, workers=3)
+        self.assertEqual((whole["chunks"], chunked["chunks"]), (1, 3))
+        for key in ("totals", "active_users", "transaction_types", "months"):
+            self.assertEqual(whole[key], chunked[key], key)
+        self.assertEqual(whole["totals"]["expense"], {"amount": Decimal("150"), "count": 15})
+        self.assertEqual(whole["totals"]["income"], {"amount": Decimal("100"), "count": 1})
+        [may] = whole["months"]
+        self.assertEqual((may["month"], may["active_users"]), ("2025-05", 5))
+        self.assertEqual(may["spend_percentiles"], {"p50": 30.0, "p90": 46.0, "p99": 49.6})
+
+    def test_admin_endpoints(self):
+        admin = User.objects.create_superuser("fleetadmin", "admin@example.com", "pw")
+        client = APIClient()
+        client.force_authenticate(self.users[0])
+        self.assertEqual(client.get("/api/admin/reports/overview/").status_code, 403)
+        client.force_authenticate(admin)
+        overview = client.get("/api/admin/reports/overview/?from_date=2025-05-01&to_date=2025-05-31").json()
+        self.assertEqual((overview["users"], overview["active_users"]), (6, 5))
+        # The user list stays unpaginated unless a page is asked for.
+        self.assertEqual(len(client.get("/api/users/").json()), 6)
+        page = client.get("/api/users/?page_size=4").json()
+        self.assertEqual((page["count"], len(page["results"])), (6, 4))
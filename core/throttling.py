@@ -0,0 +1,150 @@
+"""
+Cost-aware request throttling and per-user single-flight execution.
+
+Every client owns a token bucket kept in the shared cache. Only the
+expensive actions carry ``CostWeightedThrottle`` (``throttle_classes`` on the
+action, ``throttle=True`` on async views); each request spends the cost
+configured for its action in ``THROTTLE_COSTS``, so an IMAP import drains the
+bucket faster than an export. Plain CRUD and login are never charged.
+
+``single_flight`` results are cached wrapped as ``{"v": result}`` so that a
+``None`` result can be told apart from a cache miss.
+"""
+import asyncio
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.throttling import BaseThrottle
+
+from . import metrics
+
+BUCKET_CAPACITY = getattr(settings, "THROTTLE_BUCKET_CAPACITY", 60)
+REFILL_PER_SECOND = getattr(settings, "THROTTLE_REFILL_PER_SECOND", 1.0)
+COSTS = getattr(settings, "THROTTLE_COSTS", {"default": 1})
+SINGLE_FLIGHT_TIMEOUT = getattr(settings, "SINGLE_FLIGHT_TIMEOUT", 300)
+LOCK_RETRY_SECONDS = 0.5
+
+
+def take_tokens(key, cost, capacity=BUCKET_CAPACITY, rate=REFILL_PER_SECOND):
+    """Spend ``cost`` tokens from the bucket at ``key``.
+
+    Returns ``(allowed, wait_seconds)``. The read-modify-write is guarded by a
+    short cache lock; if the lock cannot be taken quickly the request is
+    denied with a short wait, since contention means a burst is under way.
+    """
+    lock_key = f"{key}:lock"
+    for _ in range(10):
+        if cache.add(lock_key, 1, timeout=2):
+            break
+        time.sleep(0.005)
+    else:
+        return False, LOCK_RETRY_SECONDS
+    try:
+        now = time.time()
+        tokens, stamp = cache.get(key) or (capacity, now)
+        tokens = min(capacity, tokens + (now - stamp) * rate)
+        if tokens >= cost:
+            cache.set(key, (tokens - cost, now), timeout=int(capacity / rate) + 60)
+            return True, 0
+        return False, (cost - tokens) / rate
+    finally:
+        cache.delete(lock_key)
+
+
+def check_throttle(ident, view_name, action):
+    """Charge ``action`` against the bucket of ``ident``; returns ``(allowed, wait)``."""
+    cost = COSTS.get(action, COSTS.get("default", 1))
+    allowed, wait = take_tokens(f"throttle:bucket:{ident}", cost)
+    metrics.inc(
+        "throttle_decisions_total",
+        view=view_name,
+        action=action,
+        decision="allow" if allowed else "deny",
+    )
+    if allowed:
+        metrics.inc("throttle_tokens_spent_total", cost, action=action)
+    return allowed, wait
+
+
+class CostWeightedThrottle(BaseThrottle):
+    def allow_request(self, request, view):
+        action = getattr(view, "action", None) or request.method.lower()
+        if request.user and request.user.is_authenticated:
+            ident = f"user:{request.user.pk}"
+        else:
+            ident = f"anon:{self.get_ident(request)}"
+        allowed, self._wait = check_throttle(ident, view.__class__.__name__, action)
+        return allowed
+
+    def wait(self):
+        return self._wait
+
+
+def single_flight(key, func, timeout=SINGLE_FLIGHT_TIMEOUT, poll_interval=0.25):
+    """Run ``func`` once per ``key`` across all workers.
+
+    The first caller becomes the leader and runs ``func``; callers arriving
+    while it is running attach to it and receive the same (picklable) result
+    instead of starting a second run.
+    """
+    lock_key = f"singleflight:lock:{key}"
+    deadline = time.monotonic() + timeout
+    while True:
+        token = uuid.uuid4().hex
+        if cache.add(lock_key, token, timeout=timeout):
+            metrics.inc("single_flight_total", key=key.split(":", 1)[0], role="leader")
+            try:
+                result = func()
+                cache.set(f"singleflight:result:{token}", {"v": result}, timeout=60)
+                return result
+            finally:
+                cache.delete(lock_key)
+
+        leader = cache.get(lock_key)
+        metrics.inc("single_flight_total", key=key.split(":", 1)[0], role="follower")
+        while leader is not None:
+            result = cache.get(f"singleflight:result:{leader}")
+            if result is not None:
+                return result["v"]
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"Timed out waiting for in-flight '{key}'.")
+            time.sleep(poll_interval)
+            if cache.get(lock_key) != leader:
+                # Leader finished (or died); pick up its result or take over.
+                result = cache.get(f"singleflight:result:{leader}")
+                if result is not None:
+                    return result["v"]
+                break
+
+
+async def asingle_flight(key, afunc, timeout=SINGLE_FLIGHT_TIMEOUT, poll_interval=0.25):
+    """Async twin of ``single_flight``; ``afunc`` is a coroutine function."""
+    lock_key = f"singleflight:lock:{key}"
+    deadline = time.monotonic() + timeout
+    while True:
+        token = uuid.uuid4().hex
+        if await cache.aadd(lock_key, token, timeout=timeout):
+            metrics.inc("single_flight_total", key=key.split(":", 1)[0], role="leader")
+            try:
+                result = await afunc()
+                await cache.aset(f"singleflight:result:{token}", {"v": result}, timeout=60)
+                return result
+            finally:
+                await cache.adelete(lock_key)
+
+        leader = await cache.aget(lock_key)
+        metrics.inc("single_flight_total", key=key.split(":", 1)[0], role="follower")
+        while leader is not None:
+            result = await cache.aget(f"singleflight:result:{leader}")
+            if result is not None:
+                return result["v"]
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"Timed out waiting for in-flight '{key}'.")
+            await asyncio.sleep(poll_interval)
+            if await cache.aget(lock_key) != leader:
+                result = await cache.aget(f"singleflight:result:{leader}")
+                if result is not None:
+                    return result["v"]
+                break
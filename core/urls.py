@@ -2,8 +2,10 @@ from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from .views import (
     PasswordResetConfirmView, PasswordResetRequestView, RoleViewSet, UserViewSet, ExpenseViewSet, IncomeViewSet,
-     MeView, ReportsViewSet
+     MeView, ReportsViewSet, ChangesView, BudgetViewSet, ProfileViewSet, CategoryRuleViewSet,
+     AdminReportsViewSet,
 )
+from . import async_views
 
 router = DefaultRouter()
 router.register(r'roles', RoleViewSet,basename="roles")
@@ -11,11 +13,21 @@ router.register(r'users', UserViewSet,basename="users")
 router.register(r'expenses', ExpenseViewSet, basename="expenses")
 router.register(r'incomes', IncomeViewSet, basename="incomes")
 router.register(r'reports', ReportsViewSet, basename="reports")
+router.register(r'budgets', BudgetViewSet, basename="budgets")
+router.register(r'category-rules', CategoryRuleViewSet, basename="category-rules")
+router.register(r'admin/profiles', ProfileViewSet, basename="profiles")
+router.register(r'admin/reports', AdminReportsViewSet, basename="admin-reports")
 
 urlpatterns = [
     path('', include(router.urls)),
     path('auth/me/', MeView.as_view(), name='me'),
+    path('changes/', ChangesView.as_view(), name='changes'),
     path('api-auth/', include('rest_framework.urls')),
     path("password_reset/", PasswordResetRequestView.as_view(), name="password_reset"),
     path("password_reset/confirm/", PasswordResetConfirmView.as_view(), name="password_reset_confirm"),
+    # Native async variants for ASGI deployments
+    path("async/expenses/fetch_from_gmail/", async_views.fetch_from_gmail, name="async-fetch-from-gmail"),
+    path("async/reports/profit_loss/", async_views.profit_loss, name="async-profit-loss"),
+    path("async/reports/type_breakdown/", async_views.type_breakdown, name="async-type-breakdown"),
+    path("async/reports/top_expenses/", async_views.top_expenses, name="async-top-expenses"),
 ]
\ No newline at end of file
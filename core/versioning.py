@@ -0,0 +1,27 @@
+"""
+Per-user ledger data version.
+
+Bumped on every Expense/Income write (see ``core.signals``), including bulk
+paths that bypass signals. Memoised per-user computations include it in
+their cache key, so they are invalidated implicitly instead of being purged.
+"""
+from django.core.cache import cache
+
+
+def _key(user_id):
+    return f"ledger:version:{user_id}"
+
+
+def ledger_version(user_id):
+    version = cache.get(_key(user_id))
+    if version is None:
+        cache.add(_key(user_id), 1, timeout=None)
+        version = cache.get(_key(user_id), 1)
+    return version
+
+
+def bump_ledger_version(user_id):
+    try:
+        cache.incr(_key(user_id))
+    except ValueError:
+        cache.add(_key(user_id), 2, timeout=None)
@@ -1,22 +1,31 @@
-from rest_framework import viewsets, permissions, status
+from rest_framework import filters, viewsets, permissions, status
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.decorators import action
-from django.db.models import Sum
+from rest_framework.exceptions import APIException
+from django.db import transaction
 from django.contrib.auth.tokens import default_token_generator
 from django.core.mail import send_mail
 from django.conf import settings
-from zoneinfo import ZoneInfo
-import imaplib, email, re, datetime
-from bs4 import BeautifulSoup
-from django.http import HttpResponse
-import openpyxl
-from .models import Role, User, Expense, Income
+import copy
+import datetime
+import hashlib
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseForbidden
+from django.utils import timezone
+from .models import Role, User, Expense, Income, PayeeAggregate, Budget, BudgetAlert, CategoryRule
 from .serializers import (
     MeSerializer, RoleSerializer, UserSerializer,
-    ExpenseSerializer, IncomeSerializer
+    ExpenseSerializer, ExpenseSearchSerializer, IncomeSerializer, LedgerEntrySerializer,
+    BudgetSerializer, BudgetAlertSerializer, CategoryRuleSerializer
 )
 from .permissions import IsOwnerOrAdmin
+from .db_routers import ReplicaReadMixin
+from .filters import TRUE_VALUES, expense_facets, filter_expenses, float_param, int_param, start_of_day
+from .pagination import OptionalPagination, StandardResultsPagination
+from .reports import month_bounds, month_range
+from .search import search_expenses
+from .throttling import CostWeightedThrottle, single_flight
+from . import budgets, categories, events, fingerprints, fleet, ledger, metrics, payees, profiling, receipts, reports, sync
 
 # 1. Authentication (/auth/me)
 class MeView(APIView):
@@ -32,8 +41,11 @@ class RoleViewSet(viewsets.ModelViewSet):
     permission_classes = [permissions.IsAuthenticated, permissions.IsAdminUser]
 
 class UserViewSet(viewsets.ModelViewSet):
-    queryset = User.objects.all()
+    queryset = User.objects.select_related("role").order_by("id")
     serializer_class = UserSerializer
+    pagination_class = OptionalPagination
+    filter_backends = [filters.SearchFilter]
+    search_fields = ["username", "email"]
     def get_permissions(self):
         if self.action in ["update", "partial_update", "destroy", "retrieve"]:
             return [IsOwnerOrAdmin()]
@@ -52,161 +64,160 @@ class UserViewSet(viewsets.ModelViewSet):
             serializer.save()
 
 # 3. Expenses
-class ExpenseViewSet(viewsets.ModelViewSet):
+class SyncCursorETagMixin:
+    """Conditional GET for list endpoints.
+
+    The ETag is the user's latest sync cursor (plus the query string), so a
+    client polling an unchanged ledger gets a 304 without the list query.
+    """
+    def list(self, request, *args, **kwargs):
+        cursor = sync.current_cursor(request.user.pk)
+        query = hashlib.md5(request.get_full_path().encode()).hexdigest()[:12]
+        etag = f'W/"{request.user.pk}-{cursor}-{query}"'
+        if etag in [tag.strip() for tag in request.headers.get("If-None-Match", "").split(",")]:
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response = super().list(request, *args, **kwargs)
+        response["ETag"] = etag
+        return response
+
+
+DEDUP_FIELDS = ("amount", "date_time", "receiver_name", "transaction_id")
+
+
+class DuplicateExpense(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = "A matching expense already exists. Resend with ?allow_duplicate=true to record it anyway."
+    default_code = "duplicate_expense"
+
+
+class ExpenseViewSet(ReplicaReadMixin, SyncCursorETagMixin, viewsets.ModelViewSet):
     queryset = Expense.objects.all()
     serializer_class = ExpenseSerializer
     permission_classes = [permissions.IsAuthenticated, IsOwnerOrAdmin]
+    replica_actions = {"list", "retrieve", "facets", "search"}
 
     def perform_create(self, serializer):
-        serializer.save(created_by=self.request.user)
+        data = serializer.validated_data
+        category = data.get("category") or categories.match(
+            self.request.user.pk, data.get("receiver_name"), data.get("transaction_type")
+        )
+        candidate = self._check_duplicate(serializer, data)
+        with transaction.atomic():
+            expense = serializer.save(
+                created_by=self.request.user, category=category,
+                date_time=candidate.date_time, fingerprint=candidate.fingerprint,
+            )
+            events.expenses_created(expense.created_by_id, [expense])
+
+    def perform_update(self, serializer):
+        instance = serializer.instance
+        data = {field: serializer.validated_data.get(field, getattr(instance, field)) for field in DEDUP_FIELDS}
+        # Only a change to these fields can create a new duplicate.
+        changed = any(data[field] != getattr(instance, field) for field in DEDUP_FIELDS)
+        candidate = self._check_duplicate(serializer, data, exclude_pk=instance.pk, check=changed)
+        with transaction.atomic():
+            before = copy.copy(instance)
+            expense = serializer.save(fingerprint=candidate.fingerprint)
+            events.expense_updated(expense.created_by_id, before, expense)
+
+    def _check_duplicate(self, serializer, data, exclude_pk=None, check=True):
+        """Fingerprint ``data`` as an unsaved Expense; 409 if it matches another of the owner's."""
+        owner = serializer.instance.created_by_id if serializer.instance else self.request.user.pk
+        candidate = Expense(**{k: v for k, v in data.items() if k in DEDUP_FIELDS})
+        if serializer.instance:
+            candidate.origin = serializer.instance.origin
+        if not check:
+            candidate.fingerprint = fingerprints.fingerprint(owner, candidate.amount, candidate.date_time, candidate.receiver_name)
+            return candidate
+        _, duplicates = fingerprints.split_duplicates(owner, [candidate], exclude_pk=exclude_pk)
+        allowed = self.request.query_params.get("allow_duplicate", "").lower() in TRUE_VALUES
+        if duplicates and not allowed:
+            raise DuplicateExpense()
+        return candidate
+
+    def perform_destroy(self, instance):
+        with transaction.atomic():
+            events.expense_deleted(instance.created_by_id, instance)
+            instance.delete()
 
     def get_queryset(self):
+        return filter_expenses(self._owned(), self.request.query_params)
+
+    def _owned(self):
         user = self.request.user
-        qs = Expense.objects.filter(created_by=user).order_by("-date_time")
-        from_date = self.request.query_params.get("from_date")
-        to_date = self.request.query_params.get("to_date")
-        if from_date:
-            qs = qs.filter(date_time__date__gte=from_date)
-        if to_date:
-            qs = qs.filter(date_time__date__lte=to_date)
-        return qs
+        return Expense.objects.filter(created_by=user).select_related("created_by__role", "receipt").order_by("-date_time")
 
-    @action(detail=False, methods=["post"])
-    def fetch_from_gmail(self, request):
+    @action(detail=False, methods=["get"])
+    def facets(self, request):
+        return Response(expense_facets(self._owned(), request.query_params))
+
+    @action(detail=True, methods=["get", "post", "delete"])
+    def receipt(self, request, pk=None):
+        expense = self.get_object()
+        if request.method == "POST":
+            upload = request.FILES.get("file")
+            if upload is None:
+                return Response({"error": "Upload the receipt as 'file'."}, status=status.HTTP_400_BAD_REQUEST)
+            try:
+                expense.receipt = receipts.store_upload(upload)
+            except receipts.ReceiptError as e:
+                return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+            expense.save(update_fields=["receipt", "updated_at"])
+            return Response(self.get_serializer(expense).data, status=status.HTTP_201_CREATED)
+        if request.method == "DELETE":
+            expense.receipt = None
+            expense.save(update_fields=["receipt", "updated_at"])
+            return Response(status=status.HTTP_204_NO_CONTENT)
+        if expense.receipt is None:
+            return Response({"error": "This expense has no receipt."}, status=status.HTTP_404_NOT_FOUND)
+        return receipts.serve_file(
+            request, receipts.original_path(expense.receipt.sha256),
+            expense.receipt.content_type, expense.receipt.sha256,
+        )
+
+    @action(detail=True, methods=["get"], url_path="receipt/thumbnail")
+    def receipt_thumbnail(self, request, pk=None):
+        expense = self.get_object()
+        if expense.receipt is None:
+            return Response({"error": "This expense has no receipt."}, status=status.HTTP_404_NOT_FOUND)
         try:
-            EMAIL = request.user.gmail
-            PASSWORD = request.user.gmail_app_password
-            if not EMAIL or not PASSWORD:
-                return Response(
-                    {"error": "Your Gmail or App Password is not set in your profile."},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-            from_date = request.GET.get("from_date")
-            to_date = request.GET.get("to_date")
-            imap = imaplib.IMAP4_SSL("imap.gmail.com")
-            imap.login(EMAIL, PASSWORD)
-            imap.select("inbox")
-            search_query = '(FROM "e.statement@telenorbank.pk")'
-            if from_date and to_date:
-                from_dt = datetime.datetime.strptime(from_date, "%Y-%m-%d")
-                to_dt = datetime.datetime.strptime(to_date, "%Y-%m-%d") + datetime.timedelta(days=1)
-                search_query = f'(FROM "e.statement@telenorbank.pk" SINCE {from_dt.strftime("%d-%b-%Y")} BEFORE {to_dt.strftime("%d-%b-%Y")})'
-            elif from_date:
-                from_dt = datetime.datetime.strptime(from_date, "%Y-%m-%d")
-                search_query = f'(FROM "e.statement@telenorbank.pk" SINCE {from_dt.strftime("%d-%b-%Y")})'
-            elif to_date:
-                to_dt = datetime.datetime.strptime(to_date, "%Y-%m-%d") + datetime.timedelta(days=1)
-                search_query = f'(FROM "e.statement@telenorbank.pk" BEFORE {to_dt.strftime("%d-%b-%Y")})'
-
-            status_, messages = imap.search(None, search_query)
-            mail_ids = messages[0].split()
-
-            if not mail_ids:
-                return Response({"message": "No Easypaisa emails found."}, status=status.HTTP_200_OK)
-
-            imported_ids = []
-
-            for mail_id in reversed(mail_ids):
-                status_, data = imap.fetch(mail_id, "(RFC822)")
-                msg = email.message_from_bytes(data[0][1])
-
-                body = ""
-                if msg.is_multipart():
-                    for part in msg.walk():
-                        ctype = part.get_content_type()
-                        if ctype == "text/plain":
-                            body = part.get_payload(decode=True).decode(errors="ignore")
-                            break
-                        elif ctype == "text/html":
-                            body = part.get_payload(decode=True).decode(errors="ignore")
-                else:
-                    body = msg.get_payload(decode=True).decode(errors="ignore")
-
-                soup = BeautifulSoup(body, "html.parser")
-                text = soup.get_text(separator="\n")
-
-                transaction_id = None
-                amount = fee = total = None
-                receiver_name = sender_name = transaction_type = None
-                date_time = datetime.datetime.now(tz=ZoneInfo("Asia/Karachi"))
-
-                m = re.search(r"Transaction ID\s+(\d+)", text)
-                if m:
-                    transaction_id = m.group(1).strip()
-                    if Expense.objects.filter(transaction_id=transaction_id).exists():
-                        continue
-
-                m = re.search(r"Transaction Type\s+([A-Za-z ]+)", text)
-                if m:
-                    transaction_type = m.group(1).strip()
-
-                m = re.search(r"Date & Time\s+([0-9]{2}-[A-Za-z]{3}-[0-9]{4}\s+[0-9:]+)", text)
-                if m:
-                    try:
-                        naive_dt = datetime.datetime.strptime(m.group(1).strip(), "%d-%b-%Y %H:%M:%S")
-                        date_time = naive_dt.replace(tzinfo=ZoneInfo("Asia/Karachi"))
-                    except Exception:
-                        pass
-
-                m = re.search(r"Account Title\s+(.+)", text)
-                if m:
-                    receiver_name = m.group(1).strip()
-
-                m = re.search(r"Sender Name\s+(.+)", text)
-                if m:
-                    sender_name = m.group(1).strip()
-
-                m = re.search(r"Transfer amount\s+Rs\.?\s*([0-9,\.]+)", text)
-                if m:
-                    amount = float(m.group(1).replace(",", ""))
-
-                m = re.search(r"Fee\s+Rs\.?\s*([0-9,\.]+)", text)
-                if m:
-                    fee = float(m.group(1).replace(",", ""))
-
-                m = re.search(r"Total\s+Rs\.?\s*([0-9,\.]+)", text)
-                if m:
-                    total = float(m.group(1).replace(",", ""))
-
-                if not amount:
-                    continue
-
-                try:
-                    expense = Expense.objects.create(
-                        receiver_name=receiver_name or transaction_type,
-                        amount=amount,
-                        date_time=date_time,
-                        transaction_id=transaction_id or f"mail-{mail_id.decode()}",
-                        transaction_type=transaction_type or "Unknown",
-                        sender_name=sender_name or "Unknown",
-                        fee=fee or 0.0,
-                        total=total or amount,
-                        created_by=request.user,
-                    )
-                    imported_ids.append(expense.id)
-                except Exception as db_err:
-                    print("DB ERROR:", db_err)
-
-            imap.close()
-            imap.logout()
-
-            if not imported_ids:
-                return Response({"message": "No new valid transactions found."}, status=status.HTTP_200_OK)
+            size = int(request.query_params.get("size", 256))
+            path = receipts.get_thumbnail(expense.receipt, size)
+        except (ValueError, receipts.ReceiptError) as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return receipts.serve_file(request, path, "image/jpeg", f"{expense.receipt.sha256}-{size}")
 
-            return Response(
-                {"message": f"{len(imported_ids)} expenses imported.", "ids": imported_ids},
-                status=status.HTTP_201_CREATED,
-            )
+    @action(detail=False, methods=["get"])
+    def search(self, request):
+        query = request.query_params.get("q", "").strip()
+        if not query:
+            return Response({"error": "Query parameter 'q' is required."}, status=status.HTTP_400_BAD_REQUEST)
+        paginator = StandardResultsPagination()
+        page = paginator.paginate_queryset(search_expenses(self.get_queryset(), query), request, view=self)
+        return paginator.get_paginated_response(ExpenseSearchSerializer(page, many=True).data)
+
+    @action(detail=False, methods=["post"], throttle_classes=[CostWeightedThrottle])
+    def fetch_from_gmail(self, request):
+        from .services import gmail  # loads bs4 and imaplib on first import
 
-        except Exception as e:
-            print("GENERAL ERROR:", e)
-            return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        key = "gmail:{}:{}:{}".format(
+            request.user.pk, request.GET.get("from_date", ""), request.GET.get("to_date", "")
+        )
+        data, status_code = single_flight(
+            key,
+            lambda: gmail.import_from_gmail(
+                request.user, request.GET.get("from_date"), request.GET.get("to_date")
+            ),
+        )
+        return Response(data, status=status_code)
 
 
 # 4. Incomes
-class IncomeViewSet(viewsets.ModelViewSet):
+class IncomeViewSet(ReplicaReadMixin, SyncCursorETagMixin, viewsets.ModelViewSet):
     serializer_class = IncomeSerializer
     permission_classes = [permissions.IsAuthenticated, IsOwnerOrAdmin]
+    replica_actions = {"list", "retrieve"}
 
     def get_queryset(self):
         user = self.request.user
@@ -217,84 +228,248 @@ class IncomeViewSet(viewsets.ModelViewSet):
 
 
 # 5. Reports
-class ReportsViewSet(viewsets.ViewSet):
+class ReportsViewSet(ReplicaReadMixin, viewsets.ViewSet):
     permission_classes = [permissions.IsAuthenticated]
 
-    def _filter_queryset(self, qs, request):
-        qs = qs.filter(created_by=request.user)
-        month = request.query_params.get("month")
-        if month:
-            try:
-                year, mon = map(int, month.split("-"))
-                date_field = "date_time" if hasattr(qs.model, "date_time") else "date"
-                qs = qs.filter(**{f"{date_field}__year": year, f"{date_field}__month": mon})
-            except ValueError:
-                return qs.none()
-        return qs
-
     @action(detail=False, methods=["get"])
     def profit_loss(self, request):
-        expenses = self._filter_queryset(Expense.objects.all(), request)
-        incomes = self._filter_queryset(Income.objects.all(), request)
-        total_expenses = expenses.aggregate(total=Sum("amount"))["total"] or 0
-        total_income = incomes.aggregate(total=Sum("amount"))["total"] or 0
-        profit_loss = total_income - total_expenses
-        return Response({
-            "total_income": total_income,
-            "total_expenses": total_expenses,
-            "profit_loss": profit_loss
-        })
+        return Response(reports.profit_loss(request.user.pk, request.query_params.get("month")))
+
+    @action(detail=False, methods=["get"])
+    def ledger(self, request):
+        """Incomes and expenses in date order with a running balance."""
+        params = request.query_params
+        start = end = None
+        if params.get("month"):
+            try:
+                start, end = month_range(params["month"])
+            except ValueError:
+                return Response({"month": "Expected YYYY-MM."}, status=status.HTTP_400_BAD_REQUEST)
+        if params.get("from_date"):
+            start = start_of_day(params["from_date"], "from_date")
+        if params.get("to_date"):
+            end = start_of_day(params["to_date"], "to_date") + datetime.timedelta(days=1)
+        paginator = StandardResultsPagination()
+        page = paginator.paginate_queryset(ledger.feed(request.user, start, end), request, view=self)
+        return paginator.get_paginated_response(LedgerEntrySerializer(page, many=True).data)
 
     @action(detail=False, methods=["get"])
     def type_breakdown(self, request):
-        expenses = self._filter_queryset(Expense.objects.all(), request)
-        breakdown = (
-            expenses.values("transaction_type")
-            .annotate(total=Sum("amount"))
-            .order_by("transaction_type")
-        )
-        return Response(breakdown)
+        return Response(reports.type_breakdown(request.user.pk, request.query_params.get("month")))
 
     @action(detail=False, methods=["get"])
     def top_expenses(self, request):
-        limit = int(request.query_params.get("limit", 5))
-        expenses = self._filter_queryset(Expense.objects.all(), request)
-        top_expenses = expenses.order_by("-amount")[:limit]
-        data = top_expenses.values("transaction_type", "amount", "date_time", "receiver_name")
-        return Response(data)
+        limit = int_param(request.query_params, "limit", 5, minimum=0)
+        return Response(reports.top_expenses(request.user, request.query_params.get("month"), limit))
+
+    @action(detail=False, methods=["get"])
+    def top_payees(self, request):
+        limit = int_param(request.query_params, "limit", 10, minimum=0)
+        rows = PayeeAggregate.objects.filter(user=request.user).order_by("-total")[:limit]
+        return Response(rows.values("display_name", "count", "total", "first_seen", "last_seen"))
+
+    @action(detail=False, methods=["get"])
+    def new_payees(self, request):
+        days = int_param(request.query_params, "days", 30, minimum=0, maximum=36500)
+        since = timezone.now() - datetime.timedelta(days=days)
+        rows = PayeeAggregate.objects.filter(user=request.user, first_seen__gte=since).order_by("-first_seen")
+        return Response(rows.values("display_name", "count", "total", "first_seen"))
+
+    @action(detail=False, methods=["get"])
+    def recurring_payments(self, request):
+        return Response(payees.recurring_payments(request.user.pk))
+
+    @action(detail=False, methods=["get"])
+    def timeseries(self, request):
+        from . import analytics  # NumPy is imported on first use
+
+        window = int_param(request.query_params, "window", 28, minimum=1)
+        return Response(analytics.timeseries(request.user.pk, window=window))
+
+    @action(detail=False, methods=["get"])
+    def forecast(self, request):
+        from . import analytics
+
+        return Response(analytics.forecast_month_end(request.user.pk))
 
     @action(detail=False, methods=["get"])
+    def anomalies(self, request):
+        from . import analytics
+
+        threshold = float_param(request.query_params, "threshold", 3.0, minimum=0)
+        return Response(analytics.anomalies(request.user.pk, threshold=threshold))
+
+    @action(detail=False, methods=["get"], throttle_classes=[CostWeightedThrottle])
     def export_excel(self, request):
-        expenses = self._filter_queryset(Expense.objects.all(), request)
-        incomes = self._filter_queryset(Income.objects.all(), request)
-        wb = openpyxl.Workbook()
-        ws = wb.active
-        ws.title = "Financial Report"
-        ws.append(["Type/Source", "Category", "Amount", "Date"])
-
-        for exp in expenses:
-            ws.append([exp.transaction_type, "Expense", float(exp.amount), exp.date_time.strftime("%Y-%m-%d")])
-        for inc in incomes:
-            ws.append([inc.source, "Income", float(inc.amount), inc.date.strftime("%Y-%m-%d")])
-
-        total_expenses = expenses.aggregate(total=Sum("amount"))["total"] or 0
-        total_income = incomes.aggregate(total=Sum("amount"))["total"] or 0
-        profit_loss = total_income - total_expenses
-
-        ws.append([])
-        ws.append(["Total Income", total_income])
-        ws.append(["Total Expenses", total_expenses])
-        ws.append(["Profit/Loss", profit_loss])
+        from .services import excel  # loads openpyxl; only exporting workers pay for it
 
+        month = request.query_params.get("month")
+        key = "export:{}:{}".format(request.user.pk, month or "")
+        content = single_flight(key, lambda: excel.export_ledger(request.user, month))
         response = HttpResponse(
-            content_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+            content,
+            content_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
         )
         response["Content-Disposition"] = 'attachment; filename="financial_report.xlsx"'
-        wb.save(response)
         return response
 
 
-# 6. Password Reset
+class AdminReportsViewSet(ReplicaReadMixin, viewsets.ViewSet):
+    """Fleet-wide figures over ``from_date``/``to_date`` (default: the last 365 days)."""
+    permission_classes = [permissions.IsAuthenticated, permissions.IsAdminUser]
+
+    def _report(self, request):
+        params = request.query_params
+        end = timezone.make_aware(datetime.datetime.combine(timezone.localdate(), datetime.time.min))
+        end += datetime.timedelta(days=1)
+        if params.get("to_date"):
+            end = start_of_day(params["to_date"], "to_date") + datetime.timedelta(days=1)
+        start = end - datetime.timedelta(days=365)
+        if params.get("from_date"):
+            start = start_of_day(params["from_date"], "from_date")
+        return fleet.report(start, end)
+
+    @action(detail=False, methods=["get"])
+    def overview(self, request):
+        report = self._report(request)
+        keys = ("start", "end", "users", "active_users", "totals", "chunks")
+        return Response({key: report[key] for key in keys})
+
+    @action(detail=False, methods=["get"])
+    def transaction_types(self, request):
+        return Response(self._report(request)["transaction_types"])
+
+    @action(detail=False, methods=["get"])
+    def months(self, request):
+        """Per month: active users, volume and percentiles of per-user spend."""
+        return Response(self._report(request)["months"])
+
+
+# 6. Budgets
+class BudgetViewSet(ReplicaReadMixin, viewsets.ModelViewSet):
+    serializer_class = BudgetSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    replica_actions = {"list", "retrieve", "status", "alerts"}
+
+    def get_queryset(self):
+        return Budget.objects.filter(user=self.request.user).order_by("transaction_type")
+
+    def perform_create(self, serializer):
+        budgets.check_budget(serializer.save(user=self.request.user))
+
+    def perform_update(self, serializer):
+        budgets.check_budget(serializer.save())
+
+    @action(detail=False, methods=["get"])
+    def status(self, request):
+        """Month-to-date usage of every budget (``?month=YYYY-MM``, default: current)."""
+        month = request.query_params.get("month")
+        try:
+            start = month_bounds(month)[0] if month else budgets.month_of(timezone.now())
+        except ValueError:
+            return Response({"month": "Expected YYYY-MM."}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({"month": start.strftime("%Y-%m"), "budgets": budgets.status(request.user.pk, start)})
+
+    @action(detail=False, methods=["get"])
+    def alerts(self, request):
+        alerts = BudgetAlert.objects.filter(budget__user=request.user).select_related("budget").order_by("-created_at")
+        paginator = StandardResultsPagination()
+        page = paginator.paginate_queryset(alerts, request, view=self)
+        return paginator.get_paginated_response(BudgetAlertSerializer(page, many=True).data)
+
+
+# 7. Category Rules
+class CategoryRuleViewSet(viewsets.ModelViewSet):
+    serializer_class = CategoryRuleSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_queryset(self):
+        return CategoryRule.objects.filter(user=self.request.user).order_by("-priority", "keyword")
+
+    def perform_create(self, serializer):
+        serializer.save(user=self.request.user)
+
+    @action(detail=False, methods=["post"])
+    def reclassify(self, request):
+        """Apply the rules to every expense (``?only_uncategorised=true`` to keep set categories)."""
+        only_uncategorised = request.query_params.get("only_uncategorised", "").lower() in TRUE_VALUES
+        key = f"reclassify:{request.user.pk}:{int(only_uncategorised)}"
+        changed = single_flight(key, lambda: categories.reclassify(request.user.pk, only_uncategorised))
+        return Response({"updated": changed})
+
+
+# 8. Delta Sync (/changes?since=<cursor>)
+class ChangesView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        try:
+            since = int(request.query_params.get("since", 0))
+            limit = min(int(request.query_params.get("limit", sync.MAX_PAGE)), sync.MAX_PAGE)
+        except ValueError:
+            return Response({"error": "since and limit must be integers"}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            cursor, has_more, upserts, deletes = sync.changes(request.user.pk, since, max(limit, 1))
+        except sync.ResyncRequired:
+            return Response(
+                {"error": "cursor expired; sync again with since=0", "cursor": 0}, status=status.HTTP_410_GONE
+            )
+        return Response({
+            "cursor": cursor,
+            "has_more": has_more,
+            "expenses": ExpenseSerializer(upserts["expense"], many=True).data,
+            "incomes": IncomeSerializer(upserts["income"], many=True).data,
+            "deleted": [{"kind": kind, "id": object_id} for kind, object_id in deletes],
+        })
+
+
+# 9. Metrics
+def metrics_view(request):
+    token = getattr(settings, "METRICS_TOKEN", None)
+    if token and request.headers.get("Authorization") != f"Bearer {token}":
+        return HttpResponseForbidden()
+    return HttpResponse(metrics.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+# 10. Request Profiles (admin only; see core.profiling)
+class ProfileViewSet(viewsets.ViewSet):
+    permission_classes = [permissions.IsAuthenticated, permissions.IsAdminUser]
+
+    def list(self, request):
+        paginator = StandardResultsPagination()
+        return paginator.get_paginated_response(
+            paginator.paginate_queryset(profiling.list_profiles(), request, view=self)
+        )
+
+    def retrieve(self, request, pk=None):
+        """Download the raw cProfile dump (open with ``pstats`` or snakeviz)."""
+        path = profiling.profile_path(pk)
+        if path is None:
+            raise Http404
+        return FileResponse(open(path, "rb"), as_attachment=True, filename=f"{pk}.prof")
+
+    @action(detail=True, methods=["get"])
+    def summary(self, request, pk=None):
+        path = profiling.profile_path(pk)
+        if path is None:
+            raise Http404
+        sort = request.query_params.get("sort", "cumulative")
+        if sort not in ("cumulative", "tottime", "ncalls"):
+            return Response({"sort": "Expected cumulative, tottime or ncalls."}, status=status.HTTP_400_BAD_REQUEST)
+        return HttpResponse(profiling.summary(path, sort=sort), content_type="text/plain; charset=utf-8")
+
+    @action(detail=False, methods=["post"])
+    def token(self, request):
+        """A signed token that profiles any request sending it as
+        ``X-Profile-Token`` (or ``?_profile=``) until it expires."""
+        return Response({
+            "token": profiling.issue_token(request.user),
+            "expires_in": profiling.TOKEN_MAX_AGE,
+            "enabled": getattr(settings, "PROFILING_ENABLED", False),
+        })
+
+
+# 11. Password Reset
 class PasswordResetRequestView(APIView):
     permission_classes = [permissions.AllowAny]
 